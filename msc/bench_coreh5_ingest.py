@@ -0,0 +1,111 @@
+#!/usr/bin/python
+
+"""
+Benchmark the ingestion of CoRe text files into a data.h5 archive
+(CoRe_h5.create_dset) against the legacy serial np.loadtxt writer,
+on the CoRe files of the tutorials
+
+Run from this folder:
+  python bench_coreh5_ingest.py [nrep] [workers]
+"""
+
+import os, sys, time, tempfile
+import numpy as np
+import h5py
+
+from watpy.utils.coreh5 import CoRe_h5
+from watpy.wave.wave import wfile_parse_name
+
+data_path = '../tutorials/TestData/MySim_THC_135135/CoReDB'
+
+
+def datain_core(path):
+    """
+    Dictionary group -> files of the CoRe text files in path
+    """
+    datain = {}
+    for f in sorted(os.listdir(path)):
+        vlmr = wfile_parse_name(f)
+        if vlmr is None: continue
+        var, l, m, r, tp = vlmr
+        if var == 'EJ':
+            group = 'energy'
+        else:
+            group = 'r{}_{}{}'.format(var.lower(), l, m)
+        datain.setdefault(group, []).append(f)
+    return datain
+
+
+def legacy_create_dset(out, datain, path):
+    """
+    Writer as in watpy <= 0.1.1: serial np.loadtxt, h5py defaults
+    """
+    with h5py.File(os.path.join(out, 'data.h5'), 'a') as fn:
+        for g in datain.keys():
+            if g not in fn.keys():
+                fn.create_group(g)
+            for f in datain[g]:
+                data = np.loadtxt(os.path.join(path,f))
+                if f in fn[g].keys():
+                    del fn[g][f]
+                fn[g].create_dataset(name=f, data=data)
+
+
+def same_archive(f1, f2):
+    with h5py.File(f1, 'r') as a, h5py.File(f2, 'r') as b:
+        for g in a.keys():
+            for f in a[g].keys():
+                if not np.array_equal(a[g][f][()], b[g][f][()]):
+                    return False
+        return sorted(a.keys()) == sorted(b.keys())
+
+
+def timeit(fun, out, nrep):
+    best = np.inf
+    for i in range(nrep):
+        if os.path.isfile(os.path.join(out, 'data.h5')):
+            os.remove(os.path.join(out, 'data.h5'))
+        t0 = time.perf_counter()
+        fun()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+if __name__ == "__main__":
+
+    nrep    = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+
+    datain = datain_core(data_path)
+    nfiles = sum([len(v) for v in datain.values()])
+    tmp    = tempfile.mkdtemp(prefix='watpy_ingest_')
+    ref    = os.path.join(tmp, 'legacy')
+    os.makedirs(ref)
+    tleg   = timeit(lambda: legacy_create_dset(ref, datain, data_path), ref, nrep)
+
+    cases = [('serial', {}),
+             ('workers={}'.format(workers), {'workers': workers}),
+             ('workers={} chunks'.format(workers), {'workers': workers, 'chunks': 4096}),
+             ('workers={} gzip4'.format(workers), {'workers': workers, 'compression': 'gzip',
+                                                   'compression_opts': 4, 'shuffle': True}),
+             ('workers={} lzf'.format(workers), {'workers': workers, 'compression': 'lzf'})]
+
+    print('{} files, {:.1f} MB of text'.format(nfiles, sum([os.path.getsize(os.path.join(data_path,f))
+          for v in datain.values() for f in v])/2**20))
+    print('{:24s} {:>10s} {:>8s} {:>10s} {:>6s}'.format('case', 'time[s]', 'speedup', 'size[MB]', 'same'))
+    print('{:24s} {:10.4f} {:8.1f} {:10.2f} {:>6s}'.format('legacy', tleg, 1.,
+          os.path.getsize(os.path.join(ref, 'data.h5'))/2**20, '-'))
+    for name, kw in cases:
+        out = os.path.join(tmp, 'new')
+        os.makedirs(out, exist_ok=True)
+        h5  = CoRe_h5(out)
+        t   = timeit(lambda: h5.create_dset(datain, path=data_path, **kw), out, nrep)
+        print('{:24s} {:10.4f} {:8.1f} {:10.2f} {:>6s}'.format(name, t, tleg/t,
+              os.path.getsize(os.path.join(out, 'data.h5'))/2**20,
+              str(same_archive(os.path.join(ref, 'data.h5'), os.path.join(out, 'data.h5')))))
+        os.remove(os.path.join(out, 'data.h5'))
+        os.rmdir(out)
+
+    os.remove(os.path.join(ref, 'data.h5'))
+    os.rmdir(ref)
+    os.rmdir(tmp)
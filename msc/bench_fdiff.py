@@ -0,0 +1,71 @@
+#!/usr/bin/python
+
+"""
+Benchmark the vectorized finite differencing (utils.fdiff) against
+the loop implementation of num.diff1/diff2 in watpy <= 0.1.1
+
+Run from this folder:
+  python bench_fdiff.py [n] [nrep]
+"""
+
+import sys, time
+import numpy as np
+
+from watpy.utils import num, fdiff
+
+
+def legacy_diff1(xp, yp, pad=True):
+    dyp = [(yp[i+1] - yp[i-1])/(xp[i+1] - xp[i-1]) \
+            for i in range(1, xp.shape[0]-1)]
+    dyp = np.array(dyp)
+    if pad==True:
+        dyp = np.insert(dyp, 0, dyp[0])
+        dyp = np.append(dyp, dyp[-1])
+    return dyp
+
+
+def legacy_diff2(xp, yp, pad=False):
+    ddyp = [4*(yp[i+1] - 2*yp[i] + yp[i-1])/((xp[i+1] - xp[i-1])**2) \
+            for i in range(1, xp.shape[0]-1)]
+    ddyp = np.array(ddyp)
+    if pad==True:
+        ddyp = np.insert(ddyp, 0, ddyp[0])
+        ddyp = np.append(ddyp, ddyp[-1])
+    return ddyp
+
+
+def timeit(fun, nrep):
+    best = np.inf
+    for i in range(nrep):
+        t0 = time.perf_counter()
+        fun()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+if __name__ == "__main__":
+
+    n    = int(sys.argv[1]) if len(sys.argv) > 1 else 10**6
+    nrep = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    t  = np.linspace(0., 1e4, n)
+    tn = t + 0.2*(t[1]-t[0])*np.sin(t)
+    y  = np.exp(-1j*0.05*t)
+    Y  = np.tile(y, (8,1))
+
+    assert np.allclose(num.diff1(t, y), legacy_diff1(t, y))
+    assert np.allclose(num.diff2(t, y), legacy_diff2(t, y))
+
+    cases = [('diff1 legacy',           lambda: legacy_diff1(t, y)),
+             ('diff1',                  lambda: num.diff1(t, y)),
+             ('diff2 legacy',           lambda: legacy_diff2(t, y)),
+             ('diff2',                  lambda: num.diff2(t, y)),
+             ('fd_diff d=1 o=4 unif',   lambda: fdiff.fd_diff(t, y, 1, 4)),
+             ('fd_diff d=1 o=6 unif',   lambda: fdiff.fd_diff(t, y, 1, 6)),
+             ('fd_diff d=1 o=4 nonunif',lambda: fdiff.fd_diff(tn, y, 1, 4)),
+             ('fd_diff d=2 o=4 nonunif',lambda: fdiff.fd_diff(tn, y, 2, 4)),
+             ('fd_diff d=1 o=4 (8,n)',  lambda: fdiff.fd_diff(t, Y, 1, 4, axis=-1))]
+
+    print('n = {}'.format(n))
+    for name, fun in cases:
+        print('{:28s} {:10.4f} s'.format(name, timeit(fun, nrep)))
@@ -0,0 +1,47 @@
+#!/usr/bin/python
+
+"""
+Benchmark ioutils.loadtxt_fast against np.loadtxt (the reader of
+watpy <= 0.1.1) on the test data of the tutorials
+
+Run as:
+  python bench_loadtxt.py [nrep]
+"""
+
+import os, sys, time
+import numpy as np
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, '..'))
+
+from watpy.utils.ioutils import loadtxt_fast
+from watpy.wave.wave import wfile_parse_name
+
+data_path = os.path.join(here, '..', 'tutorials', 'TestData')
+sims = ['MySim_BAM_135135', 'MySim_THC_135135/CoReDB']
+
+
+def timeit(fun, nrep):
+    best = np.inf
+    for i in range(nrep):
+        t0 = time.perf_counter()
+        fun()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+if __name__ == "__main__":
+
+    nrep = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    print('{:28s} {:>6s} {:>10s} {:>10s} {:>8s} {:>6s}'.format('sim', 'files',
+          'loadtxt[s]', 'fast[s]', 'speedup', 'same'))
+    for sim in sims:
+        path   = os.path.join(data_path, sim)
+        fnames = [os.path.join(path, f) for f in sorted(os.listdir(path)) if wfile_parse_name(f)]
+        same   = all([np.array_equal(loadtxt_fast(f)[0],
+                                     np.loadtxt(f, comments=['#','"'], ndmin=2)) for f in fnames])
+        tleg   = timeit(lambda: [np.loadtxt(f, comments=['#','"'], ndmin=2) for f in fnames], nrep)
+        tnew   = timeit(lambda: [loadtxt_fast(f) for f in fnames], nrep)
+        print('{:28s} {:6d} {:10.4f} {:10.4f} {:8.2f} {:>6s}'.format(sim, len(fnames),
+              tleg, tnew, tleg/tnew, str(same)))
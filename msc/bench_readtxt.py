@@ -0,0 +1,81 @@
+#!/usr/bin/python
+
+"""
+Benchmark wave.readtxt against the legacy np.loadtxt reader
+on the test data of the tutorials
+
+Run from this folder:
+  python bench_readtxt.py [nrep]
+"""
+
+import os, sys, time
+import numpy as np
+
+from watpy.wave.wave import wave, wfile_parse_name, wfile_get_detrad_bam
+
+data_path = '../tutorials/TestData'
+sims = {'MySim_BAM_135135': 'bam',
+        'MySim_THC_135135': 'cactus',
+        'MySim_THC_135135/CoReDB': 'core'}
+
+
+def legacy_readtxt(fname, code):
+    """
+    Reader as in watpy <= 0.1.1: loadtxt, unique-sort, and for BAM a
+    second full read of the file to get the radius from the header
+    """
+    t, re, im = np.loadtxt(fname, unpack=True, usecols=[0,1,2],
+                           comments=['#','"'])
+    t, uniq = np.unique(t, axis=0, return_index=True)
+    re, im = re[uniq], im[uniq]
+    if code == 'bam':
+        wfile_get_detrad_bam(fname)
+    return t, re + 1j*im
+
+
+def fast_readtxt(path, fname, code):
+    """
+    Reader of this version, without the strain integration
+    """
+    w = wave(path=path, code=code)
+    w.prop_read_from_file(fname)
+    w.get_strain = lambda *args, **kwargs: None
+    w.readtxt(fname)
+    return w.time, w.p4
+
+
+def timeit(fun, nrep):
+    best = np.inf
+    for i in range(nrep):
+        t0 = time.perf_counter()
+        fun()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+if __name__ == "__main__":
+
+    nrep = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    print('{:28s} {:>6s} {:>10s} {:>10s} {:>8s}'.format('sim', 'files',
+                                                       'legacy[s]', 'fast[s]', 'speedup'))
+    for sim, code in sims.items():
+        path  = os.path.join(data_path, sim)
+        files = []
+        for f in sorted(os.listdir(path)):
+            vlmr = wfile_parse_name(f)
+            if vlmr and vlmr[0] in ['Psi4','psi4']:
+                files.append(f)
+
+        # check the two readers agree
+        for f in files:
+            t0, p0 = legacy_readtxt(os.path.join(path,f), code)
+            t1, p1 = fast_readtxt(path, f, code)
+            if code == 'cactus':
+                p0 = p0 * wfile_parse_name(f)[3]
+            assert np.array_equal(t0, t1) and np.array_equal(p0, p1), f
+
+        told = timeit(lambda: [legacy_readtxt(os.path.join(path,f), code) for f in files], nrep)
+        tnew = timeit(lambda: [fast_readtxt(path, f, code) for f in files], nrep)
+        print('{:28s} {:6d} {:10.4f} {:10.4f} {:8.2f}'.format(sim, len(files),
+                                                             told, tnew, told/tnew))
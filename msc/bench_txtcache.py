@@ -0,0 +1,61 @@
+#!/usr/bin/python
+
+"""
+Benchmark cold vs warm loads of waveform text files through the
+binary sidecar cache (ioutils.loadtxt_cached)
+
+Run from this folder:
+  python bench_txtcache.py [nrep]
+"""
+
+import os, sys, time, tempfile
+import numpy as np
+
+from watpy.utils.ioutils import loadtxt_fast, loadtxt_cached, txtcache_clear
+from watpy.wave.wave import wfile_parse_name
+
+data_path = '../tutorials/TestData'
+sims = ['MySim_BAM_135135', 'MySim_THC_135135', 'MySim_THC_135135/CoReDB']
+
+
+def load_all(files, cache_dir=None):
+    for f in files:
+        if cache_dir is None:
+            data, header = loadtxt_fast(f, usecols=[0,1,2])
+        else:
+            data, header = loadtxt_cached(f, cache_dir, usecols=[0,1,2])
+        data.T.copy()
+
+
+if __name__ == "__main__":
+
+    nrep = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    cache_dir = tempfile.mkdtemp(prefix='watpy_txtcache_')
+
+    print('{:28s} {:>6s} {:>10s} {:>10s} {:>10s} {:>8s}'.format('sim', 'files',
+          'text[s]', 'cold[s]', 'warm[s]', 'speedup'))
+    for sim in sims:
+        path  = os.path.join(data_path, sim)
+        files = [os.path.join(path,f) for f in sorted(os.listdir(path))
+                 if wfile_parse_name(f)]
+
+        ttxt, tcold, twarm = np.inf, np.inf, np.inf
+        for i in range(nrep):
+            t0 = time.perf_counter()
+            load_all(files)
+            ttxt = min(ttxt, time.perf_counter() - t0)
+
+            txtcache_clear(cache_dir)
+            t0 = time.perf_counter()
+            load_all(files, cache_dir)
+            tcold = min(tcold, time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            load_all(files, cache_dir)
+            twarm = min(twarm, time.perf_counter() - t0)
+
+        print('{:28s} {:6d} {:10.4f} {:10.4f} {:10.4f} {:8.1f}'.format(sim, len(files),
+              ttxt, tcold, twarm, ttxt/twarm))
+
+    txtcache_clear(cache_dir)
+    os.rmdir(cache_dir)
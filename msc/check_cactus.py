@@ -0,0 +1,109 @@
+#!/usr/bin/python
+
+"""
+Checks of the merge of the Cactus/WhiskyTHC restart segments against
+cactus_to_core() of watpy <= 0.1.1, on synthetic 'output-NNNN' segments
+
+Run as:
+  python check_cactus.py
+"""
+
+import os, sys, tempfile
+import numpy as np
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, '..'))
+
+from watpy.wave.wave import cactus_fname, cactus_merge, cactus_merge_segments, \
+                            cactus_to_core
+from watpy.wave.gwutils import fixed_freq_int
+
+modes = [(2,2), (3,3)]
+radii = [100., 300.]
+
+
+def psi4(t, l, m, r):
+    return np.exp(-1j*m*t/5.) * (1. + t/100.) / (l*r)
+
+
+def write_segments(path, bounds, dt=0.5):
+    """
+    One segment per (t0, t1), the first sample of each segment repeats
+    the last one of the previous segment as after a restart
+    """
+    for k, (t0, t1) in enumerate(bounds):
+        d = os.path.join(path, 'output-%04d' % k, 'data')
+        os.makedirs(d)
+        t = np.arange(t0, t1 + dt/2, dt)
+        for r in radii:
+            for l, m in modes:
+                y = psi4(t, l, m, r)
+                np.savetxt(os.path.join(d, cactus_fname(l, m, r)),
+                           np.column_stack((t, y.real, y.imag)))
+
+
+def legacy_cactus_to_core(path, prop):
+    """
+    cactus_to_core() as in watpy <= 0.1.1, with the segments in order
+    and the file name of cactus_fname()
+    """
+    l, m, r = prop['lmode'], prop['mmode'], prop['detector.radius']
+    t   = np.array([])
+    var = np.array([])
+    for seg in sorted(os.listdir(path)):
+        if seg.startswith('output-'):
+            raw = np.loadtxt(os.path.join(path, seg, 'data', cactus_fname(l, m, r)))
+            t   = np.append(t, raw[:,0])
+            var = np.append(var, raw[:,1]+raw[:,2]*1.0j)
+    t, msk = np.unique(t, axis=0, return_index=True)
+    var    = r * var[msk]
+    if prop['var'] == 'h':
+        var = fixed_freq_int(var, prop['init.frequency'], dt=t[1]-t[0])
+    return t, var.real, var.imag
+
+
+if __name__ == "__main__":
+
+    with tempfile.TemporaryDirectory() as path:
+        write_segments(path, [(0., 40.), (40., 75.), (75., 120.)])
+
+        # all modes and radii in one walk, serial, threads and index
+        data = cactus_merge_segments(path, modes, radii)
+        t    = np.arange(0., 120.25, 0.5)
+        for l, m in modes:
+            for r in radii:
+                tk, yk = data[(l, m, r)]
+                assert np.array_equal(tk, t)
+                assert np.allclose(yk, psi4(t, l, m, r), rtol=1e-14, atol=0)
+        for kw in [{'workers': 4}, {'index': True}]:
+            other = cactus_merge_segments(path, modes, radii, **kw)
+            assert other.keys() == data.keys()
+            for key in data:
+                assert all(np.array_equal(a, b) for a, b in zip(other[key], data[key]))
+        assert os.path.isfile(os.path.join(path, '.watpy_index.json'))
+        print('cactus_merge_segments serial/threads/index ok')
+
+        # single file as in watpy <= 0.1.1
+        for v in ['Psi4', 'h']:
+            prop = {'var': v, 'lmode': 2, 'mmode': 2, 'detector.radius': 300.,
+                    'init.frequency': 0.02}
+            out = cactus_to_core(path, prop)
+            ref = legacy_cactus_to_core(path, prop)
+            for a, b in zip(out, ref):
+                assert np.array_equal(a, b)
+        print('cactus_to_core vs legacy ok')
+
+        # a missing file is an error
+        prop['detector.radius'] = 500.
+        try:
+            cactus_to_core(path, prop)
+            raise AssertionError('no ValueError')
+        except ValueError:
+            pass
+
+    # overlapping segments: the later segment wins
+    t, y = cactus_merge([np.arange(0., 10.), np.arange(6., 12.)],
+                        [np.zeros(10), np.ones(6)])
+    assert np.array_equal(t, np.arange(0., 12.))
+    assert np.array_equal(y, np.r_[np.zeros(6), np.ones(6)])
+    print('cactus_merge overlap ok')
@@ -0,0 +1,79 @@
+#!/usr/bin/python
+
+"""
+Check of the resolution convergence analysis (coredb.convergence) on
+synthetic runs with a second order phase error, written to temporary
+CoRe archives
+
+Run as:
+  python check_convergence.py
+"""
+
+import os, sys, tempfile
+from types import SimpleNamespace
+import numpy as np
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, '..'))
+
+from watpy.utils.coreh5 import CoRe_h5
+from watpy.coredb.convergence import CoRe_conv
+from watpy.coredb.coredb import CoRe_sim
+
+p_exact = 2.
+hs = {'R01': 0.4, 'R02': 0.3, 'R03': 0.2, 'R04': 0.15}
+
+
+def synthetic_run(path, h):
+    """
+    Strain (2,2) with amplitude peak at u=0 and phase error h^p (u+1000)^2
+    """
+    u   = np.linspace(-1000., 200., 6001)
+    amp = np.exp(-(u/300.)**2) * (1. + 0.01*h**p_exact)
+    phi = 0.1*u + 1e-5*h**p_exact*(u + 1000.)**2
+    y   = amp*np.exp(-1j*phi)
+    dset = np.c_[u, y.real, y.imag, np.zeros_like(u), amp, phi, u]
+    CoRe_h5(path).write_arrays({'rh_22': {'Rh_l2_m2_r00400.txt': dset}})
+
+
+if __name__ == "__main__":
+
+    with tempfile.TemporaryDirectory() as tmp:
+        run = {}
+        for r, h in hs.items():
+            os.makedirs(os.path.join(tmp, r))
+            synthetic_run(os.path.join(tmp, r), h)
+            run[r] = SimpleNamespace(data=CoRe_h5(os.path.join(tmp, r)))
+        sim = SimpleNamespace(run=run)
+
+        res = CoRe_conv(sim, h=hs).analyze(l=2, m=2)
+        print('order {:.6f} (exact {})'.format(res['order'], p_exact))
+        assert abs(res['order'] - p_exact) < 1e-6
+
+        # aligned phase of the continuum limit
+        err = np.max(np.abs(res['phi_rich'] - 0.1*res['u']))
+        print('Richardson phase max abs. err {:.2e}, finest run {:.2e}'.format(
+              err, np.max(res['band_phi'])))
+        assert err < 1e-6 * np.max(res['band_phi']) + 1e-10
+
+        # CoRe_sim.convergence() rebuilds the analysis of a subset of the
+        # runs for all the runs, and after del_run()
+        sim.conv = None
+        sub = CoRe_sim.convergence(sim, runs=['R02','R03','R04'], h=hs)
+        assert sim.conv.runs == ['R02','R03','R04']
+        full = CoRe_sim.convergence(sim, h=hs)
+        assert sim.conv.runs == ['R01','R02','R03','R04']
+        assert np.array_equal(full['phi_rich'], res['phi_rich'])
+        CoRe_sim.del_run(sim, 'R01')
+        assert sim.conv is None
+        assert np.array_equal(CoRe_sim.convergence(sim, h=hs)['phi_rich'], sub['phi_rich'])
+
+        # a replaced run is reloaded by the cached analysis
+        conv = sim.conv
+        os.makedirs(os.path.join(tmp, 'R05'))
+        synthetic_run(os.path.join(tmp, 'R05'), 2*hs['R04'])
+        run['R04'] = SimpleNamespace(data=CoRe_h5(os.path.join(tmp, 'R05')))
+        new = conv.analyze(l=2, m=2, p=p_exact)
+        assert not np.array_equal(new['phi'][-1], sub['phi'][-1])
+        assert np.array_equal(new['phi'][-1], CoRe_conv(sim, h=hs).analyze(p=p_exact)['phi'][-1])
+        print('convergence cache invalidation ok')
@@ -0,0 +1,109 @@
+#!/usr/bin/python
+
+"""
+Checks of the CoRe_h5 wave_array interface on the BAM test data
+of the tutorials, written to a temporary archive
+
+Run as:
+  python check_coreh5.py
+"""
+
+import os, sys, tempfile
+import numpy as np
+import h5py
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, '..'))
+
+from watpy.wave.wave import mwaves, wave_array, wfile_parse_name
+from watpy.utils.coreh5 import CoRe_h5
+from bench_coreh5_ingest import datain_core, legacy_create_dset, same_archive
+
+data_path = os.path.join(here, '..', 'tutorials', 'TestData', 'MySim_BAM_135135')
+core_path = os.path.join(here, '..', 'tutorials', 'TestData', 'MySim_THC_135135', 'CoReDB')
+mass = 2.700297
+f0   = 3.789461e-02 / (2*np.pi) / mass
+
+
+def relerr(a, b):
+    return np.max(np.abs(a - b)) / np.max(np.abs(b))
+
+
+def raises(fun, exc=ValueError):
+    try:
+        fun()
+    except exc:
+        return True
+    return False
+
+
+if __name__ == "__main__":
+
+    fnames = [f for f in sorted(os.listdir(data_path)) if wfile_parse_name(f)]
+    wm = mwaves(path=data_path, code='bam', filenames=fnames,
+                mass=mass, f0=f0, ignore_negative_m=True)
+    ref = wm.extrap_rinf(var=['h','Psi4'], method='poly')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        h5 = CoRe_h5(tmp)
+        for v in ['h','Psi4']:
+            wm.to_array(var=v).write_core(h5=h5)
+
+        # same extrapolation through the archive
+        out = h5.extrap_rinf(var=['h','Psi4'], method='poly', mass=mass, f0=f0)
+        for v in out:
+            err = relerr(out[v].data, ref[v].data)
+            print('extrap_rinf {:4s} mwaves vs CoRe_h5   max rel. err {:.2e}'.format(v, err))
+            assert err < 1e-10, err
+
+        # radii are parsed from the dataset names, also beyond 5 digits
+        wa = wm.to_array(var='h')
+        big = wave_array(wa.time, wa.data, wa.modes, [30*r for r in wa.radii],
+                         var='h', mass=mass, f0=f0)
+        h5big = CoRe_h5(tmp, dfile='big.h5')
+        big.write_core(h5=h5big)
+        wb = h5big.to_array(var='h', mass=mass)
+        print('radii from dataset names', wb.radii)
+        assert wb.radii == big.radii
+
+        # without the t column the retarded time is used
+        dsets = wa.core_dsets()
+        for g in dsets:
+            for f in dsets[g]:
+                dsets[g][f] = dsets[g][f][:,:6]
+        h5u = CoRe_h5(tmp, dfile='u.h5')
+        h5u.write_arrays(dsets)
+        assert not h5u.has_time(var='h') and h5.has_time(var='h')
+        assert raises(lambda: h5u.to_array(var='h', mass=mass, time='t'))
+        h5u.extrap_rinf(var='h', method='poly', mass=mass)
+
+        # clear errors on missing inputs
+        assert raises(lambda: h5.to_array(var='h'))
+        assert raises(lambda: h5.write_to_txt())
+        assert raises(lambda: h5.extrap_rinf(var='h', method='pert', mass=mass, madm=mass))
+        assert raises(lambda: wave_array(wa.time, wa.data, wa.modes, wa.radii,
+                                         var='Psi4').get_strain())
+        print('input checks ok')
+
+    # ingestion of the CoRe text files, serial and parallel, with filters
+    datain = datain_core(core_path)
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_create_dset(tmp, datain, core_path)
+        ref = os.path.join(tmp, 'data.h5')
+        for kw in [{}, {'workers': 4}, {'workers': 4, 'chunks': 4096},
+                   {'workers': 2, 'compression': 'gzip', 'compression_opts': 4, 'shuffle': True}]:
+            h5 = CoRe_h5(tmp, dfile='new.h5')
+            h5.create_dset(datain, path=core_path, dfile='new.h5', **kw)
+            assert same_archive(ref, os.path.join(tmp, 'new.h5')), kw
+            os.remove(os.path.join(tmp, 'new.h5'))
+        # existing datasets are kept if not overwrite
+        h5 = CoRe_h5(tmp, dfile='new.h5')
+        h5.create_dset(datain, path=core_path, dfile='new.h5')
+        g = sorted(datain)[0]
+        f = datain[g][0]
+        with h5py.File(os.path.join(tmp, 'new.h5'), 'a') as fn:
+            fn[g][f][0,0] = -1.
+        h5.create_dset(datain, path=core_path, dfile='new.h5', workers=2, overwrite=False)
+        with h5py.File(os.path.join(tmp, 'new.h5'), 'r') as fn:
+            assert fn[g][f][0,0] == -1.
+    print('create_dset serial/parallel vs legacy writer ok')
@@ -0,0 +1,63 @@
+#!/usr/bin/python
+
+"""
+Checks of the finite differencing of utils.fdiff: convergence order
+of fd_diff on uniform and nonuniform grids, stacked data, and the
+num.diff1/diff2 wrappers against the loops of watpy <= 0.1.1
+
+Run as:
+  python check_fdiff.py
+"""
+
+import os, sys
+import numpy as np
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, '..'))
+
+from watpy.utils import num, fdiff
+from bench_fdiff import legacy_diff1, legacy_diff2
+
+
+def grid(n, uniform):
+    t = np.linspace(0., 2*np.pi, n)
+    if not uniform:
+        t = t + 0.3*(t[1]-t[0])*np.sin(3*t)
+    return t
+
+
+def error(n, d, o, uniform):
+    t  = grid(n, uniform)
+    dy = fdiff.fd_diff(t, np.sin(t), d, o)
+    ex = np.cos(t) if d == 1 else -np.sin(t)
+    return np.max(np.abs(dy - ex))
+
+
+if __name__ == "__main__":
+
+    # measured order from the errors at n and 2n, with n small enough
+    # to stay above the roundoff floor (the one-sided boundary 
+    # stencils have order o-d+1 at least)
+    for uniform in [True, False]:
+        for d in [1, 2]:
+            for o in [2, 4, 6]:
+                p = np.log2(error(60, d, o, uniform)/error(120, d, o, uniform))
+                print('fd_diff d={} o={} {:10s} order {:.2f}'.format(d, o,
+                      'uniform' if uniform else 'nonuniform', p))
+                assert p > o - d + 0.5, p
+
+    # stacked data along any axis, complex data
+    t = grid(500, False)
+    Y = np.exp(1j*np.outer(np.arange(1, 4), t))
+    D = fdiff.fd_diff(t, Y, 1, 4, axis=-1)
+    assert np.allclose(fdiff.fd_diff(t, Y.T, 1, 4, axis=0), D.T)
+    for k in range(3):
+        assert np.allclose(D[k], fdiff.fd_diff(t, Y[k], 1, 4))
+    print('fd_diff stacked/complex ok')
+
+    # num.diff1/diff2 as in watpy <= 0.1.1
+    for y in [np.sin(t), Y[1]]:
+        assert np.allclose(num.diff1(t, y), legacy_diff1(t, y), rtol=1e-14, atol=0)
+        assert np.allclose(num.diff2(t, y), legacy_diff2(t, y), rtol=1e-14, atol=0)
+        assert np.allclose(num.diff1(t, y, pad=False), legacy_diff1(t, y, pad=False), rtol=1e-14, atol=0)
+    print('num.diff1/diff2 vs loops ok')
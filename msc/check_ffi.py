@@ -0,0 +1,98 @@
+#!/usr/bin/python
+
+"""
+Checks of the FFI routines of gwutils against the scipy.fftpack
+implementation of watpy <= 0.1.1, on the Psi4 (2,2) mode of the BAM
+and CoRe test data of the tutorials
+
+Run as:
+  python check_ffi.py
+"""
+
+import os, sys, math
+import numpy as np
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, '..'))
+
+from watpy.wave.wave import wave, mwaves
+from watpy.wave.gwutils import fixed_freq_int, fixed_freq_int_scan
+from watpy.utils.units import MSun_sec
+
+bam_path  = os.path.join(here, '..', 'tutorials', 'TestData', 'MySim_BAM_135135')
+core_path = os.path.join(here, '..', 'tutorials', 'TestData', 'MySim_THC_135135', 'CoReDB')
+bam_f0    = 3.789461e-02 / (2*np.pi) / 2.700297
+core_f0   = 565.08 * MSun_sec()
+
+
+def legacy_fixed_freq_int_2(signal, cutoff, dt=1):
+    """
+    fixed_freq_int_2() as in watpy <= 0.1.1
+    """
+    from scipy.fftpack import fft, ifft, fftfreq
+    f = fftfreq(signal.shape[0], dt)
+    idx_p = np.logical_and(f >= 0, f < cutoff)
+    idx_m = np.logical_and(f <  0, f > -cutoff)
+    f[idx_p] = cutoff
+    f[idx_m] = -cutoff
+    return ifft(-fft(signal)/(2*math.pi*f)**2)
+
+
+def relerr(a, b):
+    return np.max(np.abs(a - b)) / np.max(np.abs(b))
+
+
+if __name__ == "__main__":
+
+    w  = wave(path=bam_path, code='bam', filename='Rpsi4mode22_r12.l0',
+              mass=2.700297, f0=bam_f0)
+    dt = w.time[1] - w.time[0]
+    fc = bam_f0
+
+    # batched FFI vs the legacy one
+    err = relerr(fixed_freq_int(w.p4, fc, dt=dt), legacy_fixed_freq_int_2(w.p4, fc, dt=dt))
+    print('fixed_freq_int vs legacy        max rel. err {:.2e}'.format(err))
+    assert err < 1e-12, err
+    rows = np.array([w.p4, 2*w.p4])
+    err = relerr(fixed_freq_int(rows, [fc, 2*fc], dt=dt)[1],
+                 legacy_fixed_freq_int_2(2*w.p4, 2*fc, dt=dt))
+    print('fixed_freq_int rows             max rel. err {:.2e}'.format(err))
+    assert err < 1e-12, err
+
+    # threads do not change the result, the padded one is cropped back
+    assert np.array_equal(fixed_freq_int(rows, fc, dt=dt, workers=4), fixed_freq_int(rows, fc, dt=dt))
+    hp = fixed_freq_int(w.p4, fc, dt=dt, pad=True)
+    assert hp.shape == w.p4.shape
+
+    # batched strain of all the modes vs the strain of each wave
+    wm = mwaves(path=bam_path, code='bam', mass=2.700297, f0=bam_f0,
+                filenames=['Rpsi4mode{}{}_r12.l0'.format(l, m) for l in [2,3,4] for m in range(l+1)])
+    hw = wm.to_array(var='Psi4').get_strain()
+    for l, m in wm.modes:
+        assert np.allclose(hw.get(l, m), wm.get(l=l, m=m).h, rtol=0, atol=1e-14*np.abs(hw.get(l, m)).max())
+    print('fixed_freq_int threads/pad and wave_array.get_strain ok')
+
+    # cutoff scan with a window, strain and drift of the windowed strain
+    win   = np.hanning(len(w.p4))**0.1
+    fcuts = fc * np.linspace(0.5, 1.5, 5)
+    hs    = fixed_freq_int_scan(w.p4, fcuts, dt=dt, win=win)
+    ref   = np.array([win * fixed_freq_int(win * w.p4, c, dt=dt) for c in fcuts])
+    err   = relerr(hs, ref)
+    print('fixed_freq_int_scan, window     max rel. err {:.2e}'.format(err))
+    assert err < 1e-12, err
+
+    diag = fixed_freq_int_scan(w.p4, fcuts, dt=dt, win=win, drift=True)
+    t    = dt*np.arange(len(w.p4))
+    for k, h in enumerate(ref):
+        b = np.polyfit(t, h.real, 1)[0] + 1j*np.polyfit(t, h.imag, 1)[0]
+        assert np.isclose(diag['slope'][k], abs(b), rtol=1e-8)
+        assert np.isclose(diag['drift'][k], abs(b)*t[-1]/np.max(np.abs(h)), rtol=1e-8)
+    print('fixed_freq_int_scan drift of the windowed strain ok')
+
+    # CoRe strain waves scan the Psi4 of the matching Rpsi4 file
+    wh = wave(path=core_path, code='core', filename='Rh_l2_m2_r00400.txt',
+              mass=2.728, f0=core_f0)
+    wp = wave(path=core_path, code='core', filename='Rpsi4_l2_m2_r00400.txt',
+              mass=2.728, f0=core_f0)
+    assert np.array_equal(wh.get_strain_scan(), wp.get_strain_scan())
+    print('get_strain_scan on CoRe strain ok')
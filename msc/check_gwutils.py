@@ -0,0 +1,115 @@
+#!/usr/bin/python
+
+"""
+Checks of the vectorized routines of wave.gwutils against the
+pointwise implementations of watpy <= 0.1.1
+
+Run as:
+  python check_gwutils.py
+"""
+
+import os, sys
+import numpy as np
+import scipy as sp
+from scipy.special import factorial as fact
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, '..'))
+
+from watpy.wave import gwutils
+
+
+def legacy_wigner_d_function(l, m, s, incl):
+    costheta = np.cos(incl*0.5)
+    sintheta = np.sin(incl*0.5)
+    norm = np.sqrt( (fact(l+m) * fact(l-m) * fact(l+s) * fact(l-s)) )
+    ki = np.amax([0,m-s])
+    kf = np.amin([l+m,l-s])
+    k = np.arange(ki,kf+1)
+    div = 1.0/( fact(k) * fact(l+m-k) * fact(l-s-k) * fact(s-m+k) )
+    dWig = div*( np.power(-1.,k) * np.power(costheta,2*l+m-s-2*k) * np.power(sintheta,2*k+s-m) )
+    return norm * np.sum(dWig)
+
+
+def legacy_spinw_spherical_harm(s, l, m, incl, phi):
+    c = np.power(-1.,-s) * np.sqrt( (2.*l+1.)/(4.*np.pi) )
+    return c * legacy_wigner_d_function(l,m,-s,incl) * np.exp(1j*m*phi)
+
+
+def legacy_richardson_extrap_series(p, y, t, h):
+    """
+    richardson_extrap_series() as in watpy <= 0.1.1, pointwise tableau,
+    returns also the error estimate
+    """
+    N = len(h)
+    te = t[-1]; n = len(te)
+    ye = np.zeros(n); err = np.zeros(n)
+    intrp_y = [ np.interp(te, t[k], y[k]) for k in range(N-1) ]
+    intrp_y.append(y[-1])
+    for i in range(n):
+        extrp_y = np.zeros((N,N))
+        extrp_y[:,0] = [ intrp_y[k][i] for k in range(N) ]
+        for k in range(1,N):
+            for j in range(0, k):
+                extrp_y[k,j+1] = gwutils.richardson_extrap(p+j, extrp_y[k-1,j], h[k-1], extrp_y[k,j], h[k])
+        err[i] = extrp_y[-1,-1] - extrp_y[-2,-2]
+        ye[i] = extrp_y[-1,-1]
+    return ye, te, err
+
+
+def legacy_radius_extrap_polynomial(ys, rs, K):
+    """
+    radius_extrap_polynomial() as in watpy <= 0.1.1, one lstsq per sample
+    """
+    N = len(ys); L = len(ys[0])
+    yinfty = np.zeros(L, dtype=np.result_type(ys[0], float))
+    M = np.array(rs)[:, np.newaxis]**(-np.array(range(K+1)))
+    for i in range(L):
+        ys_i = [ ys[k][i] for k in range(N) ]
+        p, *_ = sp.linalg.lstsq(M, ys_i)
+        yinfty[i] = p[0]
+    return yinfty
+
+
+if __name__ == "__main__":
+
+    # spin-weighted spherical harmonics, scalar, array and matrix forms
+    modes = [(l, m) for l in range(2, 9) for m in range(-l, l+1)]
+    incl  = np.linspace(0., np.pi, 7)
+    phi   = np.linspace(0., 2*np.pi, 7)
+    ref = np.array([[legacy_spinw_spherical_harm(-2, l, m, i, p) for l, m in modes]
+                    for i, p in zip(incl, phi)])
+    arr = np.array([gwutils.spinw_spherical_harm(-2, l, m, incl, phi) for l, m in modes]).T
+    mat = gwutils.spinw_spherical_harm_matrix(-2, modes, incl, phi)
+    assert np.allclose(arr, ref, rtol=1e-12, atol=1e-14)
+    assert np.allclose(mat, ref, rtol=1e-12, atol=1e-14)
+    print('spinw_spherical_harm(_matrix) up to l=8 ok')
+
+    # Richardson extrapolation, data of different lengths, stacked data
+    h = np.array([0.4, 0.2, 0.1, 0.05])
+    t = [np.linspace(0., 10., n) for n in [101, 201, 301, 401]]
+    y = [np.sin(tk) + hk**2*np.cos(tk) + hk**3*tk for tk, hk in zip(t, h)]
+    ye, te, err = gwutils.richardson_extrap_series(2, y, t, h, return_err=True)
+    ref = legacy_richardson_extrap_series(2, y, t, h)
+    assert np.array_equal(te, ref[1])
+    assert np.allclose(ye, ref[0], rtol=1e-13, atol=1e-13)
+    assert np.allclose(err, ref[2], rtol=1e-13, atol=1e-13)
+    Y = [np.array([yk, 2*yk]) for yk in y]
+    yes, _ = gwutils.richardson_extrap_series(2, Y, t, h)
+    assert np.allclose(yes, [ye, 2*ye], rtol=1e-13, atol=1e-13)
+    print('richardson_extrap_series vs pointwise tableau ok')
+
+    # polynomial extrapolation in 1/r, complex and stacked data, residuals
+    u  = np.linspace(0., 10., 200)
+    rs = np.array([100., 200., 300., 400., 600.])
+    ys = [np.exp(1j*u) * (1. + 3./r + 20.*np.sin(u)/r**2) for r in rs]
+    for K in [1, 2, 3]:
+        yinf = gwutils.radius_extrap_polynomial(ys, rs, K)
+        ref  = legacy_radius_extrap_polynomial(ys, rs, K)
+        assert np.allclose(yinf, ref, rtol=1e-10, atol=1e-12)
+    assert np.allclose(yinf, np.exp(1j*u), atol=1e-8)
+    Ys = [np.array([yk.real, yk.imag]) for yk in ys]
+    yinf, res = gwutils.radius_extrap_polynomial(Ys, rs, 2, return_res=True)
+    assert np.allclose(yinf, [ref.real, ref.imag], atol=1e-8)
+    assert res.shape == (len(rs),) + Ys[0].shape and np.max(np.abs(res)) < 1e-10
+    print('radius_extrap_polynomial vs pointwise lstsq ok')
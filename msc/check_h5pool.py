@@ -0,0 +1,56 @@
+#!/usr/bin/python
+
+"""
+Checks of the pool of read-only HDF5 handles (utils.coreh5.h5_pool)
+on a temporary archive
+
+Run as:
+  python check_h5pool.py
+"""
+
+import os, sys, tempfile
+import numpy as np
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, '..'))
+
+from watpy.utils.coreh5 import CoRe_h5, h5_pool, h5pool
+
+
+if __name__ == "__main__":
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fname = os.path.join(tmp, 'data.h5')
+        data  = np.random.rand(100, 7)
+        CoRe_h5(tmp).write_arrays({'rh_22': {'Rh_l2_m2_r00400.txt': data}})
+
+        # closing a handle in use defers the close to its release
+        pool = h5_pool(maxsize=2, timeout=None)
+        with pool.open(fname) as fn:
+            pool.close(fname)
+            assert pool.info()['open'] == 0
+            assert np.array_equal(fn['rh_22/Rh_l2_m2_r00400.txt'][()], data)
+            with pool.open(fname) as fn2:
+                assert fn2 is not fn
+            assert fn.id.valid
+        assert not fn.id.valid and fn2.id.valid and pool.info()['open'] == 1
+        pool.close()
+        assert not fn2.id.valid
+        print('close of in-use handle deferred ok')
+
+        # the handles acquired in a with block are released on exit
+        with CoRe_h5(tmp) as h5:
+            ref = h5.read_dset()
+            assert os.path.abspath(fname) in h5pool.handles
+        assert os.path.abspath(fname) not in h5pool.handles
+        assert np.array_equal(ref['rh_22']['Rh_l2_m2_r00400.txt'],
+                              CoRe_h5(tmp).read_dset()['rh_22']['Rh_l2_m2_r00400.txt'])
+        print('handles released on exit ok')
+
+        # writes close the pooled handles, later reads see the new data
+        h5 = CoRe_h5(tmp, pool=True)
+        h5.read_dset()
+        h5.write_arrays({'rh_22': {'Rh_l2_m2_r00400.txt': 2*data}})
+        assert np.array_equal(h5.read_dset()['rh_22']['Rh_l2_m2_r00400.txt'], 2*data)
+        h5_pool.close_all()
+        print('write through the pool ok')
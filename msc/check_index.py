@@ -0,0 +1,78 @@
+#!/usr/bin/python
+
+"""
+Checks of wfile_index against a walk of the test data of the tutorials
+with wfile_parse_name() and the header readers
+
+Run as:
+  python check_index.py
+"""
+
+import os, sys, shutil, tempfile
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, '..'))
+
+from watpy.wave.wave import wfile_index, wfile_parse_name, wfile_get_detrad, \
+                            wfile_get_detrad_bam
+
+data_path = os.path.join(here, '..', 'tutorials', 'TestData')
+
+
+def walk(path):
+    """
+    Waveform files of path as (code, var, l, m, r, relative path)
+    """
+    out = []
+    for dpath, dirs, files in os.walk(path):
+        for f in files:
+            vlmr = wfile_parse_name(f)
+            if vlmr is None:
+                continue
+            var, l, m, r, tp = vlmr
+            fname = os.path.join(dpath, f)
+            if tp == 'bam':
+                r = wfile_get_detrad_bam(fname)
+            elif tp == 'core':
+                r = wfile_get_detrad(fname)
+            if var == 'psi4': var = 'Psi4'
+            out.append((tp, var, l, m, r, os.path.relpath(fname, path)))
+    return sorted(out, key=lambda e: e[-1])
+
+
+def entries(index):
+    return [tuple(e[k] for k in ['code','var','l','m','r','path']) for e in index.entries]
+
+
+if __name__ == "__main__":
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'TestData')
+        shutil.copytree(data_path, path)
+
+        # scan vs walk, threads
+        ref = walk(path)
+        idx = wfile_index(path)
+        assert entries(idx) == ref
+        assert entries(wfile_index(path, persist=False, workers=4)) == ref
+        print('wfile_index scan vs wfile_parse_name ok ({} files)'.format(len(ref)))
+
+        # reloaded from the index file, rescanned when a file is added
+        again = wfile_index(path, rescan=True, persist=False)
+        again.fname = idx.fname
+        assert again.load() and entries(again) == ref
+        sim = os.path.join(path, 'MySim_THC_135135', 'CoReDB')
+        shutil.copy(os.path.join(sim, 'Rh_l2_m2_r00400.txt'),
+                    os.path.join(sim, 'Rh_l2_m2_r00500.txt'))
+        assert not again.valid()
+        new = wfile_index(path)
+        assert entries(new) == walk(path) and len(new) == len(ref) + 1
+        print('wfile_index persist/reload/rescan ok')
+
+        # lookups
+        core = new.find(code='core', var='h', l=2, m=2)
+        assert len(core) == len([e for e in walk(path) if e[:4] == ('core','h',2,2)])
+        r = core[0]['r']
+        assert new.files(code='core', var='h', l=2, m=2, r=r) == [e['path'] for e in core if e['r'] == r]
+        assert new.segments() == []
+        print('wfile_index find/files ok')
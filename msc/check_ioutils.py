@@ -0,0 +1,157 @@
+#!/usr/bin/python
+
+"""
+Checks of the file readers of utils.ioutils against the readers of
+watpy <= 0.1.1, on the test data of the tutorials
+
+Run as:
+  python check_ioutils.py
+"""
+
+import os, sys, re, shutil, tempfile
+import numpy as np
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, '..'))
+
+from watpy.utils import ioutils
+from watpy.wave.wave import wfile_parse_name, wfile_get_detrad, wfile_get_mass, \
+                            wfile_get_detrad_bam, rinf_str_to_float
+
+data_path = os.path.join(here, '..', 'tutorials', 'TestData')
+
+
+def legacy_detrad_bam(fname):
+    """
+    wfile_get_detrad_bam() as in watpy <= 0.1.1, regex over the whole file
+    """
+    s = ioutils.extract_comments(fname, '"')
+    try:
+        rad_str = re.findall(r"\d+\.\d+",s[0])[2]
+    except:
+        rad_str = re.findall(r"\w+",s[0])[2]
+    return rinf_str_to_float(rad_str)
+
+
+def legacy_collate(fnames, tidx=0, comments=["#", "%"], include_comments=False,
+                   epsilon=1e-15):
+    """
+    collate() as in watpy <= 0.1.1, files read backwards line by line
+    """
+    sout = []
+    told  = None
+    for fname in reversed(fnames):
+        for dline in reversed(open(fname).readlines()):
+            skip = False
+            for c in comments:
+                if dline[:len(c)] == c:
+                    if include_comments:
+                        sout.append(dline)
+                    skip = True
+                    break
+            if skip:
+                continue
+            try:
+                tnew = float(dline.split()[tidx])
+            except IndexError:
+                continue
+            if told is None or tnew < told*(1 - epsilon):
+                sout.append(dline)
+                told = tnew
+    return ''.join(reversed(sout))
+
+
+def write_segments(path, bounds):
+    """
+    Restart segments of two columns (t, t**2) with a header, 
+    overlapping in time
+    """
+    fnames = []
+    for k, (t0, t1) in enumerate(bounds):
+        fnames.append(os.path.join(path, 'seg%d.asc' % k))
+        t = np.arange(t0, t1, 0.25)
+        np.savetxt(fnames[-1], np.column_stack((1.+t, (1.+t)**2)),
+                   header='segment {}\n1:t 2:y'.format(k), fmt='%.8e')
+    return fnames
+
+
+def load_cached(args):
+    fname, cdir = args
+    return np.array(ioutils.loadtxt_cached(fname, cdir)[0])
+
+
+def files(sim):
+    path = os.path.join(data_path, sim)
+    return [os.path.join(path, f) for f in sorted(os.listdir(path)) if wfile_parse_name(f)]
+
+
+if __name__ == "__main__":
+
+    # headers: only the leading comment lines are read
+    bam  = files('MySim_BAM_135135')
+    core = [f for f in files('MySim_THC_135135/CoReDB') if not 'EJ_' in f]
+    for f in bam:
+        assert wfile_get_detrad_bam(f) == legacy_detrad_bam(f)
+    for f in core:
+        s = ioutils.extract_comments(f, '#')
+        assert wfile_get_detrad(f) == rinf_str_to_float(s[0].split("=")[1])
+        assert wfile_get_mass(f) == float(s[1].split("=")[1])
+    assert ioutils.read_headers(bam, workers=4) == [ioutils.read_header(f) for f in bam]
+    print('read_header(s) vs full-file comments ok ({} files)'.format(len(bam)+len(core)))
+
+    # binary sidecar cache of the parsed files
+    with tempfile.TemporaryDirectory() as tmp:
+        cdir = os.path.join(tmp, 'cache')
+        for f in core:
+            ref  = ioutils.loadtxt_fast(f, usecols=[0,1,2])
+            cold = ioutils.loadtxt_cached(f, cdir, usecols=[0,1,2])
+            warm = ioutils.loadtxt_cached(f, cdir, usecols=[0,1,2])
+            assert isinstance(warm[0], np.memmap)
+            for a in [cold, warm]:
+                assert np.array_equal(a[0], ref[0]) and a[1] == ref[1]
+        # entries are rewritten when the text file changes
+        f = os.path.join(tmp, os.path.basename(core[0]))
+        shutil.copy(core[0], f)
+        a = ioutils.loadtxt_cached(f, cdir)[0]
+        with open(f, 'a') as fp:
+            fp.write(' '.join(['1.0']*a.shape[1]) + '\n')
+        b = ioutils.loadtxt_cached(f, cdir)[0]
+        assert len(b) == len(a) + 1
+        # size cap
+        size = ioutils.txtcache_evict(cdir, 3*a.nbytes)
+        assert size <= 3*a.nbytes
+        # entries depend on the comment characters
+        g = os.path.join(tmp, 'com.txt')
+        with open(g, 'w') as fp:
+            fp.write('# h\n1 2\n3 4\n5 6\n')
+        assert len(ioutils.loadtxt_cached(g, cdir, comments=['#','5'])[0]) == 2
+        assert len(ioutils.loadtxt_cached(g, cdir, comments='#')[0]) == 3
+        # processes filling the same entry
+        from concurrent.futures import ProcessPoolExecutor
+        ref = ioutils.loadtxt_fast(core[0])[0]
+        with ProcessPoolExecutor(max_workers=4) as ex:
+            for it in range(5):
+                ioutils.txtcache_clear(cdir)
+                for a in ex.map(load_cached, [(core[0], cdir)]*8):
+                    assert np.array_equal(a, ref)
+        assert not [f for f in os.listdir(cdir) if f.endswith('.tmp')]
+    print('loadtxt_cached cold/warm/stale/evict ok')
+
+    # merge of restart segments, in chunks and to npy
+    with tempfile.TemporaryDirectory() as tmp:
+        fnames = write_segments(tmp, [(0., 30.), (20., 50.), (45., 46.), (45., 80.)])
+        for inc in [False, True]:
+            ref = legacy_collate(fnames, include_comments=inc)
+            assert ioutils.collate(fnames, include_comments=inc) == ref
+            for chunk in [1, 7, 2**16]:
+                assert ioutils.collate_stream(fnames, include_comments=inc, chunk=chunk) == ref
+        outf = os.path.join(tmp, 'out.txt')
+        n = ioutils.collate_stream(fnames, outf, chunk=5)
+        with open(outf) as f:
+            assert f.read() == legacy_collate(fnames)
+        data = np.loadtxt(outf)
+        assert n == len(data) and np.all(np.diff(data[:,0]) > 0)
+        outn = os.path.join(tmp, 'out.npy')
+        assert ioutils.collate_stream(fnames, outn, fmt='npy', chunk=5) == n
+        assert np.array_equal(np.load(outn), data)
+    print('collate(_stream) vs legacy collate ok')
@@ -0,0 +1,148 @@
+#!/usr/bin/python
+
+"""
+Checks of the batched match and alignment routines of gwutils
+against match() and the loops of watpy <= 0.1.1, on the (2,2) mode
+of the BAM test data of the tutorials
+
+Run as:
+  python check_match.py
+"""
+
+import os, sys
+import numpy as np
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, '..'))
+
+from watpy.wave.wave import wave
+from watpy.wave.gwutils import match, match_engine, mismatch_mass_sweep, align, align_phase, \
+                               norm_dp_dt, min_phasediff_L2
+from watpy.utils.units import MSun_sec
+
+data_path = os.path.join(here, '..', 'tutorials', 'TestData', 'MySim_BAM_135135')
+mass = 2.700297
+f0   = 3.789461e-02 / (2*np.pi) / mass
+
+
+def strain(fname):
+    """
+    Real part of the strain, on a uniform grid of u/M
+    """
+    w = wave(path=data_path, code='bam', filename=fname, mass=mass, f0=f0)
+    u = w.time_ret()/mass
+    ui = np.linspace(u[0], u[-1], len(u))
+    return ui, np.interp(ui, u, w.h.real)
+
+
+def legacy_align(t, Tf, tau_max, t_a, phi_a, t_b, phi_b):
+    """
+    align() as in watpy <= 0.1.1, loop over the shifts
+    """
+    dt = t[1] - t[0]
+    N = int(tau_max/dt)
+    weight = np.double((t >= 0) & (t < Tf))
+    res_phi_b = np.interp(t, t_b, phi_b)
+    best = None
+    for i in range(-N, N):
+        res_phi_a_tau = np.interp(t, t_a + i*dt, phi_a)
+        dphi = align_phase(t, Tf, res_phi_a_tau, res_phi_b)
+        chi2 = np.sum(weight*(res_phi_a_tau - res_phi_b - dphi)**2)*dt
+        if best is None or chi2 < best[2]:
+            best = (i*dt, dphi, chi2)
+    return best
+
+
+if __name__ == "__main__":
+
+    u1, h1 = strain('Rpsi4mode22_r12.l0')
+    u2, h2 = strain('Rpsi4mode22_r01.l0')
+
+    # one-vs-many matches with the templates of match_engine
+    t1, t2 = u1*mass*MSun_sec(), u2*mass*MSun_sec()
+    fpsd = np.linspace(0., 1./(t1[1]-t1[0]), 1000)
+    psd  = 1. + (fpsd/500.)**2
+    eng  = match_engine(fpsd=fpsd, psd=psd, chunk=2)
+    eng.add('h1', t1, h1)
+    for k, s in enumerate([0., 0.3, 1.]):
+        eng.add(k, t2, np.roll(h2, int(s*100)))
+    out = eng.match(t1, h1, keys=[0, 1, 2])
+    df  = eng.df
+    for k, s in enumerate([0., 0.3, 1.]):
+        ref = match(t1, h1, t2, np.roll(h2, int(s*100)), fpsd=fpsd, psd=psd,
+                    fmin=eng.fmin, fmax=eng.fmax, df=df)
+        assert abs(out[k] - ref) < 1e-12, (out[k], ref)
+    assert abs(eng.match('h1', None, keys=['h1'])['h1'] - 1.) < 1e-12
+    print('match_engine vs match() ok')
+
+    # one mass per batch reproduces match() on the rescaled waveforms
+    masses = np.array([2.7, 1.2, 20.])
+    mm  = mismatch_mass_sweep(u1, h1, u2, h2, masses, chunk=1)
+    ref = np.array([1. - match(u1*M*MSun_sec(), h1, u2*M*MSun_sec(), h2)
+                    for M in masses])
+    err = np.max(np.abs(mm - ref))
+    print('mismatch_mass_sweep vs match()   max abs. err {:.2e}'.format(err))
+    assert err < 1e-10, err
+
+    # each mass has its own grid: batched, one mass per batch and match()
+    # agree on a non-flat PSD, the (3,3) mode of the flat PSD mismatch
+    # does not depend on the mass
+    u3, h3 = strain('Rpsi4mode33_r12.l0')
+    masses = np.array([1.2, 1.5, 2.7, 5., 10., 20.])
+    fpsd   = np.linspace(0., 1e5, 10001)
+    psd    = 1. + (fpsd/300.)**2
+    mmb = mismatch_mass_sweep(u1, h1, u3, h3, masses, fpsd=fpsd, psd=psd)
+    mm1 = mismatch_mass_sweep(u1, h1, u3, h3, masses, fpsd=fpsd, psd=psd, chunk=1)
+    ref = np.array([1. - match(u1*M*MSun_sec(), h1, u3*M*MSun_sec(), h3, fpsd=fpsd, psd=psd)
+                    for M in masses])
+    err = max(np.max(np.abs(mmb - mm1)), np.max(np.abs(mm1 - ref)))
+    print('mismatch_mass_sweep batched/chunk=1/match(), PSD max abs. err {:.2e}'.format(err))
+    assert err < 1e-10, err
+    mm = mismatch_mass_sweep(u1, h1, u3, h3, masses)
+    assert np.ptp(mm) < 1e-10, mm
+    # with fmin > 0 the grids of a batch differ in length, the padded
+    # FFT samples the time shifts more finely
+    mmb = mismatch_mass_sweep(u1, h1, u3, h3, masses, fmin=20.)
+    mm1 = mismatch_mass_sweep(u1, h1, u3, h3, masses, fmin=20., chunk=1)
+    ref = np.array([1. - match(u1*M*MSun_sec(), h1, u3*M*MSun_sec(), h3, fmin=20.)
+                    for M in masses])
+    assert np.max(np.abs(mm1 - ref)) < 1e-10
+    assert np.all(mmb <= mm1 + 1e-12) and np.max(mm1 - mmb) < 1e-5, mm1 - mmb
+
+    # the batch size follows the memory budget, not the mass range
+    masses = np.geomspace(1., 100., 64)
+    mm0 = mismatch_mass_sweep(u1, h1, u2, h2, masses)
+    mm1 = mismatch_mass_sweep(u1, h1, u2, h2, masses, maxbytes=2**20)
+    err = np.max(np.abs(mm1 - mm0))
+    print('mismatch_mass_sweep small budget max abs. diff {:.2e}'.format(err))
+    assert np.all(np.isfinite(mm1)) and err < 1e-3
+
+    # alignment of the phases, FFT search vs loop over the shifts
+    w1 = wave(path=data_path, code='bam', filename='Rpsi4mode22_r12.l0', mass=mass, f0=f0)
+    w2 = wave(path=data_path, code='bam', filename='Rpsi4mode22_r01.l0', mass=mass, f0=f0)
+    t  = w1.time_ret()
+    args = (t, 500., 50., w1.time_ret(), w1.phase(), w2.time_ret() + 7.3, w2.phase())
+    new, ref = align(*args), legacy_align(*args)
+    print('align vs loop: tau {} {}, chi2 rel. err {:.2e}'.format(new[0], ref[0],
+          abs(new[2] - ref[2])/ref[2]))
+    assert new[0] == ref[0] and abs(new[2] - ref[2]) <= 1e-10*ref[2]
+
+    # L2 phase distance, trapezoidal rule, 0 on an empty window
+    p1, p2 = w1.phase(), w2.phase()
+    tab = (100., 400.)
+    idx = (t >= tab[0]) & (t <= tab[1])
+    y   = (p1[idx] - np.interp(t[idx], t - 1., p2) - 0.5)**2
+    assert np.isclose(norm_dp_dt([1., 0.5], t, p1, t, p2, tab), np.trapezoid(y))
+    assert norm_dp_dt([1., 0.5], t, p1, t, p2, (-2., -1.)) == 0.
+    print('norm_dp_dt ok')
+
+    # minimization over the time shift, phase shift from the window
+    p2i, dp, dt, Dphi = min_phasediff_L2(t, p1, t - 3., p2 + 0.2, tab, guess=[-2., 0.])
+    assert norm_dp_dt([dt, dp], t, p1, t - 3., p2 + 0.2, tab) <= \
+           norm_dp_dt([-3., dp], t, p1, t - 3., p2 + 0.2, tab) + 1e-10
+    try:
+        min_phasediff_L2(t, p1, t, p2, (-2., -1.))
+        raise AssertionError('no ValueError')
+    except ValueError as err:
+        assert '[-2.0, -1.0]' in str(err)
+    print('min_phasediff_L2 ok')
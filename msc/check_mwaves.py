@@ -0,0 +1,146 @@
+#!/usr/bin/python
+
+"""
+Regression checks of the mwaves methods against the per-mode
+implementation of watpy <= 0.1.1 on the test data of the tutorials
+
+Run as:
+  python check_mwaves.py
+"""
+
+import os, sys, warnings
+import numpy as np
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, '..'))
+
+from watpy.wave.wave import mwaves, wfile_parse_name
+from watpy.wave.gwutils import waveform2energetics, spinw_spherical_harm
+from watpy.utils.num import diff1
+from watpy.utils.units import MSun_sec, MSun_meter
+
+data_path = os.path.join(here, '..', 'tutorials', 'TestData')
+
+bam = {'path': 'MySim_BAM_135135', 'code': 'bam', 'mass': 2.700297,
+       'f0': 3.789461e-02 / (2*np.pi) / 2.700297,
+       'm1': 1.350149, 'm2': 1.350149, 'madm': 2.678040, 'jadm': 7.858842}
+thc = {'path': 'MySim_THC_135135/CoReDB', 'code': 'core', 'mass': 2.728,
+       'f0': 565.08 * MSun_sec(),
+       'm1': 1.364, 'm2': 1.364, 'madm': 2.703, 'jadm': 7.400}
+
+
+def load(sim, **kwargs):
+    path   = os.path.join(data_path, sim['path'])
+    fnames = [f for f in sorted(os.listdir(path)) if wfile_parse_name(f)]
+    return mwaves(path=path, code=sim['code'], filenames=fnames,
+                  mass=sim['mass'], f0=sim['f0'], ignore_negative_m=True,
+                  **kwargs)
+
+
+def legacy_energetics(wm, m1, m2, madm, jadm):
+    """
+    mwaves.energetics() as in watpy <= 0.1.1, at the largest radius
+    """
+    h, h_dot = {}, {}
+    for lm in wm.modes:
+        w         = wm.get(l=lm[0], m=lm[1])
+        t         = w.time
+        h[lm]     = w.h
+        h_dot[lm] = diff1(t, h[lm])
+    e, edot, j, jdot = waveform2energetics(h, h_dot, t, wm.modes, wm.mmode)
+    eb   = (madm - e - m1 -m2) / (m1*m2/(m1+m2))
+    jorb = (jadm - j) / (m1*m2)
+    return e, edot, j, jdot, eb, jorb
+
+
+def legacy_hlm_to_strain(wm, phi=0, inclination=0):
+    """
+    mwaves.hlm_to_strain() as in watpy <= 0.1.1, with the harmonics
+    evaluated as (inclination, phi)
+    """
+    MPC_SI = 1e6 * 3.085677581491367e+16
+    wave22 = wm.get(l=2, m=2)
+    time = wave22.time_ret() * MSun_sec()
+    amplitude_prefactor = wave22.prop['mass'] * MSun_meter() / \
+                          (wave22.prop['detector.radius']*MPC_SI)
+    h = np.zeros_like(1j*time)
+    for (l,m) in wm.modes:
+        wavelm = wm.get(l=l, m=m)
+        hlm = amplitude_prefactor * wavelm.amplitude(var='h') * \
+              np.exp(-1j*wavelm.phase(var='h'))
+        h += hlm * spinw_spherical_harm(-2, l, m, inclination, phi)
+    return time, np.real(h), -np.imag(h)
+
+
+def relerr(a, b):
+    return np.max(np.abs(a - b)) / np.max(np.abs(b))
+
+
+if __name__ == "__main__":
+
+    for sim in [bam, thc]:
+        wm = load(sim)
+
+        ref = legacy_energetics(wm, sim['m1'], sim['m2'], sim['madm'], sim['jadm'])
+        wm.energetics(sim['m1'], sim['m2'], sim['madm'], sim['jadm'],
+                      radii=[wm.radii[-1]])
+        new = (wm.e, wm.edot, wm.j, wm.jdot, wm.eb, wm.jorb)
+        err = max([relerr(a, b) for a, b in zip(new, ref)])
+        print('{:28s} energetics     max rel. err {:.2e}'.format(sim['path'], err))
+        assert err < 1e-10, err
+
+        ref = legacy_hlm_to_strain(wm, phi=0.3, inclination=0.7)
+        new = wm.hlm_to_strain(phi=0.3, inclination=0.7)
+        err = max([relerr(a, b) for a, b in zip(new, ref)])
+        print('{:28s} hlm_to_strain  max rel. err {:.2e}'.format(sim['path'], err))
+        assert err < 1e-10, err
+
+        # concurrent loading gives the same waves as get()
+        for pool in ['thread', 'process']:
+            wl = load(sim, workers=4, pool=pool, preload=True)
+            for v in wl.var:
+                for l, m in wl.modes:
+                    a, b = wl.get(var=v, l=l, m=m), wm.get(var=v, l=l, m=m)
+                    assert np.array_equal(a.time, b.time) and np.array_equal(a.h, b.h)
+        print('{:28s} load           thread/process pools ok'.format(sim['path']))
+
+        # a cache too small for the loaded data is reported
+        with warnings.catch_warnings(record=True) as rec:
+            warnings.simplefilter('always')
+            load(sim, cache_size=2**16).load()
+        assert any(['cache_size' in str(r.message) for r in rec])
+
+        # cache of the objects returned by get()
+        wc = load(sim, cache_size=2**30)
+        a  = wc.get(l=2, m=2)
+        assert a is wc.get(l=2, m=2) and np.array_equal(a.h, wm.get(l=2, m=2).h)
+        wc.mass = 2*sim['mass']
+        assert wc.get(l=2, m=2) is not a
+        nb = a.nbytes()
+        wc = load(sim, cache_size=int(1.5*nb))
+        for l, m in wc.modes:
+            wc.get(l=l, m=m)
+        info = wc.cache_info()
+        assert info['entries'] == 1 and info['nbytes'] <= 1.5*nb and info['evictions'] > 0
+        # derived quantities computed after put() count in the budget
+        wc = load(sim, cache_size=int(2.5*nb))
+        a  = wc.get(l=2, m=2)
+        b  = wc.get(l=2, m=1)
+        assert wc.cache_info()['entries'] == 2
+        a.amplitude(); a.phase(); a.phase_diff1()
+        assert wc.get(l=2, m=2) is a
+        info = wc.cache_info()
+        assert info['entries'] == 1 and info['nbytes'] == a.nbytes() <= 2.5*nb
+        print('{:28s} get            cache ok'.format(sim['path']))
+
+        # stacked (radius, mode, time) representation
+        for v in wm.var:
+            wa = wm.to_array(var=v)
+            for r in wm.radii:
+                for l, m in wm.modes:
+                    w = wm.get(var=v, l=l, m=m, r=r)
+                    y = w.h if v == 'h' else w.p4
+                    assert np.array_equal(wa.time, w.time) and np.array_equal(wa.get(l, m, r), y)
+            k = wa.lm_idx[(2,2)]
+            assert np.allclose(wa.phase()[-1,k], wm.get(var=v).phase(var=v), rtol=0, atol=1e-12)
+        print('{:28s} to_array       wave_array ok'.format(sim['path']))
@@ -0,0 +1,53 @@
+#!/usr/bin/python
+
+"""
+Checks of the cache of derived quantities of wave on the BAM test
+data of the tutorials
+
+Run as:
+  python check_wave.py
+"""
+
+import os, sys
+import numpy as np
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, '..'))
+
+from watpy.wave.wave import wave
+from watpy.utils.num import diff1
+
+data_path = os.path.join(here, '..', 'tutorials', 'TestData', 'MySim_BAM_135135')
+mass = 2.700297
+f0   = 3.789461e-02 / (2*np.pi) / mass
+
+
+if __name__ == "__main__":
+
+    w = wave(path=data_path, code='bam', filename='Rpsi4mode22_r12.l0',
+             mass=mass, f0=f0)
+    amp = np.abs(w.h)
+    phi = -np.unwrap(np.angle(w.h))
+
+    # same values as computed directly
+    assert np.array_equal(w.amplitude(), amp) and np.array_equal(w.phase(), phi)
+    assert np.array_equal(w.phase_diff1(), diff1(w.time, phi, pad=True))
+
+    # copies by default, in-place changes do not reach the cache
+    a = w.amplitude()
+    a *= 2.
+    assert np.array_equal(w.amplitude(), amp)
+    assert w.cache_info()['hits'] >= 2
+    print('amplitude() returns writable copies ok')
+
+    # read-only views on request
+    wv = wave(path=data_path, code='bam', filename='Rpsi4mode22_r12.l0',
+              mass=mass, f0=f0, cache_views=True)
+    a = wv.amplitude()
+    assert a is wv.amplitude() and not a.flags.writeable
+    print('cache_views returns read-only views ok')
+
+    # reassigning the data invalidates the cache
+    w.h = 2*w.h
+    assert np.array_equal(w.amplitude(), 2*amp)
+    print('cache invalidated on reassignment ok')
@@ -1,3 +1,3 @@
 #!/usr/bin/env python
 
-from . import metadata, coredb
+from . import metadata, convergence, coredb
@@ -0,0 +1,184 @@
+import numpy as np
+
+from ..utils.num import bisection
+from ..wave.gwutils import richardson_extrap_series
+
+
+# ------------------------------------------------------------------
+# Resolution convergence of the runs of a CoRe simulation
+# ------------------------------------------------------------------
+
+
+def conv_ratio(p, h):
+    """
+    Expected ratio (y0-y1)/(y1-y2) of the differences between three
+    resolutions h = [h0, h1, h2] for convergence order p
+    """
+    return (h[0]**p - h[1]**p)/(h[1]**p - h[2]**p)
+
+
+def conv_order_array(ratio, h, domain=(0.1, 10.), nmax=52):
+    """
+    Convergence order for each element of the array ratio = (y0-y1)/(y1-y2),
+    solving conv_ratio(p, h) = ratio with a bisection vectorized over
+    the array. Elements without a solution in domain are nan.
+    """
+    ratio = np.asarray(ratio, dtype=float)
+    x1 = np.full(ratio.shape, domain[0])
+    x2 = np.full(ratio.shape, domain[1])
+    f1 = conv_ratio(x1, h) - ratio
+    ok = f1*(conv_ratio(x2, h) - ratio) <= 0
+    for it in range(nmax):
+        xm = 0.5*(x1 + x2)
+        fm = conv_ratio(xm, h) - ratio
+        left = fm*f1 > 0
+        x1 = np.where(left, xm, x1)
+        f1 = np.where(left, fm, f1)
+        x2 = np.where(left, x2, xm)
+    return np.where(ok, 0.5*(x1 + x2), np.nan)
+
+
+class CoRe_conv():
+    """
+    Resolution convergence analysis of the runs of a CoRe_sim
+
+    -----------
+    Input
+    -----------
+    sim     : CoRe_sim object
+    runs    : List of runs (e.g. ['R01','R02','R03']), defaults to all
+    h       : Dictionary run -> grid resolution, defaults to the metadata
+              'grid_spacing_min' of each run
+    -----------
+    Contains
+    -----------
+    * cache : dictionary (run, l, m, r) -> (u, h) of the loaded data,
+              u = retarded time/M and h = R h/M (complex). The data of
+              a run are reloaded if the run object of sim is replaced
+    """
+    def __init__(self, sim, runs=None, h=None):
+        self.sim   = sim
+        self.runs  = sorted(sim.run.keys()) if runs is None else list(runs)
+        self.cache = {}
+        self.src   = {}
+
+        if h is None:
+            h = {}
+            for r in self.runs:
+                try:
+                    h[r] = float(sim.run[r].md.data['grid_spacing_min'])
+                except (KeyError, TypeError, ValueError):
+                    raise ValueError("No grid_spacing_min for run {}, pass h".format(r))
+        self.h = h
+        # from coarse to fine
+        self.runs = sorted(self.runs, key=lambda r: -self.h[r])
+
+    def type(self):
+        """
+        Returns the class type
+        """
+        return type(self)
+
+    def load(self, run, l=2, m=2, r=None):
+        """
+        Return (u, h) of the strain mode (l,m) at radius r (defaults to
+        the largest) of a run, from the cache or the data.h5 archive
+        """
+        src = self.sim.run.get(run)
+        if src is None:
+            raise ValueError("No run {} in the simulation".format(run))
+        if self.src.get(run) is not src:
+            # new or replaced run (e.g. CoRe_sim.add_run() overwrite)
+            self.cache = {k: v for k, v in self.cache.items() if k[0] != run}
+            self.src[run] = src
+        key = (run, l, m, r)
+        if key not in self.cache:
+            dset = self.sim.run[run].data.read('rh_{}{}'.format(l,m), det=r)
+            self.cache[key] = (dset[:,0], dset[:,1] + 1j*dset[:,2])
+        return self.cache[key]
+
+    def load_all(self, l=2, m=2, r=None):
+        """
+        Load the mode (l,m) of all the runs
+        """
+        return [self.load(run, l, m, r) for run in self.runs]
+
+    def cache_clear(self):
+        """
+        Drop the loaded data
+        """
+        self.cache = {}
+        self.src   = {}
+
+    def analyze(self, l=2, m=2, r=None, p=None, umax=None):
+        """
+        Convergence analysis of the mode (l,m)
+
+        The runs are aligned at the peak of the amplitude (u=0 and zero
+        phase at merger) and interpolated on the grid of the finest run,
+        restricted to the interval common to all runs.
+        ------
+        Input
+        -----
+        l, m : Multipole
+        r    : Extraction radius (defaults to the largest)
+        p    : Convergence order, estimated from the three finest runs
+               if None
+        umax : Largest u used to estimate the order (defaults to merger)
+        ------
+        Output
+        ------
+        Dictionary of arrays:
+        * runs, h  : runs and resolutions, from coarse to fine
+        * u        : common time grid (u - u_mrg)/M, shape (n_u,)
+        * phi, amp : phase and amplitude of each run, shape (n_runs, n_u)
+        * dphi     : phase differences of consecutive runs, shape (n_runs-1, n_u)
+        * order    : convergence order (from the L2 norms of dphi)
+        * order_u  : pointwise convergence order, shape (n_u,) (nan where
+                     undetermined)
+        * phi_rich, amp_rich : Richardson extrapolated phase and amplitude
+        * err_phi, err_amp   : error estimate of the Richardson extrapolation
+        * band_phi, band_amp : error band, |finest - extrapolated|
+        """
+        data = self.load_all(l, m, r)
+        n    = len(data)
+        hs   = np.array([self.h[run] for run in self.runs])
+
+        # align at merger
+        us, phis, amps = [], [], []
+        for u, y in data:
+            amp = np.abs(y)
+            phi = -np.unwrap(np.angle(y))
+            i   = np.argmax(amp)
+            us.append(u - u[i])
+            phis.append(phi - phi[i])
+            amps.append(amp)
+
+        u0 = max([u[0] for u in us])
+        u1 = min([u[-1] for u in us])
+        ue = us[-1][(us[-1] >= u0) & (us[-1] <= u1)]
+        phi = np.array([np.interp(ue, u, y) for u, y in zip(us, phis)])
+        amp = np.array([np.interp(ue, u, y) for u, y in zip(us, amps)])
+        dphi = np.diff(phi, axis=0)
+
+        order_u = np.full(len(ue), np.nan)
+        if n >= 3:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                order_u = conv_order_array(dphi[-2]/dphi[-1], hs[-3:])
+        if p is None:
+            if n < 3:
+                raise ValueError("at least three runs are needed to estimate the order")
+            msk  = ue <= (0. if umax is None else umax)
+            ratio = np.linalg.norm(dphi[-2][msk])/np.linalg.norm(dphi[-1][msk])
+            p = bisection(lambda x: conv_ratio(x, hs[-3:]) - ratio, (0.1, 10.))
+
+        y = [np.array([phi[k], amp[k]]) for k in range(n)]
+        yr, _, err = richardson_extrap_series(p, y, [ue]*n, hs, return_err=True)
+
+        return {'runs': list(self.runs), 'h': hs, 'u': ue,
+                'phi': phi, 'amp': amp, 'dphi': dphi,
+                'order': p, 'order_u': order_u,
+                'phi_rich': yr[0], 'amp_rich': yr[1],
+                'err_phi': err[0], 'err_amp': err[1],
+                'band_phi': np.abs(phi[-1] - yr[0]),
+                'band_amp': np.abs(amp[-1] - yr[1])}
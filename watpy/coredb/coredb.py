@@ -1,5 +1,6 @@
 from ..utils.ioutils import *
 from ..utils.coreh5 import CoRe_h5
+from .convergence import CoRe_conv
 from .metadata import *
 from ..utils.viz import wplot, mplot
 
@@ -15,13 +16,13 @@ class CoRe_run():
     in 'path'.
 
     Metadata are a CoRe_md() object 
-    Data are a CoRe_h5() object
+    Data are a CoRe_h5() object, pool is passed to it (see CoRe_h5)
     These objects can be used to read, modify and write into the DB.
     """
-    def __init__(self, path):
+    def __init__(self, path, pool = None):
         self.path = path
         self.md = CoRe_md(path = self.path)
-        self.data = CoRe_h5(self.path, metadata = self.md)
+        self.data = CoRe_h5(self.path, metadata = self.md, pool = pool)
 
     def type(self):
         """
@@ -53,9 +54,12 @@ class CoRe_sim():
     Contains a dictionary of CoRe_run() objects for a given simulation
     whose keys are the runs 'R??'
     This class mirrors the content of a CoRe git repo located in 'path'
+    pool is passed to the runs, pool=True shares the read-only handles
+    of all the runs in the pool coreh5.h5pool (see CoRe_h5)
     """
-    def __init__(self, path):
+    def __init__(self, path, pool = None):
         self.path   = path
+        self.pool   = pool
         self.dbkey  = os.path.basename(path).replace('_',':')
         self.code   = self.dbkey.split(':')[0]
         self.key    = self.dbkey.split(':')[1]
@@ -77,8 +81,9 @@ class CoRe_sim():
         """
         for r in os.listdir(self.path):
             if r[0]=='R' and len(r)==3:
-                self.run[r] = CoRe_run(os.path.join(self.path, r))
+                self.run[r] = CoRe_run(os.path.join(self.path, r), pool = self.pool)
                 print(' Found {}'.format(r))
+        self.conv = None
         if not self.run:
             print(' Found no runs ''R??'' folders in {}'.format(self.path))
 
@@ -105,6 +110,8 @@ class CoRe_sim():
         if not os.path.isfile(os.path.join(path,dfile)):
             raise ValueError('File {}/{} not found'.format(path,dfile))
         os.makedirs(dpath, exist_ok=True)
+        if r[-1] in self.run:
+            self.run[r[-1]].data.h5close()
         shutil.copy('{}/{}'.format(path,dfile), '{}/{}'.format(dpath,'data.h5'))
 
         # Dump the correct metadata
@@ -113,7 +120,8 @@ class CoRe_sim():
         md.write(path = dpath)
 
         # Update the run 
-        self.run[r[-1]] = CoRe_run(dpath)
+        self.run[r[-1]] = CoRe_run(dpath, pool = self.pool)
+        self.conv = None
         
         # Need to update also the metadata_main.tex
         if len(r)==1: sep = ''
@@ -121,12 +129,31 @@ class CoRe_sim():
         self.md.data['available_runs'] += sep + r[-1]
         self.write_metadata()
         
+    def convergence(self, l=2, m=2, r=None, p=None, runs=None, h=None,
+                    umax=None):
+        """
+        Resolution convergence analysis of the mode (l,m) over the runs
+        (see CoRe_conv.analyze()). The CoRe_conv object, with the loaded
+        data, is kept in self.conv and reused by later calls on the same
+        runs (all the runs if runs is None). It is dropped by add_run()
+        and del_run().
+        """
+        if runs is None:
+            runs = list(self.run.keys())
+        if getattr(self, 'conv', None) is None or \
+           sorted(runs) != sorted(self.conv.runs) or \
+           (h is not None and h != self.conv.h):
+            self.conv = CoRe_conv(self, runs=runs, h=h)
+        return self.conv.analyze(l=l, m=m, r=r, p=p, umax=umax)
+
     def del_run(self,r):
         """
         Delete a run object
         """
         if r in self.run.keys():
+            self.run[r].data.h5close()
             del self.run[r]
+            self.conv = None
             print("Deleted {} from object".format(r))
         else:
             raise ValueError("run {} does not exists".format(r))
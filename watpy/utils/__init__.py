@@ -1,4 +1,4 @@
 #!/usr/bin/env python
 
-from . import ioutils, units, num, coreh5, viz
+from . import ioutils, units, fdiff, num, coreh5, viz
 
@@ -10,9 +10,17 @@ import h5py
 import os
 import os.path
 import re
+import time
+import atexit
+import threading
+import itertools
+import contextlib
+import weakref
+from collections import deque, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 
-from ..wave.wave import wfile_parse_name, rinf_float_to_str, rinf_str_to_float, rInf, write_headstr
+from ..wave.wave import wfile_parse_name, rinf_float_to_str, rinf_str_to_float, rInf, write_headstr, wave_array, interp_rows
 from .viz import wplot
 
 def write_keyh5(l, m, r):
@@ -26,6 +34,224 @@ def write_keyh5(l, m, r):
     return key
 
 
+def dset_get_detrad(dname):
+    """
+    Extraction radius of a CoRe dataset from its name, e.g. 
+    'Rh_l2_m2_r00400.txt', 'EJ_rInf.txt' (see wfile_parse_name())
+    """
+    vlmr = wfile_parse_name(dname)
+    if vlmr is None:
+        raise ValueError("cannot parse the radius of {}".format(dname))
+    return vlmr[3]
+
+
+def loadtxt_dset(fname):
+    """
+    Parse a text file into the array stored in the HDF5 archive
+    """
+    return np.loadtxt(fname)
+
+
+def loadtxt_dsets(fnames, workers=None):
+    """
+    Iterate over the arrays of loadtxt_dset() for a list of files, in
+    order. If workers > 1 the files are parsed by a pool of processes,
+    with at most 2*workers files in flight
+    """
+    if workers is None or workers <= 1:
+        for f in fnames:
+            yield loadtxt_dset(f)
+        return
+    fnames = iter(fnames)
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        pending = deque([ex.submit(loadtxt_dset, f) 
+                         for f in itertools.islice(fnames, 2*workers)])
+        while pending:
+            data = pending.popleft().result()
+            f = next(fnames, None)
+            if f is not None:
+                pending.append(ex.submit(loadtxt_dset, f))
+            yield data
+
+
+def dset_options(shape, chunks=None, compression=None, compression_opts=None,
+                 shuffle=False):
+    """
+    Keyword arguments of h5py create_dataset() for an array of the 
+    given shape
+    * chunks : None (contiguous), True (automatic) or number of rows
+               per chunk
+    * compression, compression_opts, shuffle : HDF5 filters (e.g. 'gzip'
+               and the level 0-9, or 'lzf'), compression implies chunking
+    Scalar and empty arrays are always stored contiguous and uncompressed
+    """
+    opts = {}
+    if len(shape) == 0 or 0 in shape:
+        return opts
+    if chunks is True:
+        opts['chunks'] = True
+    elif chunks is not None:
+        opts['chunks'] = (min(int(chunks), shape[0]),) + tuple(shape[1:])
+    if compression is not None:
+        opts['compression'] = compression
+        opts['compression_opts'] = compression_opts
+    if shuffle:
+        opts['shuffle'] = True
+    return opts
+
+
+class h5_pool(object):
+    """
+    Bounded pool of open read-only h5py.File handles, keyed on the
+    absolute file name and shared by the CoRe_h5 objects using it.
+    A handle is reopened if the size or mtime of the file changed,
+    handles idle for more than timeout seconds are closed by a
+    background thread (running only while handles are open).
+    Closing a handle in use only detaches it from the pool, the file
+    is closed when its last user releases it.
+    -----------
+    Input
+    -----------
+    maxsize   : Maximum number of open handles, the least recently
+                used idle handles are closed first (handles in use
+                are never closed, so the bound can be exceeded
+                temporarily)
+    timeout   : Idle time (s) before a handle is closed, None keeps
+                the handles open until close()
+    -----------
+    Contains
+    -----------
+    * handles : fname -> [h5py.File, (size, mtime), users, last use,
+                          detached]
+    * opens, hits, closes : counters
+    * pools   : (class) all the live pools, see close_all()
+    """
+    pools = weakref.WeakSet()
+
+    def __init__(self, maxsize=16, timeout=60.):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.handles = OrderedDict()
+        self.opens   = 0
+        self.hits    = 0
+        self.closes  = 0
+        self.lock    = threading.RLock()
+        self.reaper  = None
+        h5_pool.pools.add(self)
+
+    def stamp(self, fname):
+        st = os.stat(fname)
+        return (st.st_size, st.st_mtime_ns)
+
+    @contextlib.contextmanager
+    def open(self, fname):
+        """
+        Context manager returning the read-only handle of fname
+        """
+        fname = os.path.abspath(fname)
+        with self.lock:
+            h = self.handles.get(fname)
+            if h is not None and h[2] == 0 and h[1] != self.stamp(fname):
+                self.close(fname)
+                h = None
+            if h is None:
+                stamp = self.stamp(fname)
+                h = [h5py.File(fname, 'r'), stamp, 0, 0., False]
+                self.handles[fname] = h
+                self.opens += 1
+                self.evict()
+                if self.timeout is not None and self.reaper is None:
+                    self.reaper = threading.Thread(target=self.reap_loop, daemon=True)
+                    self.reaper.start()
+            else:
+                self.hits += 1
+            self.handles.move_to_end(fname)
+            h[2] += 1
+        try:
+            yield h[0]
+        finally:
+            with self.lock:
+                h[2] -= 1
+                h[3] = time.monotonic()
+                if h[4] and h[2] == 0:
+                    h[0].close()
+                    self.closes += 1
+
+    def evict(self):
+        """
+        Close the least recently used idle handles above maxsize
+        """
+        with self.lock:
+            idle = [f for f, h in self.handles.items() if h[2] == 0]
+            for f in idle[:max(len(self.handles) - self.maxsize, 0)]:
+                self.close(f)
+
+    def reap(self):
+        """
+        Close the handles idle for more than timeout
+        """
+        with self.lock:
+            now = time.monotonic()
+            for f in [f for f, h in self.handles.items()
+                      if h[2] == 0 and now - h[3] > self.timeout]:
+                self.close(f)
+
+    def reap_loop(self):
+        """
+        Body of the reaper thread, exits when no handle is left open
+        """
+        while True:
+            with self.lock:
+                if self.timeout is None or not self.handles:
+                    self.reaper = None
+                    return
+                dt = self.timeout/2.
+            time.sleep(dt)
+            with self.lock:
+                if self.timeout is not None:
+                    self.reap()
+
+    def close(self, fname=None):
+        """
+        Close the handle of fname (all handles if None). Call this
+        before writing to a file opened through the pool. Handles in 
+        use are detached from the pool and closed on release
+        """
+        with self.lock:
+            fnames = list(self.handles.keys()) if fname is None else [os.path.abspath(fname)]
+            for f in fnames:
+                h = self.handles.pop(f, None)
+                if h is None:
+                    continue
+                if h[2] > 0:
+                    h[4] = True
+                else:
+                    h[0].close()
+                    self.closes += 1
+
+    @classmethod
+    def close_all(cls, fname=None):
+        """
+        Close the handles of fname (all handles if None) in all the pools
+        """
+        for pool in list(cls.pools):
+            pool.close(fname)
+
+    def info(self):
+        """
+        Return pool statistics as a dict
+        """
+        with self.lock:
+            return {'open': len(self.handles), 'maxsize': self.maxsize,
+                    'timeout': self.timeout, 'opens': self.opens,
+                    'hits': self.hits, 'closes': self.closes}
+
+
+# handle pool shared by all the CoRe_h5 (and CoRe_run) in session mode
+h5pool = h5_pool()
+atexit.register(h5_pool.close_all)
+
+
 class CoRe_h5(object):
     """
     Class to read/write CoRe HDF5 archives
@@ -40,15 +266,67 @@ class CoRe_h5(object):
 
     The datasets of these groups correspond to waveforms extracted at
     different extraction radii 
+
+    By default every method opens and closes the archive. In session 
+    mode the read-only handles are taken from an h5_pool and kept open
+    across calls: pass pool=True (shared pool h5pool) or an h5_pool
+    on init, or use the object as a context manager
+
+        with CoRe_h5(path) as h5:
+            for l, m in modes: h5.read('rh_{}{}'.format(l,m))
+
+    On exit of the with block the handles acquired in it are closed
+    (on release, if still in use). The pooled handles of the archive 
+    are closed before any write.
     """ 
-    def __init__(self, path, metadata = None, dfile = 'data.h5'):
+    def __init__(self, path, metadata = None, dfile = 'data.h5', pool = None):
         self.path  = path
         self.mdata = metadata # needed only in create/write
         self.dfile = dfile
+        self.pool  = h5pool if pool is True else pool
+        self.pool_prev = []
+        self.acquired  = []
         if not os.path.isfile(os.path.join(path,dfile)):
             print("No .h5 file found!")
 
-    def create_dset(self, datain, path = None, dfile = None):
+    def __enter__(self):
+        self.pool_prev.append(self.pool)
+        self.acquired.append(set())
+        if self.pool is None:
+            self.pool = h5pool
+        return self
+
+    def __exit__(self, *args):
+        for fname in self.acquired.pop():
+            self.pool.close(fname)
+        self.pool = self.pool_prev.pop()
+
+    @contextlib.contextmanager
+    def h5file(self):
+        """
+        Context manager returning the archive opened read-only, through
+        the handle pool in session mode
+        """
+        fname = os.path.join(self.path,self.dfile)
+        if self.pool is None:
+            with h5py.File(fname, 'r') as fn:
+                yield fn
+        else:
+            if self.acquired:
+                self.acquired[-1].add(fname)
+            with self.pool.open(fname) as fn:
+                yield fn
+
+    def h5close(self):
+        """
+        Close the pooled handles of the archive, in all the pools
+        (before writing)
+        """
+        h5_pool.close_all(os.path.join(self.path,self.dfile))
+
+    def create_dset(self, datain, path = None, dfile = None, workers = None,
+                    chunks = None, compression = None, compression_opts = None,
+                    shuffle = False, overwrite = True):
         """
         Generic routine to create HDF5 archive from a dictionary of 
    
@@ -59,22 +337,69 @@ class CoRe_h5(object):
 
         - Assumes filenames refer to existing text files
         - Dasets are named after filenames
-        - Appends to and/or overwrites HDF5
+        - Appends to and/or overwrites HDF5 (existing datasets are kept
+          if not overwrite)
+
+        Bulk ingestion: if workers > 1 the text files are parsed by a
+        pool of workers processes and the datasets are written by this
+        process as the results arrive (see loadtxt_dsets()). chunks, 
+        compression, compression_opts and shuffle set the dataset
+        layout and filters, see dset_options() (defaults: contiguous, 
+        uncompressed)
         """
         if path is None: path = self.path
         if not dfile:
             self.dfile = 'data.h5'
         else:
             self.dfile = dfile
+        self.h5close()
         with h5py.File(os.path.join(self.path,self.dfile), 'a') as fn:
+            jobs = []
             for g in datain.keys():
                 if g not in fn.keys():
                     fn.create_group(g)                
                 for f in datain[g]:
-                    data = np.loadtxt(os.path.join(path,f))
+                    if not overwrite and f in fn[g].keys():
+                        continue
+                    jobs.append((g, f))
+            fnames = [os.path.join(path,f) for g, f in jobs]
+            for (g, f), data in zip(jobs, loadtxt_dsets(fnames, workers)):
+                if f in fn[g].keys():
+                    del fn[g][f]
+                fn[g].create_dataset(name=f, data=data, 
+                                     **dset_options(data.shape, chunks, compression,
+                                                    compression_opts, shuffle))
+        return
+
+    def write_arrays(self, datain, dfile = None, chunks = None, compression = None,
+                     compression_opts = None, shuffle = False):
+        """
+        Generic routine to write arrays into the HDF5 archive from a 
+        dictionary of 
+
+        datain[group1]['dset1'] = array
+        datain[group1]['dset2'] = array
+        datain[group2]['dset3'] = array
+        ...
+
+        - Dataset names should follow the CoRe filenames, e.g. 'EJ_r00400.txt'
+        - Appends to and/or overwrites HDF5
+        - chunks, compression, compression_opts, shuffle : see dset_options()
+        """
+        if dfile is not None:
+            self.dfile = dfile
+        self.h5close()
+        with h5py.File(os.path.join(self.path,self.dfile), 'a') as fn:
+            for g in datain.keys():
+                if g not in fn.keys():
+                    fn.create_group(g)
+                for f, data in datain[g].items():
                     if f in fn[g].keys():
                         del fn[g][f]
-                    fn[g].create_dataset(name=f, data=data)
+                    data = np.asarray(data)
+                    fn[g].create_dataset(name=f, data=data,
+                                         **dset_options(data.shape, chunks, compression,
+                                                        compression_opts, shuffle))
         return
 
     def read_dset(self):
@@ -83,58 +408,48 @@ class CoRe_h5(object):
         groups/datasets. 
         """
         dset = {}
-        with h5py.File(os.path.join(self.path,self.dfile), 'r') as fn:
+        with self.h5file() as fn:
             for g in fn.keys():
                 dset[g] = {}
                 for f in fn[g].keys():
                     dset[g][f] = fn[g][f][()]
         return dset
 
-    def create(self, path = None):
+    def create(self, path = None, workers = None, chunks = None, 
+               compression = None, compression_opts = None, shuffle = False):
         """
         Create HDF5 archive using .txt CoRe files under 'path'. 
         If path is not specified, search the .txt files under self.path
-        Always write .h5 files to self.path
+        Always write .h5 files to self.path. Existing datasets are kept.
+        workers, chunks, compression, compression_opts and shuffle are
+        passed to create_dset()
 
         Deprecated, use create_dset if possible.
         """
-        if path is None: path == self.path
-        self.dfile = 'data.h5'
-        with h5py.File(os.path.join(self.path,self.dfile), 'a') as fn:
+        if path is None: path = self.path
+        datain = {}
+        # Loop over all available files, add each as a dataset 
+        for f in sorted(os.listdir(path)):
 
-            # Loop over all available files, add each as a dataset 
-            for f in os.listdir(path):
-
-                # check this has some chances to be CoRe data
-                if '.txt' != os.path.splitext(f)[-1]: continue
-                vlmr = wfile_parse_name(f)
-                if vlmr == None: continue
-                var,l,m,r,c = vlmr
-                
-                if var == 'EJ':
-                    group = 'energy'
-                    if group not in fn.keys():
-                        fn.create_group(group)
-                    if f not in fn[group].keys():
-                        data = np.loadtxt(os.path.join(path,f))
-                        fn['energy'].create_dataset(name=f, data=data)
-                
-                elif var == 'psi4':
-                    group = 'rpsi4_{}{}'.format(l,m)
-                    if group not in fn.keys():
-                        fn.create_group(group)
-                    if f not in fn[group].keys():
-                        data = np.loadtxt(os.path.join(path,f))
-                        fn[group].create_dataset(name=f, data=data)
-                
-                elif var == 'h':
-                    group = 'rh_{}{}'.format(l,m)
-                    if group not in fn.keys():
-                        fn.create_group(group)
-                    if f not in fn[group].keys():
-                        data = np.loadtxt(os.path.join(path,f))
-                        fn[group].create_dataset(name=f, data=data)
+            # check this has some chances to be CoRe data
+            if '.txt' != os.path.splitext(f)[-1]: continue
+            vlmr = wfile_parse_name(f)
+            if vlmr == None: continue
+            var,l,m,r,c = vlmr
+            
+            if var == 'EJ':
+                group = 'energy'
+            elif var == 'psi4':
+                group = 'rpsi4_{}{}'.format(l,m)
+            elif var == 'h':
+                group = 'rh_{}{}'.format(l,m)
+            else:
+                continue
+            datain.setdefault(group, []).append(f)
 
+        self.create_dset(datain, path = path, workers = workers, chunks = chunks,
+                         compression = compression, compression_opts = compression_opts,
+                         shuffle = shuffle, overwrite = False)
         print('wrote CoRe {}/{}'.format(self.path,self.dfile))
 
     def read(self, group, det = None):
@@ -155,7 +470,7 @@ class CoRe_h5(object):
         Deprecated, use read_dset if possible.
         """
         dset = None
-        with h5py.File(os.path.join(self.path,self.dfile), 'r') as fn:
+        with self.h5file() as fn:
             if group not in fn.keys():
                 raise ValueError("Group {} not available".format(group))
             rad = self.dset_radii(fn,group=group, det=det)
@@ -184,7 +499,7 @@ class CoRe_h5(object):
         """
         h5dump -n
         """
-        with h5py.File(os.path.join(self.path,self.dfile), 'r') as f:
+        with self.h5file() as f:
             f.visit(print)
         return
 
@@ -203,27 +518,148 @@ class CoRe_h5(object):
         """
         radii = []
         for ds in fp[group].keys(): 
-            rad = rinf_str_to_float(ds[-8:-4])
+            rad = dset_get_detrad(ds)
             radii = np.append(radii,rad)
-            #radii = np.append(radii,float(ds[-8:-4]))
         if det in radii:
             return det
         else:
             return radii.max()
     
-    def write_strain_to_txt(self, lm=[(2,2)]):
+    def get_mass(self, mass=None):
+        """
+        Return mass if given, the metadata id_mass otherwise
+        """
+        if mass is not None:
+            return float(mass)
+        if self.mdata is None:
+            raise ValueError("mass not given and no metadata to read id_mass from")
+        return float(self.mdata.data['id_mass'])
+
+    def dset_select(self, fn, var='h', radii=None, modes=None):
+        """
+        Resolve the default modes (all the groups of var) and radii 
+        (all the finite ones of the first mode) of the open archive fn
+        """
+        gpre = 'rh_' if var == 'h' else 'rpsi4_'
+        if modes is None:
+            modes = [tuple(int(x) for x in self.lm_from_group(g)) 
+                     for g in fn.keys() if g.startswith(gpre)]
+        if radii is None:
+            g = gpre+'{}{}'.format(*modes[0])
+            radii = sorted([dset_get_detrad(f) for f in fn[g].keys()])
+            radii = [r for r in radii if r != rInf]
+        return list(radii), list(modes)
+
+    def has_time(self, var='h', radii=None, modes=None):
+        """
+        Whether all the selected datasets of var have the coordinate
+        time column t (see to_array())
+        """
+        gpre = 'rh_' if var == 'h' else 'rpsi4_'
+        fpre = 'Rh_' if var == 'h' else 'Rpsi4_'
+        with self.h5file() as fn:
+            radii, modes = self.dset_select(fn, var, radii, modes)
+            return all([fn[gpre+'{}{}'.format(l,m)][fpre+write_keyh5(l,m,r)+'.txt'].shape[1] >= 7
+                        for r in radii for l, m in modes])
+
+    def to_array(self, var='h', radii=None, modes=None, mass=None, f0=None, time='t'):
+        """
+        Stack the modes and radii of the archive into a wave_array
+        --------
+        Input:
+        --------
+        var     : 'h' or 'Psi4'
+        radii   : List of radii (defaults to all the finite ones)
+        modes   : List of (l,m) multipoles (defaults to all the groups)
+        mass    : Binary mass (defaults to the metadata id_mass)
+        f0      : Initial GW frequency, as in mwaves (needed for FFI)
+        time    : 't' for the coordinate time (last column, ValueError 
+                  if missing) or 'u' for the retarded time (first column)
+        --------
+        Output:
+        --------
+        wave_array with time and data R*var in units of Msun (the archive
+        stores u/M, R*var/M). If the time grids differ, the datasets are
+        linearly interpolated on the grid of the largest radius, 
+        restricted to the interval common to all the datasets.
+        """
+        if time not in ['t','u']:
+            raise ValueError("time can be only 't' or 'u'")
+        if var not in ['h','Psi4']:
+            raise ValueError("var can be only 'Psi4' or 'h'")
+        mass = self.get_mass(mass)
+        gpre = 'rh_' if var == 'h' else 'rpsi4_'
+        fpre = 'Rh_' if var == 'h' else 'Rpsi4_'
+        with self.h5file() as fn:
+            radii, modes = self.dset_select(fn, var, radii, modes)
+            times, ys = [], []
+            for r in radii:
+                for l, m in modes:
+                    dset = fn[gpre+'{}{}'.format(l,m)][fpre+write_keyh5(l,m,r)+'.txt'][()]
+                    if time == 'u':
+                        times.append(dset[:,0]*mass)
+                    elif dset.shape[1] >= 7:
+                        times.append(dset[:,-1])
+                    else:
+                        raise ValueError("no t column in {}".format(fpre+write_keyh5(l,m,r)))
+                    ys.append((dset[:,1] + 1j*dset[:,2])*mass)
+        rmax = radii.index(max(radii))
+        t  = times[rmax*len(modes)]
+        t0 = max([ti[0] for ti in times])
+        t1 = min([ti[-1] for ti in times])
+        t  = t[(t >= t0) & (t <= t1)]
+        data = np.array([yi if np.array_equal(t, ti) else interp_rows(t, ti, yi)
+                         for ti, yi in zip(times, ys)])
+        return wave_array(t, data.reshape(len(radii), len(modes), len(t)), 
+                          modes, radii, var=var, mass=mass, f0=f0)
+
+    def extrap_rinf(self, var=['h','Psi4'], method='poly', K=2, comp='ampphase',
+                    madm=None, radii=None, modes=None, mass=None, f0=None):
+        """
+        Extrapolate all the modes of the archive to infinite radius and
+        write the 'Rh_l#_m#_rInf.txt', 'Rpsi4_l#_m#_rInf.txt' datasets
+        (see wave_array.extrap_rinf()). The coordinate time is used if
+        the datasets have it, the retarded time otherwise. f0 is needed
+        to compute the strain with method 'pert'. Returns a dictionary 
+        var -> wave_array.
+        """
+        if isinstance(var, str): var = [var]
+        if method == 'pert' and 'h' in var and f0 is None:
+            raise ValueError("f0 is needed to compute the strain with method 'pert'")
+        mass = self.get_mass(mass)
+
+        def load(v):
+            tcol = self.has_time(var=v, radii=radii, modes=modes)
+            wa = self.to_array(var=v, radii=radii, modes=modes, mass=mass, 
+                               f0=f0, time='t' if tcol else 'u')
+            return wa, tcol
+        out = {}
+        if method == 'pert':
+            p4, retarded = load('Psi4')
+            p4 = p4.extrap_rinf(method='pert', retarded=retarded, madm=madm)
+            if 'Psi4' in var: out['Psi4'] = p4
+            if 'h' in var:    out['h']    = p4.get_strain()
+        else:
+            for v in var:
+                wa, retarded = load(v)
+                out[v] = wa.extrap_rinf(method=method, K=K, comp=comp, retarded=retarded)
+        for v in out:
+            self.write_arrays(out[v].core_dsets())
+        return out
+
+    def write_strain_to_txt(self, lm=[(2,2)], mass=None):
         """
         Extract r*h_{22} from the .h5 archive into separate .txt
-        files, one per saved radius. 
+        files, one per saved radius. mass defaults to the metadata
+        id_mass
         """
-        mass = float(self.mdata.data['id_mass'])
-        with h5py.File(os.path.join(self.path,self.dfile), 'r') as fn:
+        mass = self.get_mass(mass)
+        with self.h5file() as fn:
             for l,m in lm:
                 group = 'rh_{}{}'.format(l,m)
                 if group not in fn.keys(): continue
                 for f in fn[group]:
-                    #rad  = float(f[-8:-4])
-                    rad = rinf_str_to_float(f[-8:-4])
+                    rad = dset_get_detrad(f)
                     #headstr  = "r=%e\nM=%e\n " % (rad, mass)
                     headstr = write_headstr(rad,mass)
                     dset = fn[group][f]
@@ -241,20 +677,19 @@ class CoRe_h5(object):
                     np.savetxt(os.path.join(self.path,f),
                                data, header=headstr)
  
-    def write_psi4_to_txt(self, lm=[(2,2)]):
+    def write_psi4_to_txt(self, lm=[(2,2)], mass=None):
         """
         Extract r*Psi4_{22} from the .h5 archive into separate .txt
-        files, one per saved radius. 
+        files, one per saved radius. mass defaults to the metadata
+        id_mass
         """
-        mass = float(self.mdata.data['id_mass'])
-        with h5py.File(os.path.join(self.path,self.dfile), 'r') as fn:
+        mass = self.get_mass(mass)
+        with self.h5file() as fn:
             for l,m in lm:
                 group = 'rpsi4_{}{}'.format(l,m) 
                 if group not in fn.keys(): continue
                 for f in fn[group]:
-                    #rad  = float(f[-8:-4])
-                    #headstr = "r=%e\nM=%e\n " % (rad, mass)
-                    rad = rinf_str_to_float(f[-8:-4])
+                    rad = dset_get_detrad(f)
                     headstr = write_headstr(rad,mass)
                     dset = fn[group][f]
                     try: 
@@ -268,21 +703,20 @@ class CoRe_h5(object):
                     np.savetxt(os.path.join(self.path,f), 
                                data, header=headstr)
 
-    def write_EJ_to_txt(self):
+    def write_EJ_to_txt(self, mass=None):
         """
         Extract energetics from the .h5 archive into separate .txt
-        files, one per saved radius. 
+        files, one per saved radius. mass defaults to the metadata
+        id_mass
         """
-        mass = float(self.mdata.data['id_mass'])
+        mass = self.get_mass(mass)
         group = 'energy'
-        with h5py.File(os.path.join(self.path,self.dfile), 'r') as fn:
+        with self.h5file() as fn:
             if group not in fn.keys():
                 print("No group {}".format(group))
                 return
             for f in fn[group]:
-                #rad  = float(f[-8:-4])
-                #headstr = "r=%e\nM=%e\n " % (rad, mass)
-                rad = rinf_str_to_float(f[-8:-4])
+                rad = dset_get_detrad(f)
                 headstr = write_headstr(rad,mass)
                 dset = fn['energy'][f]
                 try:
@@ -296,13 +730,14 @@ class CoRe_h5(object):
                 np.savetxt(os.path.join(self.path,f), 
                            data, header=headstr)
  
-    def write_to_txt(self):
+    def write_to_txt(self, mass=None):
         """
-        Extract all data in the .h5 archive.
+        Extract all data in the .h5 archive. mass defaults to the 
+        metadata id_mass
         """
-        self.write_strain_to_txt()
-        self.write_psi4_to_txt()
-        self.write_EJ_to_txt()
+        self.write_strain_to_txt(mass=mass)
+        self.write_psi4_to_txt(mass=mass)
+        self.write_EJ_to_txt(mass=mass)
     
     def show(self, group, det=None):
         """
@@ -314,7 +749,7 @@ class CoRe_h5(object):
         group : e.g. 'rh_22' for the strain, 'rpsi4_22', etc.
         det   : Extraction radius
         """
-        with h5py.File(os.path.join(self.path,self.dfile), 'r') as fn:
+        with self.h5file() as fn:
             if group not in fn.keys():
                 raise ValueError("Group {} not available".format(group))
             rad = self.dset_radii(fn,group=group, det=det)
@@ -0,0 +1,183 @@
+import functools
+import numpy as np
+
+
+# ------------------------------------------------------------------
+# Finite differencing
+# ------------------------------------------------------------------
+#
+# Derivatives of sampled data along one axis of an array, vectorized
+# over the samples (no python loops over the grid):
+#
+# * fd_diff_c2 : centered 3-point formulas of num.diff1/num.diff2
+# * fd_diff    : stencils of accuracy order 2, 4, 6 for the first and
+#                second derivative, on uniform or nonuniform grids.
+#                Interior points use centered stencils of o+1 points,
+#                the first/last o/2 points one-sided stencils of o+d
+#                points (d = derivative order), so the accuracy order
+#                is the same everywhere.
+#
+# Weights are computed with Fornberg's algorithm (Math. Comp. 51, 699,
+# 1988), vectorized over the stencils. On uniform grids they are
+# computed once per (d,o) and memoized.
+
+
+def isuniform(x, rtol=1e-10):
+    """
+    Test if the 1d grid x is uniform (within rtol of the grid span)
+    """
+    x  = np.asarray(x)
+    xu = np.linspace(x[0], x[-1], len(x))
+    return bool(np.all(np.abs(x - xu) <= rtol*np.abs(x[-1] - x[0])))
+
+
+def fd_weights(z, x, d):
+    """
+    Finite-differencing weights of the derivatives up to order d, at
+    points z, for stencils with nodes x (Fornberg's algorithm)
+
+    * z : evaluation points, shape (n,)
+    * x : stencil nodes, shape (n, p)
+    * d : maximum derivative order
+
+    Returns an array of shape (n, p, d+1), weights[:,j,k] are the
+    weights of node j for the k-th derivative
+    """
+    z = np.atleast_1d(np.asarray(z, dtype=float))
+    x = np.atleast_2d(np.asarray(x, dtype=float))
+    n, p = x.shape
+    c  = np.zeros((n, p, d+1))
+    c1 = np.ones(n)
+    c4 = x[:,0] - z
+    c[:,0,0] = 1.
+    for i in range(1, p):
+        mn = min(i, d)
+        c2 = np.ones(n)
+        c5 = c4
+        c4 = x[:,i] - z
+        for j in range(i):
+            c3  = x[:,i] - x[:,j]
+            c2 *= c3
+            if j == i-1:
+                for k in range(mn, 0, -1):
+                    c[:,i,k] = c1*(k*c[:,i-1,k-1] - c5*c[:,i-1,k])/c2
+                c[:,i,0] = -c1*c5*c[:,i-1,0]/c2
+            for k in range(mn, 0, -1):
+                c[:,j,k] = (c4*c[:,j,k] - k*c[:,j,k-1])/c3
+            c[:,j,0] = c4*c[:,j,0]/c3
+        c1 = c2
+    return c
+
+
+def fd_stencil_sizes(d, o):
+    """
+    Number of points of the centered and one-sided stencils for the
+    derivative of order d with accuracy order o
+    """
+    if d not in [1,2]:
+        raise ValueError("derivative order {} not implemented".format(d))
+    if o not in [2,4,6]:
+        raise ValueError("accuracy order {} not implemented".format(o))
+    return o+1, o+d
+
+
+@functools.lru_cache(maxsize=None)
+def fd_weights_uniform(d, o):
+    """
+    Memoized weights of fd_diff() on a uniform grid of unit spacing
+
+    Returns (wc, wb): wc are the centered weights, shape (o+1,), wb the
+    one-sided weights of the first o/2 points, shape (o/2, o+d). The
+    weights of the last points are wb reversed, times (-1)^d.
+    """
+    pc, pb = fd_stencil_sizes(d, o)
+    h  = o//2
+    wc = fd_weights(0., np.arange(-h, h+1)[None,:], d)[0,:,d]
+    wb = fd_weights(np.arange(h), np.tile(np.arange(pb), (h,1)), d)[:,:,d]
+    wc.flags.writeable = False
+    wb.flags.writeable = False
+    return wc, wb
+
+
+def fd_diff(x, y, d=1, o=2, axis=-1, uniform=None, chunk=2**16):
+    """
+    Derivative of order d of y(x), with accuracy order o
+
+    * x       : grid, shape (n,)
+    * y       : data (real or complex), with n samples along axis
+    * d       : derivative order (1, 2)
+    * o       : accuracy order (2, 4, 6)
+    * axis    : axis of y along which to differentiate
+    * uniform : if None, test whether x is uniform
+    * chunk   : number of grid points per block of the weights on
+                nonuniform grids (bounds the memory)
+
+    Returns an array of the shape of y
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.moveaxis(np.asarray(y), axis, -1)
+    n = x.shape[0]
+    if y.shape[-1] != n:
+        raise ValueError("x has {} points, y has {} along axis".format(n, y.shape[-1]))
+    pc, pb = fd_stencil_sizes(d, o)
+    if n < max(pc, pb):
+        raise ValueError("at least {} points are needed".format(max(pc, pb)))
+    if uniform is None:
+        uniform = isuniform(x)
+
+    h   = o//2
+    ni  = n - 2*h
+    out = np.empty(y.shape, dtype=np.result_type(y.dtype, float))
+
+    if uniform:
+        wc, wb = fd_weights_uniform(d, o)
+        oodx = 1./(x[1]-x[0])**d
+        acc  = wc[0]*y[...,0:ni]
+        for j in range(1, pc):
+            acc = acc + wc[j]*y[...,j:j+ni]
+        out[...,h:n-h] = acc * oodx
+        out[...,:h]    = np.einsum('ij,...j->...i', wb, y[...,:pb]) * oodx
+        out[...,n-h:]  = np.einsum('ij,...j->...i', (-1)**d * wb[::-1,::-1], y[...,n-pb:]) * oodx
+        return np.moveaxis(out, -1, axis)
+
+    # interior, in blocks
+    offs = np.arange(pc)
+    for i0 in range(0, ni, chunk):
+        i1 = min(i0+chunk, ni)
+        idx = np.arange(i0, i1)
+        w = fd_weights(x[idx+h], x[idx[:,None]+offs], d)[:,:,d]
+        acc = w[:,0]*y[...,i0:i1]
+        for j in range(1, pc):
+            acc = acc + w[:,j]*y[...,i0+j:i1+j]
+        out[...,h+i0:h+i1] = acc
+
+    # boundaries
+    offs = np.arange(pb)
+    w = fd_weights(x[:h], np.tile(x[:pb], (h,1)), d)[:,:,d]
+    out[...,:h] = np.einsum('ij,...j->...i', w, y[...,:pb])
+    w = fd_weights(x[n-h:], np.tile(x[n-pb:], (h,1)), d)[:,:,d]
+    out[...,n-h:] = np.einsum('ij,...j->...i', w, y[...,n-pb:])
+    return np.moveaxis(out, -1, axis)
+
+
+def fd_diff_c2(x, y, d=1, axis=-1, pad=True):
+    """
+    Centered 3-point differences of y(x) as in num.diff1 (d=1),
+    num.diff2 (d=2): (y[i+1]-y[i-1])/(x[i+1]-x[i-1]) and
+    4*(y[i+1]-2y[i]+y[i-1])/(x[i+1]-x[i-1])^2
+
+    Returns n-2 points along axis, or n if pad (the first and last
+    values are repeated)
+    """
+    x  = np.asarray(x)
+    y  = np.moveaxis(np.asarray(y), axis, -1)
+    dx = x[2:] - x[:-2]
+    if d == 1:
+        dy = (y[...,2:] - y[...,:-2])/dx
+    elif d == 2:
+        dy = 4*(y[...,2:] - 2*y[...,1:-1] + y[...,:-2])/dx**2
+    else:
+        raise ValueError("derivative order {} not implemented".format(d))
+    if pad:
+        dy = np.concatenate((dy[...,:1], dy, dy[...,-1:]), axis=-1)
+    return np.moveaxis(dy, -1, axis)
@@ -1,8 +1,9 @@
-import sys, os, re, datetime
+import sys, os, re, io, datetime, itertools, fnmatch
 import warnings as wrn
 from subprocess import Popen, PIPE
+from concurrent.futures import ThreadPoolExecutor
 import shutil
-import json, csv
+import json, csv, hashlib, tempfile
 import numpy as np
 from numpy import inf
 
@@ -100,13 +101,14 @@ def locate(pattern, root=os.curdir, followlinks=False):
 
 
 # from scivis
-def collate(fnames, outf, tidx=0, comments=["#", "%"], include_comments=False,
+def collate(fnames, outf=None, tidx=0, comments=["#", "%"], include_comments=False,
         epsilon=1e-15):
     """
     Merge a list of files from multiple segments
 
     * fnames   : list of file names, must be sorted from earlier to later
                  output
+    * outf     : if given, name of the file where to write the output
     * tidx     : time column number (starting from zero)
     * comments : lines beginning with a comment symbol are considered to be
                  comments
@@ -115,31 +117,141 @@ def collate(fnames, outf, tidx=0, comments=["#", "%"], include_comments=False,
     * epsilon  : two output times are the same if they differ by less than
                  epsilon
 
-    Returns a string with the merged files
+    Returns a string with the merged files (see collate_stream() to 
+    merge large files with bounded memory)
     """
-    sout = []
-    told  = None
-    
-    for fname in reversed(fnames): # Read backwards so new data 'overwrites' old.
-        for dline in reversed(open(fname).readlines()):
-            skip = False
-            for c in comments:
-                if dline[:len(c)] == c:
-                    if include_comments:
-                        sout.append(dline)
-                    skip = True
-                    break
-            if skip:
-                continue
+    sout = collate_stream(fnames, None, tidx=tidx, comments=comments,
+                          include_comments=include_comments, epsilon=epsilon)
+    if outf is not None:
+        with open(outf, 'w') as f:
+            f.write(sout)
+    return sout
 
-            try:
-                tnew = float(dline.split()[tidx])
-            except IndexError:
-                continue
-            if told is None or tnew < told*(1 - epsilon):
-                sout.append(dline)
-                told = tnew
-    return ''.join(reversed(sout)) # Reverse again to time-ordered
+
+def collate_chunks(fname, chunk):
+    """
+    Iterate over the lines of a file in lists of chunk lines
+    """
+    with open(fname) as f:
+        while True:
+            lines = list(itertools.islice(f, chunk))
+            if not lines:
+                return
+            yield lines
+
+
+def collate_times(lines, tidx, comments):
+    """
+    Parse the time column of a list of lines. Returns the times (nan
+    for comments, blank or short lines) and the comment mask
+    """
+    comments = tuple(comments)
+    iscom = np.array([l.startswith(comments) for l in lines], dtype=bool)
+    idx   = [i for i, l in enumerate(lines) if not iscom[i] and l.strip()]
+    times = np.full(len(lines), np.nan)
+    if idx:
+        try:
+            times[idx] = np.loadtxt(io.StringIO(''.join([lines[i] for i in idx])), 
+                                    usecols=[tidx], comments=None, ndmin=1)
+        except (ValueError, IndexError):
+            # ragged lines, parse one by one
+            for i in idx:
+                try:
+                    times[i] = float(lines[i].split()[tidx])
+                except IndexError:
+                    pass
+    return times, iscom
+
+
+def collate_stream(fnames, outf=None, tidx=0, comments=["#", "%"], 
+                   include_comments=False, epsilon=1e-15, fmt='txt', chunk=2**16):
+    """
+    Merge a list of files from multiple segments, as collate(), in 
+    chunks of lines so that the memory is bounded by the chunk size
+
+    * fnames   : list of file names, must be sorted from earlier to later
+                 output
+    * outf     : name (or file object for 'txt') of the output file.
+                 If None, the merged files are returned as a string
+    * tidx     : time column number (starting from zero)
+    * comments : lines beginning with a comment symbol are considered to be
+                 comments
+    * include_comments :
+                 include comments in the output ('txt' only)
+    * epsilon  : two output times are the same if they differ by less than
+                 epsilon
+    * fmt      : 'txt' to write the lines, or 'npy' to write the parsed
+                 data as a 2d float array in .npy format
+    * chunk    : number of lines processed at once
+
+    A line is kept if its time is smaller than the times of all the 
+    following lines (newer data overwrite older ones). The files are 
+    read twice: the first pass stores only the minimum time of each 
+    chunk, the second pass writes the kept lines.
+
+    Returns the string with the merged files if outf is None, the 
+    number of data lines written otherwise
+    """
+    if fmt not in ['txt','npy']:
+        raise ValueError("unknown format {}".format(fmt))
+    if fmt == 'npy' and (outf is None or not isinstance(outf, str)):
+        raise ValueError("npy output requires a file name")
+
+    # first pass, minimum time of each chunk
+    cmin = []
+    for fname in fnames:
+        for lines in collate_chunks(fname, chunk):
+            times, _ = collate_times(lines, tidx, comments)
+            cmin.append(np.nanmin(times) if np.any(~np.isnan(times)) else np.inf)
+    # minimum time after each chunk
+    after = np.append(np.minimum.accumulate(np.array(cmin)[::-1])[::-1][1:], np.inf)
+
+    # second pass
+    if outf is None:
+        fout = io.StringIO()
+    elif fmt == 'npy':
+        fout = open(outf+'.raw', 'wb')
+    elif isinstance(outf, str):
+        fout = open(outf, 'w')
+    else:
+        fout = outf
+    nrows, ncols, c = 0, None, 0
+    try:
+        for fname in fnames:
+            for lines in collate_chunks(fname, chunk):
+                times, iscom = collate_times(lines, tidx, comments)
+                valid = ~np.isnan(times)
+                tinf  = np.where(valid, times, np.inf)
+                suf   = np.minimum.accumulate(tinf[::-1])[::-1]
+                tnext = np.minimum(np.append(suf[1:], np.inf), after[c])
+                keep  = valid & (np.isinf(tnext) | (times < tnext*(1 - epsilon)))
+                c    += 1
+                if fmt == 'npy':
+                    rows = [lines[i] for i in np.flatnonzero(keep)]
+                    if rows:
+                        data = np.loadtxt(io.StringIO(''.join(rows)), comments=None, ndmin=2)
+                        if ncols is None: ncols = data.shape[1]
+                        if data.shape[1] != ncols:
+                            raise ValueError("inconsistent number of columns in {}".format(fname))
+                        fout.write(np.ascontiguousarray(data, dtype='<f8').tobytes())
+                else:
+                    if include_comments:
+                        keep = keep | iscom
+                    fout.write(''.join([lines[i] for i in np.flatnonzero(keep)]))
+                nrows += int(np.count_nonzero(valid & keep))
+    finally:
+        if outf is not None and (fmt == 'npy' or isinstance(outf, str)):
+            fout.close()
+
+    if outf is None:
+        return fout.getvalue()
+    if fmt == 'npy':
+        with open(outf, 'wb') as f, open(outf+'.raw', 'rb') as fraw:
+            np.lib.format.write_array_header_1_0(f, {'descr': '<f8', 'fortran_order': False,
+                                                     'shape': (nrows, ncols or 0)})
+            shutil.copyfileobj(fraw, f)
+        os.remove(outf+'.raw')
+    return nrows
 
 
 def extract_comments(fname, com_str="#"):
@@ -151,6 +263,47 @@ def extract_comments(fname, com_str="#"):
     return c
 
 
+def read_header(fname, comments=['#','"']):
+    """
+    Read the leading comment lines of a file, stops at the first
+    data line
+    ------
+    Input
+    -----
+    fname    : Name of the file
+    comments : Character(s) marking a comment line
+    ------
+    Output
+    ------
+    List of comment lines (comment char included)
+    """
+    if isinstance(comments, str):
+        comments = [comments]
+    comments = tuple(comments)
+    header = []
+    with open(fname) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if not line.startswith(comments):
+                break
+            header.append(line)
+    return header
+
+
+def read_headers(fnames, comments=['#','"'], workers=None):
+    """
+    Read the headers of a list of files, see read_header().
+    If workers > 1 the files are read concurrently by a pool of threads,
+    the output order follows 'fnames'.
+    """
+    if workers is None or workers <= 1:
+        return [read_header(f, comments) for f in fnames]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda f: read_header(f, comments), fnames))
+
+
 def loadtxt_comments(fname, com_str=['#','"']):
     """ 
     Read txt file and its comments
@@ -162,6 +315,164 @@ def loadtxt_comments(fname, com_str=['#','"']):
     return data, comments
 
 
+def loadtxt_fast(fname, usecols=None, comments=['#','"']):
+    """
+    Read the header comments and the numeric columns of an ASCII
+    file with a single open. The leading comment lines are read line
+    by line, the data block is read at once and parsed in one pass by
+    np.fromstring, with the number of columns of the first data line.
+    Blocks that are not a plain table (comments or blank lines inside,
+    ragged rows, non-numeric entries) are parsed by np.loadtxt.
+    ------
+    Input
+    -----
+    fname    : Name of the file to be loaded
+    usecols  : Columns to be read (defaults to all)
+    comments : Characters marking a comment line
+    ------
+    Output
+    ------
+    data     : 2D array, one row per data line
+    header   : List of the leading comment lines (comment char included)
+    """
+    comments = tuple(comments)
+    header = []
+    with open(fname) as f:
+        pos = f.tell()
+        line = f.readline()
+        while line:
+            line = line.strip()
+            if line and not line.startswith(comments):
+                break
+            if line:
+                header.append(line)
+            pos = f.tell()
+            line = f.readline()
+        f.seek(pos)
+        text = f.read()
+
+    data  = None
+    ncols = len(line.split())
+    if ncols > 0 and not any([c in text for c in comments]):
+        with wrn.catch_warnings():
+            # partial parses are reported as DeprecationWarning
+            wrn.simplefilter('error', DeprecationWarning)
+            try:
+                x = np.fromstring(text, sep=' ')
+            except (DeprecationWarning, ValueError):
+                x = None
+        nrows = text.rstrip().count('\n') + 1
+        if x is not None and x.size == nrows*ncols:
+            data = x.reshape(nrows, ncols)
+            if usecols is not None:
+                try:
+                    data = data[:, list(usecols)]
+                except IndexError:
+                    data = None
+    if data is None:
+        data = np.loadtxt(io.StringIO(text), usecols=usecols, 
+                          comments=list(comments), ndmin=2)
+    return data, header
+
+
+def loadtxt_cached(fname, cache_dir, usecols=None, comments=['#','"'],
+                   maxbytes=None):
+    """
+    As loadtxt_fast(), but the parsed arrays are kept in a binary
+    sidecar cache. Each entry is a .npy file with the data and a .json
+    file with the header, the file size and mtime. Entries are keyed on
+    the absolute path (and usecols, comments); they are served 
+    memory-mapped (read-only) if size and mtime of the text file did 
+    not change, and rewritten otherwise. Both files are written to 
+    unique temporary files and renamed, so that several processes can
+    fill the same cache.
+    ------
+    Input
+    -----
+    fname     : Name of the file to be loaded
+    cache_dir : Cache directory (created if needed)
+    usecols   : Columns to be read (defaults to all)
+    comments  : Characters marking a comment line
+    maxbytes  : Size cap of the cache, see txtcache_evict()
+    ------
+    Output
+    ------
+    data, header as in loadtxt_fast()
+    """
+    fname = os.path.abspath(fname)
+    st    = os.stat(fname)
+    if usecols is not None:
+        usecols = [int(c) for c in usecols]
+    if isinstance(comments, str):
+        comments = [comments]
+    key   = hashlib.sha1(repr((fname, usecols, list(comments))).encode()).hexdigest()
+    fnpy  = os.path.join(cache_dir, key+'.npy')
+    fjson = os.path.join(cache_dir, key+'.json')
+
+    if os.path.isfile(fnpy) and os.path.isfile(fjson):
+        try:
+            meta = read_json_into_dict(fjson)
+            if meta['size'] == st.st_size and meta['mtime'] == st.st_mtime_ns:
+                data = np.load(fnpy, mmap_mode='r' if meta['nbytes'] else None)
+                if list(data.shape) == meta['shape']:
+                    os.utime(fnpy) # mark as recently used
+                    return data, meta['header']
+        except (ValueError, KeyError, OSError):
+            pass # broken entry, rewrite it
+
+    data, header = loadtxt_fast(fname, usecols=usecols, comments=comments)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    meta = {'path': fname, 'usecols': usecols, 'comments': list(comments),
+            'size': st.st_size, 'mtime': st.st_mtime_ns, 'nbytes': data.nbytes,
+            'shape': list(data.shape), 'header': header}
+    for fout, write in [(fnpy, lambda f: np.save(f, data)),
+                        (fjson, lambda f: f.write(json.dumps(meta).encode()))]:
+        fd, ftmp = tempfile.mkstemp(dir=cache_dir, prefix=key+'.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            os.replace(ftmp, fout)
+        except BaseException:
+            os.remove(ftmp)
+            raise
+
+    if maxbytes is not None:
+        txtcache_evict(cache_dir, maxbytes)
+    return data, header
+
+
+def txtcache_evict(cache_dir, maxbytes):
+    """
+    Remove the least recently used entries of a loadtxt_cached() cache
+    until its .npy files take at most maxbytes
+    """
+    entries = []
+    for f in os.listdir(cache_dir):
+        if f.endswith('.npy'):
+            st = os.stat(os.path.join(cache_dir, f))
+            entries.append((st.st_mtime, st.st_size, f))
+    entries.sort()
+    size = sum([e[1] for e in entries])
+    for _, nb, f in entries:
+        if size <= maxbytes:
+            break
+        for fc in [f, f[:-4]+'.json']:
+            try:
+                os.remove(os.path.join(cache_dir, fc))
+            except FileNotFoundError:
+                pass
+        size -= nb
+    return size
+
+
+def txtcache_clear(cache_dir):
+    """
+    Remove all entries of a loadtxt_cached() cache
+    """
+    return txtcache_evict(cache_dir, 0)
+
+
 def remove_template_missed_keys(string):
     """
     Remove the matches to ${ .*? } 
@@ -1,6 +1,8 @@
 import sys
 import numpy as np
+import warnings as wrn
 from numpy import inf
+from .fdiff import fd_diff, fd_diff_c2
 
 
 # ------------------------------------------------------------------
@@ -35,12 +37,12 @@ def findmax_abs(x):
     return x[idx], idx
 
 
-def isarrayuniform(x, tol=1e-21):
+def isarrayuniform(x, tol=1e-10):
     """ 
-    Test if grid is uniform 
+    Test if grid is uniform (tol is relative to the grid span)
     """
-    xu = linspace(x[0],x[::],len(x))
-    return np.all(np.abs(x-xu)<=np.fabs(xu*tol))
+    xu = np.linspace(x[0],x[-1],len(x))
+    return np.all(np.abs(x-xu)<=np.fabs(tol*(x[-1]-x[0])))
 
 
 # from scivis
@@ -121,7 +123,7 @@ def diff(ff):
 
 
 # from scivis
-def diff1(xp, yp, pad=True):
+def diff1(xp, yp, pad=True, axis=0):
     """
     Computes the first derivative of y(x) using centered 2nd order
     accurate finite-differencing
@@ -130,17 +132,11 @@ def diff1(xp, yp, pad=True):
 
     NOTE: the data needs not to be equally spaced
     """
-    dyp = [(yp[i+1] - yp[i-1])/(xp[i+1] - xp[i-1]) \
-            for i in range(1, xp.shape[0]-1)]
-    dyp = np.array(dyp)
-    if pad==True:
-        dyp = np.insert(dyp, 0, dyp[0])
-        dyp = np.append(dyp, dyp[-1])
-    return dyp
+    return fd_diff_c2(xp, yp, d=1, axis=axis, pad=pad)
 
 
 # from scivis
-def diff2(xp, yp, pad=False):
+def diff2(xp, yp, pad=False, axis=0):
     """
     Computes the second derivative of y(x) using centered 2nd order
     accurate finite-differencing
@@ -149,59 +145,28 @@ def diff2(xp, yp, pad=False):
 
     NOTE: the data needs not to be equally spaced
     """
-    ddyp = [4*(yp[i+1] - 2*yp[i] + yp[i-1])/((xp[i+1] - xp[i-1])**2) \
-            for i in range(1, xp.shape[0]-1)]
-    ddyp = np.array(ddyp)
-    if pad==True:
-        ddyp = np.insert(ddyp, 0, ddyp[0])
-        ddyp = np.append(ddyp, ddyp[-1])
-    return ddyp
+    return fd_diff_c2(xp, yp, d=2, axis=axis, pad=pad)
 
 
 def diffo(t,f, o=2):
     """ 
     Compute finite differences of f(t) at a given order
-    Works on uniform data, orders are hardcoded
+    Works on uniform data, see fdiff.fd_diff() for the stencils
     """
     d1f = np.empty_like(f)
     d2f = np.empty_like(f)
-    if not isarrayuniform():
+    if not isarrayuniform(t):
         wrn.warn('nonuniform grid!')
         return d1f, d2f 
-    dt = t[1]-t[0]
-    oodt  = 1./dt  
-    oodt2 = oodt**2      
     if o==1:
-        i = np.arange(1,n)
-        d1f[i] = np.diff(f)*oodt
-        d2f[i] = np.diff(d1f)*oodt
-    elif o==2:
-        i = np.arange(1,n-1)
-        d1f[i] = (f[i+1]-f[i-1])*0.5*oodt
-        d2f[i] = (f[i+1] - 2*f[i] + f[i-1])*oodt2
-        i = 0
-        d1f[i] = -(3*f[i]-4*f[i+1]+f[i+2])*0.5*oodt
-        d2f[i] =  (2*f[i]-5*f[i+1]+4*f[i+2]-f[i+3])*oodt2
-        i = n-1
-        d1f[i] =  (3*f[i]-4*f[i-1]+f[i-2])*0.5*oodt
-        d2f[i] =  (2*f[i]-5*f[i-1]+4*f[i-2]-f[i-3])*oodt2
-    elif o==4:
-        c = 1./12.
-        i = np.arange(2,n-2)
-        d1f[i] = c*(8*(f[i+1]-f[i-1]) - f[i+2] + f[i-2])*oodt
-        d2f[i] = c*(-30*f[i]+16*(f[i+1]+f[i-1])-(f[i+2]+f[i-2]))*oodt2  
-        i = 0
-        d1f[i] = c*(-25*f[i]+48*f[i+1]-36*f[i+2]+16*f[i+3]-3*f[i+4])*oodt
-        d2f[i] = c*(45*f[i]-154*f[i+1]+214*f[i+2]-156*f[i+3]+61*f[i+4]-10*f[i+5])*oodt2
-        i = 1
-        d1f[i] = c*(-3*f[i-1]-10*f[i]+18*f[i+1]-6*f[i+2]+f[i+3])*oodt
-        d2f[i] = c*(10*f[i-1]-15*f[i]-4*f[i+1]+14*f[i+2]-6*f[i+3]+f[i+4])*oodt2
-        i = n-1
-        d1f[i] = - c*(-3*f[i+1]-10*f[i]+18*f[i-1]-6*f[i-2]+f[i-3])*oodt
-        d2f[i] = c*(10*f[i+1]-15*f[i]-4*f[i-1]+14*f[i-2]-6*f[i-3]+f[i-4])*oodt2
-        i = n-2
-        d1f[i] = - c*(-25*f[i]+48*f[i-1]-36*f[i-2]+16*f[i-3]-3*f[i-4])*oodt
-        d2f[i] = c*(45*f[i]-154*f[i-1]+214*f[i-2]-156*f[i-3]+61*f[i-4]-10*f[i-5])*oodt2
+        oodt = 1./(t[1]-t[0])
+        d1f[1:] = np.diff(f)*oodt
+        d1f[0]  = d1f[1]
+        d2f[1:] = np.diff(d1f)*oodt
+        d2f[0]  = d2f[1]
+    elif o in [2,4,6]:
+        d1f = fd_diff(t, f, d=1, o=o, axis=0, uniform=True)
+        d2f = fd_diff(t, f, d=2, o=o, axis=0, uniform=True)
     else:
         wrn.warn("order not implemented, return empty arrays")
     return d1f, d2f
@@ -1,9 +1,13 @@
 import numpy as np
 import scipy as sp
 import math
+import time
 from ..utils import num as num 
+from ..utils.units import MSun_sec
 import warnings as wrn
 from scipy.special import factorial as fact
+from scipy.special import gammaln
+import functools
 try:
     from scipy import factorial2
 except:  
@@ -14,24 +18,63 @@ except:
 # Waveform analysis utilities
 # ------------------------------------------------------------------
 
+@functools.lru_cache(maxsize=None)
+def wigner_d_coefs(l, m, s):
+    """
+    Coefficients c_k and exponents of cos(incl/2), sin(incl/2) in the
+    sum over k of the Wigner-d function d^l_{ms}. The factorial ratios
+    are evaluated through log-gamma, so that high l does not overflow.
+    Tables are memoized and returned read-only.
+    """
+    ki = max(0, m-s)
+    kf = min(l+m, l-s)
+    k  = np.arange(ki, kf+1)
+    lnorm = 0.5*(gammaln(l+m+1) + gammaln(l-m+1) + gammaln(l+s+1) + gammaln(l-s+1))
+    ldiv  = gammaln(k+1) + gammaln(l+m-k+1) + gammaln(l-s-k+1) + gammaln(s-m+k+1)
+    coefs = np.power(-1., k) * np.exp(lnorm - ldiv)
+    pcos  = 2*l + m - s - 2*k
+    psin  = 2*k + s - m
+    for a in (coefs, pcos, psin):
+        a.flags.writeable = False
+    return coefs, pcos, psin
+
+@functools.lru_cache(maxsize=None)
+def spinw_spherical_harm_table(s, modes):
+    """
+    Memoized tables for spinw_spherical_harm_matrix(): coefficients
+    and exponents of all the modes, padded to the same number of
+    terms, shape (n_modes, n_k), and normalization, shape (n_modes,)
+    """
+    tabs  = [wigner_d_coefs(l, m, -s) for l, m in modes]
+    nk    = max([len(c) for c, _, _ in tabs])
+    coefs = np.zeros((len(modes), nk))
+    pcos  = np.zeros((len(modes), nk), dtype=int)
+    psin  = np.zeros((len(modes), nk), dtype=int)
+    for i, (c, pc, ps) in enumerate(tabs):
+        coefs[i,:len(c)] = c
+        pcos[i,:len(c)]  = pc
+        psin[i,:len(c)]  = ps
+    norm  = np.power(-1.,-s) * np.sqrt((2.*np.array([l for l, m in modes])+1.)/(4.*np.pi))
+    for a in (coefs, pcos, psin, norm):
+        a.flags.writeable = False
+    return coefs, pcos, psin, norm
+
 def wigner_d_function(l, m, s, incl):
     """
-    Wigner-d functions
+    Wigner-d functions (incl can be an array)
     """
-    costheta = np.cos(incl*0.5)
-    sintheta = np.sin(incl*0.5)
-    norm = np.sqrt( (fact(l+m) * fact(l-m) * fact(l+s) * fact(l-s)) )
-    ki = np.amax([0,m-s])
-    kf = np.amin([l+m,l-s])
-    k = np.arange(ki,kf+1)
-    div = 1.0/( fact(k) * fact(l+m-k) * fact(l-s-k) * fact(s-m+k) );
-    dWig = div*( np.power(-1.,k) * np.power(costheta,2*l+m-s-2*k) * np.power(sintheta,2*k+s-m) )
-    return norm * np.sum(dWig)
+    coefs, pcos, psin = wigner_d_coefs(l, m, s)
+    incl     = np.asarray(incl, dtype=float)
+    costheta = np.cos(incl*0.5)[...,None]
+    sintheta = np.sin(incl*0.5)[...,None]
+    dWig = coefs * np.power(costheta, pcos) * np.power(sintheta, psin)
+    return np.sum(dWig, axis=-1)
 
 def spinw_spherical_harm(s, l, m, incl,phi):
     """ 
     Spin-weighted spherical harmonics
     E.g. https://arxiv.org/abs/0709.0093
+    (incl and phi can be arrays)
     """
     if ((l<0) or (m<-l) or (m>l)):
         raise ValueError("wrong (l,m)")
@@ -40,6 +83,35 @@ def spinw_spherical_harm(s, l, m, incl,phi):
     exp_mphi = ( np.cos(m*phi) + 1j * np.sin(m*phi) )
     return dWigner * exp_mphi
 
+def spinw_spherical_harm_matrix(s, modes, incl, phi):
+    """
+    Spin-weighted spherical harmonics for a set of orientations
+    and (l,m) modes
+
+    * s     : spin weight
+    * modes : list of (l,m) multipoles
+    * incl  : inclinations, shape (n_orient,)
+    * phi   : azimuthal angles, shape (n_orient,)
+
+    Returns a complex array of shape (n_orient, n_modes)
+
+    The powers of cos(incl/2), sin(incl/2) are tabulated once per 
+    orientation and gathered for all modes.
+    """
+    modes = tuple([(int(l), int(m)) for l, m in modes])
+    for l, m in modes:
+        if ((l<0) or (m<-l) or (m>l)):
+            raise ValueError("wrong (l,m)")
+    coefs, pcos, psin, norm = spinw_spherical_harm_table(s, modes)
+    incl, phi = np.broadcast_arrays(np.atleast_1d(np.asarray(incl, dtype=float)),
+                                    np.atleast_1d(np.asarray(phi, dtype=float)))
+    pmax = max(pcos.max(), psin.max())
+    powc = np.power(np.cos(incl*0.5)[:,None], np.arange(pmax+1))
+    pows = np.power(np.sin(incl*0.5)[:,None], np.arange(pmax+1))
+    dWig = np.einsum('ok,iok->io', coefs, powc[:,pcos] * pows[:,psin])
+    m    = np.array([m for l, m in modes])
+    return norm * dWig * np.exp(1j * phi[:,None] * m)
+
 def interp_fd_wave(fnew, f, h, kind = 'quadratic'):
     """
         Interpolate frequency-domain waveform
@@ -132,6 +204,218 @@ def match(t1, h1, t2, h2,
     # compute match
     return min([1.,I12/np.sqrt(I11*I22)])
 
+class match_engine(object):
+    """
+    Match (fitting factor) of one waveform against many, with the
+    frequency-domain templates and the PSD weights precomputed on a
+    shared frequency grid. Same definitions as match().
+
+    -----------
+    Input
+    -----------
+    fmin, fmax, df : Frequency grid [Hz]. Values left to None are taken
+                     from the first waveform added (0, its Nyquist 
+                     frequency, its frequency spacing)
+    fpsd, psd      : PSD (if None, flat PSD is used)
+    interp_kind    : Kind of interpolant according to scipy.interp1d
+    workers        : Number of threads of scipy.fft
+    chunk          : Number of templates per batched inverse FFT
+    -----------
+    Contains
+    -----------
+    * freqs     : shared frequency grid
+    * weight    : 1/PSD on freqs
+    * templates : dictionary key -> frequency-domain waveform on freqs
+    * norms     : dictionary key -> (h|h)
+    * timing    : dictionary stage -> accumulated seconds
+                  ('fft', 'interp', 'psd', 'inner')
+    """
+    def __init__(self, fmin=None, fmax=None, df=None, fpsd=None, psd=None,
+                 interp_kind='quadratic', workers=None, chunk=64):
+        self.fmin, self.fmax, self.df = fmin, fmax, df
+        self.fpsd, self.psd = fpsd, psd
+        self.interp_kind = interp_kind
+        self.workers = workers
+        self.chunk   = chunk
+        self.freqs   = None
+        self.weight  = None
+        self.templates = {}
+        self.norms   = {}
+        self.timing  = {'fft': 0., 'interp': 0., 'psd': 0., 'inner': 0.}
+
+    def _stage(self, name, t0):
+        t1 = time.perf_counter()
+        self.timing[name] += t1 - t0
+        return t1
+
+    def set_grid(self, f):
+        """
+        Fix the shared frequency grid and the PSD weights, the missing
+        bounds are taken from the frequency axis f
+        """
+        t0 = time.perf_counter()
+        if self.fmin is None: self.fmin = min(f)
+        if self.fmax is None: self.fmax = max(f)
+        if self.df is None:   self.df   = f[1]-f[0]
+        self.freqs = np.linspace(self.fmin, self.fmax, 
+                                 int((self.fmax-self.fmin)/self.df)+1)
+        if self.psd is None:
+            self.weight = np.ones_like(self.freqs)
+        else:
+            self.weight = 1./np.interp(self.freqs, self.fpsd, self.psd, 
+                                       right=np.inf, left=np.inf)
+        self._stage('psd', t0)
+
+    def fd(self, t, h):
+        """
+        Frequency-domain waveform on the shared grid and its norm (h|h)
+
+        * t : time axis in seconds (equally spaced)
+        * h : real (or imaginary) part of the waveform on t
+        """
+        if (len(t)!=len(h)):
+            raise ValueError("Length of waveform does not match corresponding time axis.")
+        t0 = time.perf_counter()
+        f, hf = fft(t, h)
+        t0 = self._stage('fft', t0)
+        if self.freqs is None:
+            self.set_grid(f)
+            t0 = time.perf_counter()
+        hf = interp_fd_wave(self.freqs, f, hf, kind=self.interp_kind)
+        t0 = self._stage('interp', t0)
+        norm = (np.abs(hf)**2 * self.weight).sum()
+        self._stage('inner', t0)
+        return hf, norm
+
+    def add(self, key, t, h):
+        """
+        Precompute and store the template key
+        """
+        self.templates[key], self.norms[key] = self.fd(t, h)
+
+    def remove(self, key):
+        """
+        Drop the template key
+        """
+        del self.templates[key]
+        del self.norms[key]
+
+    def match(self, t, h, keys=None):
+        """
+        Match of the waveform (t, h) (or of the stored template t, if
+        h is None) against the templates keys (default all)
+
+        Returns a dictionary key -> match
+        """
+        from scipy.fft import fft as sfft
+        if h is None:
+            hf1, I11 = self.templates[t], self.norms[t]
+        else:
+            hf1, I11 = self.fd(t, h)
+        if keys is None:
+            keys = list(self.templates.keys())
+        t0 = time.perf_counter()
+        a  = np.conj(hf1) * self.weight
+        out = {}
+        for i0 in range(0, len(keys), self.chunk):
+            kk  = keys[i0:i0+self.chunk]
+            H2  = np.array([self.templates[k] for k in kk])
+            I22 = np.array([self.norms[k] for k in kk])
+            I12 = np.max(np.abs(sfft(a * H2, axis=-1, overwrite_x=True, 
+                                     workers=self.workers)), axis=-1)
+            out.update(zip(kk, np.minimum(1., I12/np.sqrt(I11*I22))))
+        self._stage('inner', t0)
+        return out
+
+    def timing_reset(self):
+        """
+        Reset the timing counters
+        """
+        for k in self.timing:
+            self.timing[k] = 0.
+
+
+def mismatch_mass_sweep(u1, h1, u2, h2, masses,
+                        fpsd = None, psd = None,
+                        fmin = None, fmax = None, df = None,
+                        interp_kind = 'quadratic', chunk = 32, workers = None,
+                        maxbytes = 2**28):
+    """
+        Compute the mismatch (1 - match, as in match()) between two waveforms
+        given in geometric units, for many values of the total mass.
+        The Fourier transforms are computed once in geometric units, each
+        mass only rescales the frequency axis and the amplitude: 
+        h_M(f) = M h(f M), with M in seconds.
+        
+        * u1, h1      : Time axis (t/M) and real (or imaginary) part of first waveform
+        * u2, h2      : Time axis (t/M) and real (or imaginary) part of second waveform
+        * masses      : Total masses in solar masses, shape (n_mass,)
+        * fpsd, psd   : PSD (if None, flat PSD is used)
+        * fmin        : Minimum frequency in Hertz (if None, 0)
+        * fmax        : Maximum frequency in Hertz (if None, highest value
+                        of each mass, Fmax/M)
+        * df          : Frequency spacing in Hertz (if None, lowest value 
+                        of each mass, dF/M)
+        * interp_kind : Kind of interpolant according to scipy.interp1d
+        * chunk       : Maximum number of masses evaluated in one batch
+        * workers     : Number of threads of scipy.fft
+        * maxbytes    : Memory budget (bytes) of the arrays of one batch,
+                        the batches are made smaller to fit it
+        
+        Each mass is evaluated on its own frequency grid, the same as
+        match() on the waveforms rescaled to seconds. The masses are 
+        sorted and split in batches, the grids of a batch are zero-padded
+        to a common length for the FFT over the time shifts and the 
+        padded bins are masked out of the inner products (the time 
+        shifts of the shorter grids are then sampled more finely than in
+        match(), if fmin > 0 the results differ at the 1e-6 level).
+        This function returns the mismatch, shape (n_mass,)
+    """
+    from scipy.fft import fft as sfft
+
+    if (len(u1)!=len(h1)) or (len(u2)!=len(h2)):
+        raise ValueError("Length of waveform does not match corresponding time axis.")
+
+    masses = np.atleast_1d(np.asarray(masses, dtype=float))
+    Ms     = masses * MSun_sec()
+
+    # FFTs in geometric units
+    F1, hF1 = fft(u1, h1)
+    F2, hF2 = fft(u2, h2)
+    Fmax    = max([max(F1),max(F2)])
+    dF      = min([F1[1]-F1[0],F2[1]-F2[0]])
+    if (fmin is None):  fmin = 0.
+
+    # frequency grid of each mass, as np.linspace() in match()
+    _fmax = Fmax / Ms if fmax is None else np.full(len(Ms), float(fmax))
+    _df   = dF / Ms if df is None else np.full(len(Ms), float(df))
+    n     = ((_fmax - fmin)/_df).astype(int) + 1
+    step  = (_fmax - fmin) / np.maximum(n - 1, 1)
+
+    order = np.argsort(Ms)
+    mm    = np.empty(len(Ms))
+    for i0 in range(0, len(Ms), chunk):
+        idx   = order[i0:i0+chunk]
+        # ~6 complex arrays of the batch shape are alive at once
+        nrow  = max(1, int(maxbytes // (96 * n[idx].max())))
+        for j0 in range(0, len(idx), nrow):
+            jdx   = idx[j0:j0+nrow]
+            k     = np.arange(n[jdx].max())
+            freqs = fmin + k * step[jdx,None]
+            mask  = k < n[jdx,None]
+            if (psd is None):   w = np.ones_like(freqs)
+            else:               w = 1./np.interp(freqs, fpsd, psd, right=np.inf, left=np.inf)
+            w     = np.where(mask, w, 0.)
+            M     = Ms[jdx,None]
+            hf1   = M * interp_fd_wave(freqs * M, F1, hF1, kind=interp_kind)
+            hf2   = M * interp_fd_wave(freqs * M, F2, hF2, kind=interp_kind)
+            I11   = np.sum(np.abs(hf1)**2 * w, axis=-1)
+            I22   = np.sum(np.abs(hf2)**2 * w, axis=-1)
+            I12   = np.max(np.abs(sfft(np.conj(hf1)*hf2*w, axis=-1, overwrite_x=True,
+                                       workers=workers)), axis=-1)
+            mm[jdx] = 1. - np.minimum(1., I12/np.sqrt(I11*I22))
+    return mm
+
 def align_phase(t, Tf, phi_a_tau, phi_b):
     """
     Align two waveforms in phase by minimizing the chi^2
@@ -153,7 +437,7 @@ def align_phase(t, Tf, phi_a_tau, phi_b):
            np.sum(weight * dt)
 
 
-def align(t, Tf, tau_max, t_a, phi_a, t_b, phi_b):
+def align(t, Tf, tau_max, t_a, phi_a, t_b, phi_b, refine=False):
     """
     Align two waveforms in phase by minimizing the chi^2
 
@@ -161,36 +445,221 @@ def align(t, Tf, tau_max, t_a, phi_a, t_b, phi_b):
 
     as a function of dphi and tau.
 
-    * t          : time
+    * t          : time, must be equally spaced
     * Tf         : final time
     * tau_max    : maximum time shift
     * t_a, phi_a : first phase evolution
     * t_b, phi_b : second phase evolution
+    * refine     : if True, refine tau continuously around the best
+                   discrete shift
 
-    The two waveforms are re-sampled using the given time t
+    The two waveforms are re-sampled using the given time t. The shifts
+    tau = i*dt, i = -N..N-1, N = int(tau_max/dt), are searched at once 
+    (see align_batch())
 
     This function returns a tuple (tau_opt, dphi_opt, chi2_opt)
     """
+    tau, dphi, chi2 = align_batch(t, Tf, tau_max, [(t_a, phi_a, t_b, phi_b)], 
+                                  refine=refine)
+    return (tau[0], dphi[0], chi2[0])
+
+
+def align_batch(t, Tf, tau_max, pairs, refine=False, ncand=4):
+    """
+    Align many pairs of waveforms in phase, as align()
+
+    * t          : time, must be equally spaced
+    * Tf         : final time
+    * tau_max    : maximum time shift
+    * pairs      : list of tuples (t_a, phi_a, t_b, phi_b)
+    * refine     : if True, refine tau continuously around the best
+                   discrete shift (bounded Brent method)
+    * ncand      : number of best shifts of the correlation search
+                   that are re-evaluated directly
+
+    For each shift dphi is eliminated analytically, dphi = <a - b>, so
+    that chi^2 = dt [ \sum (a-b)^2 - (\sum (a-b))^2 / n ]. The sums are
+    sliding sums and a cross-correlation, computed with FFTs for all
+    the shifts and all the pairs at once. The phases are first shifted
+    by the mean of phi_b to limit the cancellation.
+
+    This function returns the arrays tau_opt, dphi_opt, chi2_opt,
+    shape (n_pairs,)
+    """
+    from scipy.signal import fftconvolve
+    from scipy.optimize import minimize_scalar
+
+    t  = np.asarray(t)
     dt = t[1] - t[0]
-    N = int(tau_max/dt)
-    weight = np.double((t >= 0) & (t < Tf))
+    N  = int(tau_max/dt)
+    n  = len(t)
+    win = np.flatnonzero((t >= 0) & (t < Tf))
+    if len(win) == 0:
+        raise ValueError("no samples in [0, Tf)")
+    j0, nw = win[0], len(win)
+
+    # extended grid, a_i[j] = phi_a(t_j - i dt) = A[j - i + N]
+    te = t[0] + (np.arange(n + 2*N) - N) * dt
+    A  = np.array([np.interp(te, t_a, phi_a) for t_a, phi_a, _, _ in pairs])
+    B  = np.array([np.interp(t[win], t_b, phi_b) for _, _, t_b, phi_b in pairs])
+    c  = B.mean(axis=-1, keepdims=True)
+    A  = A - c
+    B  = B - c
+
+    # shifts i = -N..N-1, start of the a-window s = j0 - i + N
+    ii = np.arange(-N, N)
+    ss = j0 - ii + N
+    P1 = np.concatenate((np.zeros((len(pairs),1)), np.cumsum(A, axis=-1)), axis=-1)
+    P2 = np.concatenate((np.zeros((len(pairs),1)), np.cumsum(A**2, axis=-1)), axis=-1)
+    SA  = P1[:,ss+nw] - P1[:,ss]
+    SA2 = P2[:,ss+nw] - P2[:,ss]
+    AB  = fftconvolve(A, B[:,::-1], mode='valid', axes=-1)[:,ss]
+    SB  = B.sum(axis=-1, keepdims=True)
+    SB2 = (B**2).sum(axis=-1, keepdims=True)
+    S1  = SA - SB
+    S2  = SA2 - 2*AB + SB2
+    chi2 = (S2 - S1**2/nw) * dt
+
+    def chi2_direct(a, b):
+        d = a - b
+        dp = d.mean()
+        return dp, np.sum((d - dp)**2)*dt
+
+    tau_opt  = np.empty(len(pairs))
+    dphi_opt = np.empty(len(pairs))
+    chi2_opt = np.empty(len(pairs))
+    for p, (t_a, phi_a, t_b, phi_b) in enumerate(pairs):
+        cand = np.argsort(chi2[p])[:ncand]
+        best = None
+        for k in cand:
+            dp, c2 = chi2_direct(A[p,ss[k]:ss[k]+nw], B[p])
+            if best is None or c2 < best[2]:
+                best = (ii[k]*dt, dp, c2)
+        tau, dp, c2 = best
+
+        if refine:
+            fun = lambda x: chi2_direct(np.interp(t[win], t_a + x, phi_a) - c[p,0], B[p])[1]
+            res = minimize_scalar(fun, bounds=(tau-dt, tau+dt), method='bounded',
+                                  options={'xatol': 1e-6*dt})
+            if res.fun < c2:
+                tau = res.x
+                dp, c2 = chi2_direct(np.interp(t[win], t_a + tau, phi_a) - c[p,0], B[p])
+
+        tau_opt[p]  = tau
+        dphi_opt[p] = dp
+        chi2_opt[p] = c2
+    return tau_opt, dphi_opt, chi2_opt
+
+
+@functools.lru_cache(maxsize=32)
+def fft_freqs(n, dt):
+    """
+    Memoized (read-only) FFT sample frequencies
+    """
+    from scipy.fft import fftfreq
+    f = fftfreq(n, dt)
+    f.flags.writeable = False
+    return f
 
-    res_phi_b = np.interp(t, t_b, phi_b)
 
-    tau = []
-    dphi = []
-    chi2 = []
-    for i in range(-N, N):
-        tau.append(i*dt)
-        res_phi_a_tau = np.interp(t, t_a + tau[-1], phi_a)
-        dphi.append(align_phase(t, Tf, res_phi_a_tau, res_phi_b))
-        chi2.append(np.sum(weight*
-            (res_phi_a_tau - res_phi_b - dphi[-1])**2)*dt)
+# From Reisswig and Pollney, Class. Quantum Grav. 28 (2011) 195015
+def fixed_freq_int(signal, cutoff, dt=1, order=2, axis=-1, workers=None, pad=False):
+    """
+    Fixed frequency time integration of a batch of signals
+
+    * signal  : np array, the integration is along axis
+    * cutoff  : the cutoff frequency, a scalar or an array broadcastable
+                to the shape of signal without axis (one cutoff per row)
+    * dt      : the sampling of the signal
+    * order   : number of time integrations (1, 2)
+    * axis    : time axis of signal
+    * workers : number of threads of scipy.fft
+    * pad     : if True, zero-pad to scipy.fft.next_fast_len() and crop
+                the result back. Note this alters the result, since the
+                integration assumes a periodic signal
+
+    Returns a complex array of the shape of signal
+    """
+    from scipy.fft import fft, ifft, next_fast_len
+
+    signal = np.moveaxis(np.asarray(signal), axis, -1)
+    n      = signal.shape[-1]
+    nfft   = next_fast_len(n) if pad else n
 
-    chi2 = np.array(chi2)
-    imin = np.argmin(chi2)
+    f = fft_freqs(nfft, dt)
+    c = np.asarray(cutoff, dtype=float)[...,None]
+    f = np.where(f >= 0, np.maximum(f, c), np.minimum(f, -c))
 
-    return (tau[imin], dphi[imin], chi2[imin])
+    F = fft(signal, n=nfft, axis=-1, workers=workers)
+    F /= (2j*math.pi*f)**order
+    out = ifft(F, axis=-1, overwrite_x=True, workers=workers)[...,:n]
+    return np.moveaxis(out, -1, axis)
+
+
+def fixed_freq_int_scan(signal, cutoffs, dt=1, order=2, workers=None, pad=False,
+                        drift=False, chunk=16, win=1.):
+    """
+    Fixed frequency time integration of one signal for many cutoffs.
+    The forward FFT is computed once, the inverse FFTs are batched 
+    over blocks of cutoffs
+
+    * signal  : 1d np array with the target signal
+    * cutoffs : array of cutoff frequencies, shape (n_cut,)
+    * dt      : the sampling of the signal
+    * order   : number of time integrations (1, 2)
+    * workers : number of threads of scipy.fft
+    * pad     : zero-pad to next_fast_len (see fixed_freq_int())
+    * drift   : if True, return only the drift diagnostics
+    * chunk   : number of cutoffs per batched inverse FFT
+    * win     : window applied to the signal before the integration
+                and to the integrated signals, shape (n,) or scalar
+
+    Returns the integrated signals, shape (n_cut, n), or if drift a 
+    dictionary of arrays of shape (n_cut,), computed on the windowed
+    integrated signals:
+    * offset : |a| of the least-squares linear trend a + b t of the
+               integrated signal (t measured from the first sample)
+    * slope  : |b|
+    * drift  : |b| T / max|integrated signal|, T the signal duration
+    """
+    from scipy.fft import fft, ifft, next_fast_len
+
+    signal  = np.asarray(signal)
+    cutoffs = np.atleast_1d(np.asarray(cutoffs, dtype=float))
+    n       = signal.shape[0]
+    nfft    = next_fast_len(n) if pad else n
+
+    F  = fft(win * signal, n=nfft, workers=workers)
+    f0 = fft_freqs(nfft, dt)
+
+    if drift:
+        # least-squares fit of a + b t, t = dt*(0..n-1)
+        t    = dt*np.arange(n)
+        tm   = t.mean()
+        stt  = np.sum((t-tm)**2)
+        diag = {'offset': np.empty(len(cutoffs)), 'slope': np.empty(len(cutoffs)), 
+                'drift': np.empty(len(cutoffs))}
+    else:
+        out = np.empty((len(cutoffs), n), dtype=complex)
+
+    for i0 in range(0, len(cutoffs), chunk):
+        c = cutoffs[i0:i0+chunk,None]
+        f = np.where(f0 >= 0, np.maximum(f0, c), np.minimum(f0, -c))
+        h = win * ifft(F/(2j*math.pi*f)**order, axis=-1, overwrite_x=True, 
+                       workers=workers)[:,:n]
+        if drift:
+            b = np.dot(h, t-tm)/stt
+            a = h.mean(axis=-1) - b*tm
+            sl = slice(i0, i0+len(c))
+            diag['offset'][sl] = np.abs(a)
+            diag['slope'][sl]  = np.abs(b)
+            diag['drift'][sl]  = np.abs(b)*(t[-1]-t[0])/np.max(np.abs(h), axis=-1)
+        else:
+            out[i0:i0+len(c)] = h
+
+    if drift:
+        return diag
+    return out
 
 
 # From Reisswig and Pollney, Class. Quantum Grav. 28 (2011) 195015
@@ -202,17 +671,7 @@ def fixed_freq_int_1(signal, cutoff, dt=1):
     * cutoff : the cutoff frequency
     * dt     : the sampling of the signal
     """
-    from scipy.fftpack import fft, ifft, fftfreq
-
-    f = fftfreq(signal.shape[0], dt)
-
-    idx_p = np.logical_and(f >= 0, f < cutoff)
-    idx_m = np.logical_and(f <  0, f > -cutoff)
-
-    f[idx_p] = cutoff
-    f[idx_m] = -cutoff
-
-    return ifft(-1j*fft(signal)/(2*math.pi*f))
+    return fixed_freq_int(signal, cutoff, dt=dt, order=1, axis=0)
 
 
 # From Reisswig and Pollney, Class. Quantum Grav. 28 (2011) 195015
@@ -224,17 +683,7 @@ def fixed_freq_int_2(signal, cutoff, dt=1):
     * cutoff : the cutoff frequency
     * dt     : the sampling of the signal
     """
-    from scipy.fftpack import fft, ifft, fftfreq
-
-    f = fftfreq(signal.shape[0], dt)
-
-    idx_p = np.logical_and(f >= 0, f < cutoff)
-    idx_m = np.logical_and(f <  0, f > -cutoff)
-
-    f[idx_p] = cutoff
-    f[idx_m] = -cutoff
-
-    return ifft(-fft(signal)/(2*math.pi*f)**2)
+    return fixed_freq_int(signal, cutoff, dt=dt, order=2, axis=0)
 
 
 def unwrap_shift0(x, dp, t0=0.):
@@ -248,24 +697,52 @@ def unwrap_shift0(x, dp, t0=0.):
 def norm_dp_dt(x, t1,p1,t2,p2,tab):
     """ 
     Distance L_2 between phases with time and phase shifts 
+    (trapezoidal rule with unit spacing)
     """
     deltat = x[0] 
     deltap = x[1]
-    p2i = np.interp(t1, t2-deltat,p2)
-    idx = np.where(np.logical_and(t1>=tab[0], t1<=tab[1]))
-    return np.trapz( (p1[idx]-p2i[idx]-deltap)**2 )
+    idx = np.flatnonzero(np.logical_and(t1>=tab[0], t1<=tab[1]))
+    y   = (p1[idx]-np.interp(t1[idx], t2-deltat,p2)-deltap)**2
+    if y.size == 0:
+        return 0.
+    return np.sum(y) - 0.5*(y[0]+y[-1])
 
 
 def min_phasediff_L2(t1,p1,t2,p2, tab, guess=[0.,0.], tol=1e-9):
     """ 
     Minimize L_2 distance varying time and phase shifts 
+
+    The phase shift is eliminated analytically (it is the trapezoidal
+    mean of p1-p2 on tab), the time shift is found with Brent's method
+    starting from guess[0]. guess[1] (the phase shift guess of the 
+    former 2D minimization) is not used, it is kept for compatibility.
     """
-    xopt = sp.optimize.fmin(func=norm_dp_dt, x0=guess, 
-                            args=(t1,p1,t2,p2,tab),
-                            xtol=tol)
-    p2i = np.interp(t1, t2-xopt[0],p2) + xopt[1]
+    from scipy.optimize import minimize_scalar
+    idx = np.flatnonzero(np.logical_and(t1>=tab[0], t1<=tab[1]))
+    if len(idx) < 2:
+        raise ValueError("The interval tab = [{}, {}] contains {} samples of t1, "
+                         "at least 2 are needed".format(tab[0], tab[1], len(idx)))
+    t1w = t1[idx]
+    p1w = p1[idx]
+    tw  = np.ones(len(idx))
+    tw[0] = tw[-1] = 0.5
+
+    def dphi(deltat):
+        d = p1w - np.interp(t1w, t2-deltat,p2)
+        return d, np.sum(tw*d)/np.sum(tw)
+
+    def fun(deltat):
+        d, dp = dphi(deltat)
+        return np.sum(tw*(d-dp)**2)
+
+    h = t1[1]-t1[0]
+    res = minimize_scalar(fun, bracket=(guess[0]-h, guess[0]+h), method='brent',
+                          tol=tol)
+    deltat = res.x
+    deltap = dphi(deltat)[1]
+    p2i = np.interp(t1, t2-deltat,p2) + deltap
     Dphi = p1 - p2i
-    return p2i, xopt[1], xopt[0], Dphi
+    return p2i, deltap, deltat, Dphi
 
 
 def richardson_extrap(p, y0, h0, y1, h1):
@@ -291,7 +768,7 @@ def richardson_extrap(p, y0, h0, y1, h1):
     return yextrp
 
 
-def richardson_extrap_series(p, y, t, h):
+def richardson_extrap_series(p, y, t, h, return_err=False):
     """
     Richardson extrapolation in resolution.
 
@@ -303,14 +780,18 @@ def richardson_extrap_series(p, y, t, h):
              h = [h1, h1, h2, ... , hN],
     performs Richardson extrapolation assuming order of convergence `p`.
 
-    Returns extrapolated dataset `ye` and estimated error `err`
-    computed wrt second to last extrapolation step at each point.
+    Returns extrapolated dataset `ye` and time `te`, and if `return_err`
+    the estimated error `err` computed wrt second to last extrapolation 
+    step at each point.
 
     NOTE: `h` is the grid spacing, not the number of points `n`. In the latter case
     just pass `1/n` instead.
     NOTE: A data set consists out of `yi` and `ti` and both arrays have to be 
     of the same length. However, the length of a data set does not have to agree
     among different resolutions.
+    NOTE: `yi` can be stacked quantities (e.g. phase and amplitude of several
+    modes) with time along the last axis, shape (..., len(ti)). The tableau
+    is built for all the samples at once.
     """
 
     N = len(h) # number of data sets passed
@@ -318,31 +799,35 @@ def richardson_extrap_series(p, y, t, h):
         raise ValueError("Inconsistent number of data sets received: Arrays h, t, p must have same length!")
 
     # extrapolated result will be sampled on grid of highest resolution data
-    te = t[-1]; n = len(te)
-    ye = np.zeros(n); err = np.zeros(n)
+    te = t[-1]
 
     # interpolate all data sets on time grid of extrapolated result
-    intrp_y = [ np.interp(te, t[k], y[k]) for k in range(N-1) ]
-    intrp_y.append(y[-1])
-
-    # compute Richardson extrapolation pointwise
-    for i in range(n):
-        # procedure is similar to Romberg integration
-        # but instead of recomputing integrals for different resolutions, here
-        # we just use the provided data to populate the first column to build 
-        # up the iteration
-        extrp_y = np.zeros((N,N))
-        extrp_y[:,0] = [ intrp_y[k][i] for k in range(N) ]
-
-        # iterate each row with Richardson extrapolation and systematically
-        # reduce higher order errors
-        for k in range(1,N):
-            for j in range(0, k):
-                extrp_y[k,j+1] = richardson_extrap(p+j, extrp_y[k-1,j], h[k-1], extrp_y[k,j], h[k])
-
+    def interp(tk, yk):
+        yk = np.asarray(yk)
+        if yk.ndim == 1:
+            return np.interp(te, tk, yk)
+        rows = yk.reshape(-1, yk.shape[-1])
+        return np.array([np.interp(te, tk, r) for r in rows]).reshape(yk.shape[:-1]+(len(te),))
+    intrp_y = [ interp(t[k], y[k]) for k in range(N-1) ]
+    intrp_y.append(np.asarray(y[-1], dtype=float))
+
+    # procedure is similar to Romberg integration, the first column of 
+    # the tableau is the data, each row k is built from row k-1 with 
+    # Richardson extrapolation, systematically reducing higher order errors
+    row = [ intrp_y[0] ]
+    prev_diag = row[0]
+    for k in range(1,N):
+        new = [ intrp_y[k] ]
+        for j in range(0, k):
+            new.append(richardson_extrap(p+j, row[j], h[k-1], new[j], h[k]))
+        prev_diag = row[-1]
+        row = new
+    ye = row[-1]
+
+    if return_err:
         # error estimate wrt to second to last extrapolation
-        err[i] = extrp_y[-1,-1] - extrp_y[-2,-2]
-        ye[i] = extrp_y[-1,-1]
+        err = ye - prev_diag if N > 1 else np.zeros_like(ye)
+        return ye, te, err
     return ye, te
 
 
@@ -356,9 +841,11 @@ def radius_extrap(t, psi4, r0, l=2, m=2, m0=1):
         Kiuchi et al. PRD 96 084060 (2017)
 
     Input
-        * t, psi4   : time and complex (l,m)-mode of R psi4 
+        * t, psi4   : time and complex (l,m)-mode of R psi4, psi4 can be
+                      stacked with time along the last axis
         * r0        : extraction radius
-        * l, m      : multipole index
+        * l, m      : multipole index (l can be an array broadcastable
+                      to psi4, e.g. shape (n_modes,1))
         * m0        : ADM mass
     Output
         * Psi4_inf  : extrapolated R psi4 to R -> oo
@@ -366,10 +853,10 @@ def radius_extrap(t, psi4, r0, l=2, m=2, m0=1):
     rA = r0*(1. + m0/(2.*r0))**2
     C  = 1. - 2.*m0/rA
     dt = np.concatenate(([0], np.diff(t)))
-    return C*(psi4 - (l-1)*(l+2)/(2*rA)*np.cumsum(psi4*dt))
+    return C*(psi4 - (l-1)*(l+2)/(2*rA)*np.cumsum(psi4*dt, axis=-1))
 
 
-def radius_extrap_polynomial(ys, rs, K):
+def radius_extrap_polynomial(ys, rs, K, return_res=False):
     """
     Given different datasets yi, i=1...N, collected as
              ys = [y0, y1, y2, ... , yN]
@@ -383,29 +870,39 @@ def radius_extrap_polynomial(ys, rs, K):
     where y_infty and the K coefficients ci are determined through a least
     squares polynomial fit from the above data.
 
-    ys ... collection of data sets yi which all are of the same length,
-           e.g. all sampled on the same grid u.
+    ys ... collection of data sets yi which all are of the same shape,
+           e.g. all sampled on the same grid u. They can be complex and
+           stacked (e.g. several modes, shape (n_modes, len(u)))
     rs ... extraction radii of the data samples yi
     K  ... maximum polynomial order of 1/r polynomial
+    return_res ... if True, return also the fit residuals yi - fit(ri),
+           shape (N,) + yi.shape
+
+    The design matrix is factorized (QR) once and the fit of all the 
+    samples is a single matrix multiply.
     """
     N = len(ys)
     if N != len(rs):
         raise ValueError("Mismatch in number of data sets ys and radii rs encountered!")
-    L = len(ys[0])
+    shape = np.shape(ys[0])
     for i in range(1,N):
-        if len(ys[i]) != L:
-            raise ValueError("Inhomogenuous data set encountered! Check if all ys are sampled " *
+        if np.shape(ys[i]) != shape:
+            raise ValueError("Inhomogenuous data set encountered! Check if all ys are sampled " +
                              "on the same grid")
 
-    yinfty = np.zeros(L)
-    # implementation relies on example given at 
-    # https://docs.scipy.org/doc/scipy/reference/reference/generated/scipy.linalg.lstsq.html#scipy.linalg.lstsq
-    M = np.array(rs)[:, np.newaxis]**(-np.array(range(K+1))) # inverse powers of rs
-    for i in range(L):
-        ys_i = [ ys[k][i] for k in range(N) ] # gather data for common radius
-        p, *_ = sp.linalg.lstsq(M, ys_i)
-        yinfty[i] = p[0] # zeroth coefficient equals value at r -> infty
-        
+    Y = np.asarray(ys).reshape(N, -1)
+    M = np.array(rs, dtype=float)[:, np.newaxis]**(-np.array(range(K+1))) # inverse powers of rs
+    if N >= K+1:
+        Q, R = np.linalg.qr(M)
+        p = sp.linalg.solve_triangular(R, np.dot(Q.T, Y))
+    else:
+        # underdetermined, minimum norm solution
+        p, *_ = sp.linalg.lstsq(M, Y)
+    yinfty = p[0].reshape(shape) # zeroth coefficient equals value at r -> infty
+
+    if return_res:
+        res = (Y - np.dot(M, p)).reshape((N,)+shape)
+        return yinfty, res
     return yinfty
 
 
@@ -515,6 +1012,40 @@ def waveform2energetics(h, h_dot, t, modes, mmodes):
     return E_GW_all, E_GW_dot_all, J_GW_all, J_GW_dot_all
 
 
+def waveform2energetics_array(h, t, m, h_dot=None):
+    """
+    Compute GW energy and angular momentum from a stacked multipolar 
+    waveform, for all the leading indexes (e.g. radii) at once
+
+    * h     : strain, shape (..., n_modes, n_t), e.g. (n_radii, n_modes, n_t)
+    * t     : time array (uniform)
+    * m     : m indexes of the modes, shape (n_modes,)
+    * h_dot : time-derivative of h, same shape of h. If None, it is 
+              computed with centered 2nd order finite differences
+
+    Returns E, Edot, J, Jdot with shape (..., n_t)
+    """
+    h = np.asarray(h)
+    m = np.asarray(m)
+    dtime = t[1]-t[0]
+
+    if h_dot is None:
+        h_dot = num.diff1(t, h, pad=True, axis=-1)
+
+    # mnfactor() for each mode
+    fac = np.where(m == 0, 1., 2.) / (16.*np.pi)
+
+    E_GW_dot = np.einsum('...kt,k->...t', np.abs(h_dot)**2, fac)
+    J_GW_dot = np.einsum('...kt,k->...t', np.imag(h * np.conj(h_dot)), fac * m)
+
+    E_GW = np.zeros_like(E_GW_dot)
+    J_GW = np.zeros_like(J_GW_dot)
+    E_GW[...,1:] = np.cumsum(0.5*(E_GW_dot[...,:-1] + E_GW_dot[...,1:]), axis=-1) * dtime
+    J_GW[...,1:] = np.cumsum(0.5*(J_GW_dot[...,:-1] + J_GW_dot[...,1:]), axis=-1) * dtime
+
+    return E_GW, E_GW_dot, J_GW, J_GW_dot
+
+
 # ------------------------------------------------------------------
 # Various useful routines
 # ------------------------------------------------------------------
@@ -2,7 +2,10 @@ from ..utils.ioutils import *
 from ..utils.num import diff1, diffo
 from ..utils.viz import wplot
 from ..utils.units import *
-from .gwutils import fixed_freq_int_2, waveform2energetics, ret_time, spinw_spherical_harm
+from .gwutils import fixed_freq_int, fixed_freq_int_2, fixed_freq_int_scan, waveform2energetics, waveform2energetics_array, ret_time, radius_extrap, radius_extrap_polynomial, spinw_spherical_harm, spinw_spherical_harm_matrix
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import warnings as wrn
 import numpy as np
 
 
@@ -64,6 +67,14 @@ def wave_prop_default():
         'var': None
     }
 
+# waveform file name patterns, tried in order
+wfile_types    = ['bam','cactus','core','core','core-energy']
+wfile_patterns = [re.compile(r'R(\w+)mode(\d)(\w+)_r(\d+).l(\d+)'),
+                  re.compile(r'mp_(\w+)_l(\d)_m(.\d|\d)_r(\d+\.\d\d).asc'),
+                  re.compile(r'R(\w+)_l(\d+)_m(\d+)_r(\d+).txt'),
+                  re.compile(r'R(\w+)_l(\d+)_m(\d+)_r(\w+).txt'),
+                  re.compile(r'EJ_r(\w+).txt')]
+
 def wfile_parse_name(fname):
     """
     Parse waveform filename, return var,(l,m)-indexes, detector radius
@@ -73,29 +84,20 @@ def wfile_parse_name(fname):
     -----
     fname  : Name of the file to parse for information
     """
-    t = ['bam','cactus','core','core','core-energy']
-    s = [r'R(\w+)mode(\d)(\w+)_r(\d+).l(\d+)',
-         r'mp_(\w+)_l(\d)_m(.\d|\d)_r(\d+\.\d\d).asc',
-         r'R(\w+)_l(\d+)_m(\d+)_r(\d+).txt',
-         r'R(\w+)_l(\d+)_m(\d+)_r(\w+).txt',
-         r'EJ_r(\d+).txt']
-    vlmr = None
-    for tp, sm in zip(t,s):
-        name = re.match(sm, os.path.basename(fname))
+    bname = os.path.basename(fname)
+    for tp, sm in zip(wfile_types, wfile_patterns):
+        name = sm.match(bname)
         if name is not None:
             if tp == 'core-energy':
                 v    = 'EJ'
                 r    = rinf_str_to_float(name.group(1))
-                vlmr = (v,None,None,r,tp)
-                return vlmr
-            else:
-                v    = name.group(1)
-                l    = int(name.group(2))
-                m    = negmode_bam(name.group(3))
-                r    = rinf_str_to_float(name.group(4))
-                vlmr = (v,l,m,r,tp)
-                return vlmr
-    return vlmr
+                return (v,None,None,r,tp)
+            v    = name.group(1)
+            l    = int(name.group(2))
+            m    = negmode_bam(name.group(3))
+            r    = rinf_str_to_float(name.group(4))
+            return (v,l,m,r,tp)
+    return None
 
 
 # CoRe specials
@@ -108,8 +110,8 @@ def wfile_get_detrad(fname):
     -----
     fname  : Name of the file to parse for information
     """
-    s = extract_comments(fname, '#')
-    return rinf_str_to_float(s[0].split("=")[1])
+    s = read_header(fname, '#')
+    return header_get_detrad(s)
               
 
 def wfile_get_mass(fname):
@@ -120,7 +122,31 @@ def wfile_get_mass(fname):
     -----
     fname  : Name of the file to parse for information
     """
-    s = extract_comments(fname, '#')
+    s = read_header(fname, '#')
+    return header_get_mass(s)
+
+
+def header_get_detrad(s):
+    """
+    Get detector radius from the comment lines of a CoRe file
+    ------
+    Input
+    -----
+    s  : List of comment lines, those starting with '#' are used
+    """
+    s = [c for c in s if c.startswith('#')]
+    return rinf_str_to_float(s[0].split("=")[1])
+
+
+def header_get_mass(s):
+    """
+    Get binary mass from the comment lines of a CoRe file
+    ------
+    Input
+    -----
+    s  : List of comment lines, those starting with '#' are used
+    """
+    s = [c for c in s if c.startswith('#')]
     return float(s[1].split("=")[1])
 
 
@@ -135,7 +161,19 @@ def wfile_get_detrad_bam(fname):
     -----
     fname  : Name of the file to parse for information
     """
-    s = extract_comments(fname, '"')
+    s = read_header(fname, '"')
+    return header_get_detrad_bam(s)
+
+def header_get_detrad_bam(s):
+    """
+    Get radius from the comment lines of a wf BAM file
+    '" Rpsi4:   r =     700.000000 "'
+    ------
+    Input
+    -----
+    s  : List of comment lines, the first one starting with '"' is used
+    """
+    s = [c for c in s if c.startswith('"')]
     try:
         rad_str = re.findall("\d+\.\d+",s[0])[2]
     except:
@@ -157,45 +195,441 @@ def negmode_bam(mode):
 
 # Cactus/THC specials
 
-def cactus_to_core(path, prop):
+def cactus_fname(l, m, r):
+    """
+    Name of the Cactus/WhiskyTHC Psi4 file of mode (l,m) at radius r
+    """
+    return 'mp_Psi4_l%d_m%d_r%.2f.asc' % (l, m, float(r))
+
+
+def cactus_segments(path):
+    """
+    Return the 'output-NNNN' restart segments in path, in order
+    """
+    seg_tmpl = re.compile(r'output-(\d\d\d\d)$')
+    segs = [s for s in os.listdir(path) if seg_tmpl.match(s)]
+    return sorted(segs, key=lambda s: int(seg_tmpl.match(s).group(1)))
+
+
+def cactus_merge(ts, ys):
+    """
+    Merge the time series (ts[k], ys[k]) of consecutive restart
+    segments: the later segment wins, i.e. the samples of a segment
+    at or after the start of any later segment are dropped. 
+    Linear in the total length, the output is preallocated.
+    """
+    starts = np.array([t[0] if len(t) else np.inf for t in ts])
+    # earliest start among the later segments
+    nxt  = np.append(np.minimum.accumulate(starts[::-1])[::-1][1:], np.inf)
+    keep = [np.searchsorted(t, tn, side='left') for t, tn in zip(ts, nxt)]
+    n    = sum(keep)
+    t    = np.empty(n)
+    y    = np.empty(n, dtype=complex)
+    i    = 0
+    for tk, yk, nk in zip(ts, ys, keep):
+        t[i:i+nk] = tk[:nk]
+        y[i:i+nk] = yk[:nk]
+        i += nk
+    if np.any(np.diff(t) <= 0.):
+        # non-monotonic segments, fall back to sorting
+        t, msk = np.unique(t[::-1], return_index=True)
+        y = y[::-1][msk]
+    return t, y
+
+
+def cactus_merge_segments(path, modes, radii, workers=None, index=None):
+    """
+    Read and merge the Psi4 data of all the modes and radii of a 
+    Cactus/WhiskyTHC simulation directory in one walk of the restart
+    segments 'output-NNNN/data/'. The files are read in a thread pool
+    of workers threads (serially if None)
+    ------
+    Input
+    -----
+    path    : Simulation directory
+    modes   : List of (l,m) multipoles
+    radii   : List of extraction radii
+    index   : wfile_index of path (or True to load/build it), the files
+              are then looked up in the index instead of the directory
+    ------
+    Output
+    ------
+    Dictionary (l,m,r) -> (t, Psi4), Psi4 complex (not rescaled by r)
+    """
+    keys = [(l, m, r) for r in radii for l, m in modes]
+    jobs = []
+    if index is None:
+        for k, seg in enumerate(cactus_segments(path)):
+            for key in keys:
+                fname = os.path.join(path, seg, 'data', cactus_fname(*key))
+                if os.path.isfile(fname):
+                    jobs.append((key, k, fname))
+    else:
+        if index is True:
+            index = wfile_index(path, workers=workers)
+        for key in keys:
+            for e in index.find(code='cactus', var='Psi4', l=key[0], m=key[1], 
+                                r=key[2], segment=True):
+                if os.path.dirname(e['path']) == os.path.join('output-%04d' % e['segment'], 'data'):
+                    jobs.append((key, e['segment'], os.path.join(index.path, e['path'])))
+        jobs = sorted(jobs, key=lambda j: j[1])
+
+    def read(job):
+        raw, _ = loadtxt_fast(job[2], usecols=[0,1,2])
+        return raw
+    if workers is not None and workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            raws = list(ex.map(read, jobs))
+    else:
+        raws = [read(job) for job in jobs]
+
+    out = {}
+    for key in keys:
+        ts = [raw[:,0] for (kj, k, f), raw in zip(jobs, raws) if kj == key]
+        ys = [raw[:,1] + 1j*raw[:,2] for (kj, k, f), raw in zip(jobs, raws) if kj == key]
+        if ts:
+            out[key] = cactus_merge(ts, ys)
+    return out
+
+
+def cactus_to_core(path, prop, workers=None, pad=False, index=None):
     """
     Read data from Cactus/WhiskyTHC simulation directory,
     collate into a single file, load Psi4, evaluate h
     and rewrite it into a CoRe-formatted file.
+    workers are used to read the segments and in gwutils.fixed_freq_int(),
+    pad is passed to gwutils.fixed_freq_int(), index is passed to
+    cactus_merge_segments()
+    (see cactus_merge_segments() to merge many modes and radii at once)
     """
     v   = prop['var']
     l   = prop['lmode']
     m   = prop['mmode']
     r   = prop['detector.radius']
 
-    seg_tmpl = r'output-\d\d\d\d'
-    det      = float(r)
-
-    t   = np.array([])
-    var = np.array([])
-    for seg in os.listdir(path):
-        if re.match(seg_tmpl, seg):
-            key = write_key(l,m,det)
-            fpath = '/data/mp_Psi4_'+key+'.asc'
-            #fpath = '/data/mp_Psi4_l%d_m%d_r%.2f.asc' % (l, m, det)
-            raw   = np.loadtxt(os.path.join(path,seg+fpath))
-            t     = np.append(t, raw[:,0])
-            var   = np.append(var, raw[:,1]+raw[:,2]*1.0j)
-
-    t, msk = np.unique(t, axis=0, return_index=True)
-    var    = r * var[msk]
+    data = cactus_merge_segments(path, [(l,m)], [r], workers=workers, index=index)
+    if (l,m,r) not in data:
+        raise ValueError("no {} in the segments of {}".format(cactus_fname(l,m,r), path))
+    t, var = data[(l,m,r)]
+    var    = r * var
     if v=='h':
         fcut = prop['init.frequency']
-        var  = fixed_freq_int_2(var, fcut, dt=t[1]-t[0])
+        var  = fixed_freq_int(var, fcut, dt=t[1]-t[0], workers=workers, pad=pad)
 
     return t, var.real, var.imag
 
 
+# Simulation directory index
+
+class wfile_index(object):
+    """
+    Index of the waveform files in a simulation directory tree
+    (BAM, Cactus/WhiskyTHC restart segments 'output-NNNN', CoRe)
+
+    The tree is walked once; file names are matched with the
+    precompiled wfile_patterns and the detector radius of BAM and CoRe
+    files is read from the header. The index is stored as JSON and
+    reused as long as the modification times of the indexed directories
+    are unchanged (files added, removed or renamed trigger a rescan,
+    in-place rewrites of a file do not, see valid()).
+    -----------
+    Input
+    -----------
+    path      : Simulation directory
+    fname     : Index file, defaults to path/.watpy_index.json
+    persist   : Whether to load/save the index file
+    rescan    : Ignore the stored index
+    workers   : Number of threads used to read the headers
+    followlinks : Follow symbolic links to directories
+    -----------
+    Contains
+    -----------
+    * entries : list of dictionaries with keys wfile_index.fields,
+                'path' is relative to path, 'segment' is the restart
+                segment number (None outside 'output-NNNN'), 'code' is
+                the data type of wfile_parse_name(), 'r' the detector
+                radius (rInf for infinity)
+    * dirs    : dictionary relative directory -> mtime (ns)
+    """
+    fields  = ['code','var','l','m','r','segment','path','size','mtime']
+    version = 1
+
+    def __init__(self, path='.', fname=None, persist=True, rescan=False,
+                 workers=None, followlinks=False):
+        self.path    = path
+        self.fname   = os.path.join(path, '.watpy_index.json') if fname is None else fname
+        self.persist = persist
+        self.workers = workers
+        self.followlinks = followlinks
+        self.entries = []
+        self.dirs    = {}
+
+        if rescan or not self.persist or not self.load():
+            self.scan()
+            if self.persist:
+                self.save()
+
+    def type(self):
+        return type(self)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def scan(self):
+        """
+        Walk the directory tree and rebuild the index
+        """
+        seg_tmpl = re.compile(r'output-(\d\d\d\d)$')
+        root     = os.path.abspath(self.path)
+        self.dirs, entries = {}, []
+        for dpath, dirs, files in os.walk(root, followlinks=self.followlinks):
+            rdir = os.path.relpath(dpath, root)
+            rdir = '' if rdir == os.curdir else rdir
+            self.dirs[rdir] = os.stat(dpath).st_mtime_ns
+            top  = rdir.split(os.sep)[0]
+            seg  = seg_tmpl.match(top)
+            seg  = int(seg.group(1)) if seg else None
+            for f in files:
+                vlmr = wfile_parse_name(f)
+                if vlmr is None:
+                    continue
+                st = os.stat(os.path.join(dpath, f))
+                var, l, m, r, tp = vlmr
+                if var == 'psi4': var = 'Psi4'
+                entries.append({'code': tp, 'var': var, 'l': l, 'm': m, 'r': r,
+                                'segment': seg, 'path': os.path.join(rdir, f),
+                                'size': st.st_size, 'mtime': st.st_mtime_ns})
+
+        # detector radius from the headers
+        hent = [e for e in entries if e['code'] in ['bam','core']]
+        headers = read_headers([os.path.join(root, e['path']) for e in hent],
+                               workers=self.workers)
+        for e, header in zip(hent, headers):
+            try:
+                if e['code'] == 'bam':
+                    e['r'] = header_get_detrad_bam(header)
+                else:
+                    e['r'] = header_get_detrad(header)
+            except (IndexError, ValueError):
+                pass
+
+        self.entries = sorted(entries, key=lambda e: e['path'])
+        return
+
+    def valid(self, check_files=False):
+        """
+        Check the stored directory mtimes (and the size and mtime of
+        every file if check_files) against the file system
+        """
+        root = os.path.abspath(self.path)
+        try:
+            for rdir, mtime in self.dirs.items():
+                if os.stat(os.path.join(root, rdir)).st_mtime_ns != mtime:
+                    return False
+            if check_files:
+                for e in self.entries:
+                    st = os.stat(os.path.join(root, e['path']))
+                    if st.st_size != e['size'] or st.st_mtime_ns != e['mtime']:
+                        return False
+        except OSError:
+            return False
+        return True
+
+    def load(self):
+        """
+        Load the index file, return False if missing or out of date
+        """
+        try:
+            with open(self.fname) as f:
+                d = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if d.get('version') != self.version:
+            return False
+        self.dirs    = d['dirs']
+        self.entries = [dict(zip(self.fields, e)) for e in d['entries']]
+        if not self.valid():
+            self.dirs, self.entries = {}, []
+            return False
+        return True
+
+    def save(self):
+        """
+        Write the index file. If the file lies in an indexed directory
+        its mtime is refreshed after the file is created, and the file
+        rewritten in place (which leaves the directory mtime unchanged)
+        """
+        root = os.path.abspath(self.path)
+        rdir = os.path.relpath(os.path.dirname(os.path.abspath(self.fname)), root)
+        rdir = '' if rdir == os.curdir else rdir
+        try:
+            for it in range(2):
+                with open(self.fname, 'w') as f:
+                    json.dump({'version': self.version, 'dirs': self.dirs,
+                               'entries': [[e[k] for k in self.fields] for e in self.entries]}, f)
+                if rdir not in self.dirs:
+                    break
+                mtime = os.stat(os.path.join(root, rdir)).st_mtime_ns
+                if mtime == self.dirs[rdir]:
+                    break
+                self.dirs[rdir] = mtime
+        except OSError as err:
+            wrn.warn("cannot write the index {}: {}".format(self.fname, err))
+
+    def find(self, code=None, var=None, l=None, m=None, r=None,
+             segment=None, subdir=None):
+        """
+        Return the entries matching all the given values
+        * segment : segment number, True for any segment, False for
+                    files outside the segments
+        * subdir  : directory relative to path ('' for the top level)
+        """
+        out = []
+        for e in self.entries:
+            if code is not None and e['code'] != code: continue
+            if var  is not None and e['var']  != var:  continue
+            if l    is not None and e['l']    != l:    continue
+            if m    is not None and e['m']    != m:    continue
+            if r    is not None and e['r']    != float(r): continue
+            if segment is True:
+                if e['segment'] is None: continue
+            elif segment is False:
+                if e['segment'] is not None: continue
+            elif segment is not None and e['segment'] != segment: continue
+            if subdir is not None and os.path.dirname(e['path']) != subdir: continue
+            out.append(e)
+        return out
+
+    def files(self, **kwargs):
+        """
+        Return the paths (relative to path) of the entries matching
+        kwargs, see find()
+        """
+        return [e['path'] for e in self.find(**kwargs)]
+
+    def segments(self):
+        """
+        Return the restart segment numbers, in order
+        """
+        return sorted(set([e['segment'] for e in self.entries if e['segment'] is not None]))
+
+
+def wave_load(args):
+    """
+    Build a wave from a tuple of its init arguments
+    (path, code, filename, mass, f0, cache_dir, cache_dir_size),
+    used to load files in a thread/process pool
+    """
+    path, code, filename, mass, f0, cache_dir, cache_dir_size = args
+    return wave(path = path, code = code, filename = filename,
+                mass = mass, f0 = f0, cache_dir = cache_dir,
+                cache_dir_size = cache_dir_size)
+
+
+def interp_rows(x, xp, fp):
+    """
+    Linear interpolation of fp(xp) on x along the last axis of fp, 
+    for all the leading indexes at once (constant extrapolation, as
+    np.interp). fp can be complex
+    """
+    i = np.clip(np.searchsorted(xp, x, side='right'), 1, len(xp)-1)
+    w = np.clip((x - xp[i-1])/(xp[i] - xp[i-1]), 0., 1.)
+    return fp[...,i-1]*(1.-w) + fp[...,i]*w
+
+
 # ------------------------------------------------------------------
 # Main classes for waveforms
 # ------------------------------------------------------------------
 
 
+class wave_cache(object):
+    """
+    Bounded LRU cache of wave objects
+    -----------
+    Input
+    -----------
+    maxbytes  : Memory budget (bytes), least recently used entries
+                are evicted when the budget is exceeded
+    -----------
+    Contains
+    -----------
+    * hits, misses, evictions : counters
+    * nbytes : memory used by the cached waves
+
+    The size of an entry (wave.nbytes(), which includes the cached
+    derived quantities) is measured again when the entry is returned
+    by get() and for all the entries in put(), so waves that grew after
+    being stored are accounted for.
+    """
+    def __init__(self, maxbytes):
+        self.maxbytes  = maxbytes
+        self.nbytes    = 0
+        self.hits      = 0
+        self.misses    = 0
+        self.evictions = 0
+        self.entries   = OrderedDict()
+
+    def get(self, key):
+        """
+        Return the wave stored under key (None if not found)
+        """
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            w, nb = self.entries[key]
+            self.entries[key] = (w, w.nbytes())
+            self.nbytes += self.entries[key][1] - nb
+            self.evict()
+            return w
+        self.misses += 1
+        return None
+
+    def put(self, key, w):
+        """
+        Store a wave, waves larger than the budget are not stored
+        """
+        nb = w.nbytes()
+        if nb > self.maxbytes:
+            return
+        if key in self.entries:
+            self.entries.pop(key)
+        self.entries[key] = (w, nb)
+        self.measure()
+        self.evict()
+
+    def measure(self):
+        """
+        Measure again the size of all the entries
+        """
+        for key, (w, nb) in self.entries.items():
+            self.entries[key] = (w, w.nbytes())
+        self.nbytes = sum([nb for w, nb in self.entries.values()])
+
+    def evict(self):
+        """
+        Drop the least recently used entries until the budget is met
+        """
+        while self.nbytes > self.maxbytes:
+            _, (_, nbold) = self.entries.popitem(last=False)
+            self.nbytes -= nbold
+            self.evictions += 1
+
+    def clear(self):
+        """
+        Empty the cache (counters are kept)
+        """
+        self.entries.clear()
+        self.nbytes = 0
+
+    def info(self):
+        """
+        Return cache statistics as a dict
+        """
+        return {'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'entries': len(self.entries),
+                'nbytes': self.nbytes, 'maxbytes': self.maxbytes}
+
+
 class mwaves(object):
     """ 
     Class for multipolar or multiple waveform data
@@ -208,6 +642,19 @@ class mwaves(object):
     mass      : Binary mass (solar masses)
     f0        : Initial gravitational wave frequency of the system (mass rescaled, geom.units)
     ignore_negative_m : Whether or not to load the negative m modes
+    workers   : Number of threads used to scan the file headers and
+                number of threads/processes used by load()
+    pool      : Pool used by load(), 'thread' or 'process'
+    preload   : If True, load all the data on initialization, see load()
+    cache_size: Memory budget (bytes) for caching the wave objects
+                returned by get(), None disables the cache (but
+                load() and preload enable an unbounded one)
+    cache_dir : Directory of the binary cache of the parsed text files,
+                None disables it (see wave)
+    cache_dir_size : Size cap (bytes) of the binary cache
+    index     : wfile_index of path (or True to load/build it). The
+                files found in the index are not parsed again, and
+                filenames defaults to the top-level files of type code
 
     -----------
     Contains
@@ -218,11 +665,15 @@ class mwaves(object):
     * mmode : list of available m multipoles
     * radii : list of available extraction radii
     * data  : python dictionary of files loaded into the class
+    * cache : wave_cache of the objects returned by get() (or None)
 
     FIXME: this assumes every radius has the same modes
     """
     def __init__(self, path='.', code='core', filenames=None, 
-                 mass=None, f0=None, ignore_negative_m=False):
+                 mass=None, f0=None, ignore_negative_m=False,
+                 workers=None, pool='thread', preload=False,
+                 cache_size=None, cache_dir=None, cache_dir_size=None,
+                 index=None):
         """
         Init info from files
         """        
@@ -232,6 +683,11 @@ class mwaves(object):
         self.mass  = mass
         self.f0    = f0
         self.code  = code
+        self.cache = wave_cache(cache_size) if cache_size else None
+        self.cache_dir = cache_dir
+        self.cache_dir_size = cache_dir_size
+        self.workers = workers
+        self.pool  = pool
 
         self.var  = set([])
         self.modes = set([])
@@ -243,37 +699,64 @@ class mwaves(object):
 
         if self.code not in ['bam','cactus','core']:
             raise ValueError("unknown code {}".format(self.code))
-        
+
+        lookup = {}
+        if index is True:
+            index = wfile_index(path, workers=workers)
+        if index is not None:
+            root   = os.path.abspath(index.path)
+            lookup = dict([(os.path.join(root, e['path']), e) for e in index.entries])
+            if filenames is None:
+                filenames = index.files(code=self.code, subdir='')
+        elif filenames is None:
+            raise ValueError("filenames or index must be given")
+
+        entries = []
         for fname in filenames:
-            vlmr = wfile_parse_name(fname)
+            e = lookup.get(os.path.abspath(os.path.join(self.path,fname)))
+            if e is not None:
+                vlmr = (e['var'], e['l'], e['m'], e['r'], e['code'])
+            else:
+                vlmr = wfile_parse_name(fname)
             if vlmr:
                 var, l, m, r, tp = vlmr
+                if var == 'EJ':
+                    continue
                 if ignore_negative_m and m < 0:
                     continue
+                entries.append((fname, vlmr, e is not None))
 
-                # take care of special conventions, 
-                # overwrite better values if possible
-                if tp == 'bam':
-                    r = wfile_get_detrad_bam(os.path.join(self.path,fname))
-                    if var == 'psi4': var = 'Psi4'
-                if tp == 'core':
-                    r = wfile_get_detrad(os.path.join(self.path,fname))
-                    if var == 'psi4': var = 'Psi4'
-                    
-                self.var.add(var)
-                self.lmode.add(l)
-                self.mmode.add(m)
-                self.modes.add((l,m))
-                self.radii.add(r)
-                #self.dtype.add(tp)
-
-                #key = "%s_l%d_m%d_r%.2f" % (var, l, m, r)
-                subkey = write_key(l,m,r)
-                key = var+"_"+subkey               
-                if key in self.data:
-                    self.data[key].append(fname)
-                else:
-                    self.data[key] = [fname]
+        # take care of special conventions, 
+        # overwrite better values if possible
+        # (headers are read only up to the first data line,
+        # indexed files are already resolved)
+        hfiles = [os.path.join(self.path,f) for f, vlmr, indexed in entries
+                  if vlmr[4] in ['bam','core'] and not indexed]
+        headers = iter(read_headers(hfiles, workers=workers))
+
+        for fname, vlmr, indexed in entries:
+            var, l, m, r, tp = vlmr
+            if tp == 'bam' and not indexed:
+                r = header_get_detrad_bam(next(headers))
+                if var == 'psi4': var = 'Psi4'
+            if tp == 'core' and not indexed:
+                r = header_get_detrad(next(headers))
+                if var == 'psi4': var = 'Psi4'
+
+            self.var.add(var)
+            self.lmode.add(l)
+            self.mmode.add(m)
+            self.modes.add((l,m))
+            self.radii.add(r)
+            #self.dtype.add(tp)
+
+            #key = "%s_l%d_m%d_r%.2f" % (var, l, m, r)
+            subkey = write_key(l,m,r)
+            key = var+"_"+subkey               
+            if key in self.data:
+                self.data[key].append(fname)
+            else:
+                self.data[key] = [fname]
 
         self.var   = sorted(list(self.var))
         self.modes = sorted(list(self.modes))
@@ -282,6 +765,9 @@ class mwaves(object):
         self.radii = sorted(list(self.radii))
         self.dtype = sorted(list(self.dtype))
 
+        if preload:
+            self.load()
+
     def type(self):
         return type(self)
 
@@ -293,6 +779,9 @@ class mwaves(object):
         * l   : if not specified it defaults to 2 
         * m   : if not specified it defaults to 2 
         * r   : if not specified it defaults to the maximum radius
+
+        If the cache is enabled the same object is returned for
+        repeated calls, copy it before modifying its data.
         """
         #FIXME: this assumes all radii have the same modes!
 
@@ -312,79 +801,534 @@ class mwaves(object):
         if m not in self.mmode:
             raise ValueError("Unknown m-index {}".format(m))
 
+        if self.cache is not None:
+            ckey = (var, l, m, r, self.mass, self.f0)
+            w = self.cache.get(ckey)
+            if w is not None:
+                return w
+
         #key = "%s_l%d_m%d_r%.2f" % (var, l, m, r)
         subkey = write_key(l,m,r)
         key = var+"_"+subkey
-        return wave(path = self.path, code = self.code, filename = self.data[key][0],
-                    mass = self.mass, f0 = self.f0)
+        w = wave(path = self.path, code = self.code, filename = self.data[key][0],
+                 mass = self.mass, f0 = self.f0, cache_dir = self.cache_dir,
+                 cache_dir_size = self.cache_dir_size)
+        if self.cache is not None:
+            self.cache.put(ckey, w)
+        return w
+
+    def load(self, var=None, workers=None, pool=None):
+        """
+        Load and convert all the (var,l,m,r) entries at once, using a
+        pool of threads or processes. The waves are stored in the cache
+        and returned by get(). The result does not depend on the number
+        of workers.
+
+        The cache is what keeps the loaded data: if it is disabled, an
+        unbounded one is created (memory grows with all the entries);
+        if it is bounded and the entries do not fit, a warning is 
+        issued and the least recently loaded waves are evicted.
+        * var     : list of variables to load (defaults to all)
+        * workers : number of workers (defaults to the one given on init,
+                    serial loading if None or 1)
+        * pool    : 'thread' or 'process' (defaults to the one given on init)
+        """
+        if var is None:    var = self.var
+        if workers is None: workers = self.workers
+        if pool is None:   pool = self.pool
+        if pool not in ['thread','process']:
+            raise ValueError("unknown pool {}".format(pool))
+        if self.cache is None:
+            self.cache = wave_cache(np.inf)
+
+        ckeys, args = [], []
+        for v in var:
+            for l, m in self.modes:
+                for r in self.radii:
+                    key = v+"_"+write_key(l,m,r)
+                    if key not in self.data:
+                        continue
+                    ckeys.append((v, l, m, r, self.mass, self.f0))
+                    args.append((self.path, self.code, self.data[key][0],
+                                 self.mass, self.f0, self.cache_dir,
+                                 self.cache_dir_size))
+
+        if workers is None or workers <= 1:
+            waves = [wave_load(a) for a in args]
+        else:
+            Executor = ThreadPoolExecutor if pool == 'thread' else ProcessPoolExecutor
+            with Executor(max_workers=workers) as ex:
+                waves = list(ex.map(wave_load, args))
+
+        nbytes = sum([w.nbytes() for w in waves])
+        if nbytes > self.cache.maxbytes:
+            wrn.warn("loaded {} bytes but cache_size is {}, part of the "
+                     "waves will be evicted".format(nbytes, self.cache.maxbytes))
+        for ckey, w in zip(ckeys, waves):
+            self.cache.put(ckey, w)
+
+    def cache_info(self):
+        """
+        Return statistics of the cache of wave objects (None if disabled)
+        """
+        if self.cache is None:
+            return None
+        return self.cache.info()
+
+    def cache_clear(self):
+        """
+        Empty the cache of wave objects
+        """
+        if self.cache is not None:
+            self.cache.clear()
+
+    def to_array(self, var='h', radii=None, modes=None):
+        """
+        Stack modes and radii into a wave_array on a common time grid
+        * var   : 'h' or 'Psi4'. The strain is taken from the Psi4 files 
+                  (via FFI) if no strain files are available
+        * radii : list of radii (defaults to all)
+        * modes : list of (l,m) multipoles (defaults to all)
+
+        If the time grids differ, the data are linearly interpolated on
+        the grid of the first entry restricted to the common interval
+        """
+        if var not in ['h','Psi4']:
+            raise ValueError("var can be only 'Psi4' or 'h'")
+        if radii is None: radii = self.radii
+        if modes is None: modes = self.modes
+        fvar = var if var in self.var else self.var[0]
+
+        times, ys = [], []
+        for r in radii:
+            for l, m in modes:
+                w = self.get(var=fvar, l=l, m=m, r=r)
+                times.append(w.time)
+                ys.append(w.h if var == 'h' else w.p4)
+
+        t = times[0]
+        if not all([np.array_equal(t, ti) for ti in times]):
+            t0 = max([ti[0] for ti in times])
+            t1 = min([ti[-1] for ti in times])
+            t  = t[(t >= t0) & (t <= t1)]
+            ys = [yi if np.array_equal(t, ti) else 
+                  np.interp(t, ti, yi.real) + 1j*np.interp(t, ti, yi.imag)
+                  for ti, yi in zip(times, ys)]
+
+        data = np.array(ys).reshape(len(radii), len(modes), len(t))
+        return wave_array(t, data, modes, radii, var=var,
+                          mass=self.mass, f0=self.f0)
 
     def energetics(self, m1, m2, madm, jadm, 
-                   radii = None, path_out = None):
+                   radii = None, path_out = None, h5 = None, var = None):
         """
-        Compute energetics from multipolar waveform
+        Compute energetics from multipolar waveform, for all radii at 
+        once (see wave_array.energetics())
+        * var : variable the strain is obtained from, 'Psi4' (FFI) or
+                'h' (strain files). Defaults to the first variable, 
+                as get()
+
+        Returns E, Edot, J, Jdot with shape (n_radii, n_t). The
+        attributes e, edot, j, jdot, eb, jorb are set to the values at 
+        the last radius.
         """
         #FIXME: this assumes all radii have the same modes!
-        
-        h     = {}
-        h_dot = {}
-        u     = {}
         if radii is None: radii = self.radii
+        if var is None:   var = self.var[0]
 
-        for rad in radii:
-            
-            for lm in self.modes: 
-                w         = self.get(l=lm[0], m=lm[1], r=rad)
-                t         = w.time
-                u[lm]     = w.time_ret()
-                h[lm]     = w.h
-                h_dot[lm] = diff1(t, h[lm])
-                        
-            self.e, self.edot, self.j, self.jdot = waveform2energetics(h, h_dot, t, 
-                                                                       self.modes,
-                                                                       self.mmode)
-            self.eb   = (madm - self.e - m1 -m2) / (m1*m2/(m1+m2))
-            self.jorb = (jadm - self.j) / (m1*m2) 
-
-            if path_out:
-                headstr  = write_headstr(rad,self.mass)
-                headstr += "J_orb:0 E_b:1 u/M:2 E_rad:3 J_rad:4 t:5"
-                data = np.c_[self.jorb, self.eb, u[(2,2)]/self.mass,
-                             self.e, self.j, t]
-                rad_str = rinf_float_to_str(rad)
-                fname = "EJ_r"+rad_str+".txt"
-                np.savetxt('{}/{}'.format(path_out,fname), data, header=headstr)
+        wa = self.to_array(var=var, radii=radii)
+        e, edot, j, jdot = wa.energetics(m1, m2, madm, jadm,
+                                         path_out = path_out, h5 = h5)
+
+        self.e, self.edot, self.j, self.jdot = e[-1], edot[-1], j[-1], jdot[-1]
+        self.eb   = wa.eb[-1]
+        self.jorb = wa.jorb[-1]
+        return e, edot, j, jdot
 
-    def hlm_to_strain(self,phi=0,inclination=0,add_negative_modes=False):
+    def extrap_rinf(self, var=['h','Psi4'], method='poly', K=2, comp='ampphase',
+                    madm=None, radii=None, modes=None, path_out=None, h5=None):
+        """
+        Extrapolate all the modes to infinite extraction radius and 
+        optionally write the 'Rh_..._rInf.txt', 'Rpsi4_..._rInf.txt' 
+        datasets (see wave_array.extrap_rinf())
+        ------
+        Input
+        -----
+        var      : Variables to extrapolate, list of 'h', 'Psi4'
+        method   : 'poly' or 'pert'. With 'pert' the strain is obtained 
+                   by FFI of the extrapolated Psi4
+        K, comp  : Polynomial order and components for 'poly'
+        madm     : ADM mass for 'pert'
+        radii    : Radii to use (defaults to all)
+        modes    : List of (l,m) multipoles (defaults to all)
+        path_out : If given, write the txt files there
+        h5       : If given, a CoRe_h5 object; write the datasets into it
+        ------
+        Output
+        ------
+        python dictionary var -> wave_array at rInf
+        """
+        if isinstance(var, str): var = [var]
+        if method == 'pert' and 'h' in var and self.f0 is None:
+            raise ValueError("f0 is needed to compute the strain with method 'pert'")
+        retarded = self.code != 'core'
+        out = {}
+        if method == 'pert':
+            p4 = self.to_array(var='Psi4', radii=radii, modes=modes)
+            p4 = p4.extrap_rinf(method='pert', retarded=retarded, madm=madm)
+            if 'Psi4' in var: out['Psi4'] = p4
+            if 'h' in var:    out['h']    = p4.get_strain()
+        else:
+            for v in var:
+                wa = self.to_array(var=v, radii=radii, modes=modes)
+                out[v] = wa.extrap_rinf(method=method, K=K, comp=comp, 
+                                        retarded=retarded)
+        if path_out or h5 is not None:
+            for v in out:
+                out[v].write_core(path_out=path_out, h5=h5)
+        return out
+
+    def hlm_to_strain(self,phi=0,inclination=0,add_negative_modes=False,
+                      var=None):
         """
         Build strain from time-domain modes in mass rescaled, geom. units
         Return result in SI units
 
+        phi and inclination can be arrays of orientations, in which 
+        case hplus and hcross have shape (n_orient, n_t),
+        see wave_array.hlm_to_strain()
+
         Negative m-modes can be added using positive m-modes, 
         h_{l-m} = (-)^l h^{*}_{lm}
+
+        The strain is obtained from var, 'Psi4' (FFI) or 'h' (strain
+        files), defaults to the first variable as get()
+        """
+        if var is None: var = self.var[0]
+        wa = self.to_array(var=var, radii=[self.radii[-1]])
+        time, hplus, hcross = wa.hlm_to_strain(phi=phi, inclination=inclination,
+                                               add_negative_modes=add_negative_modes)
+        if np.ndim(phi) == 0 and np.ndim(inclination) == 0:
+            hplus, hcross = hplus[0], hcross[0]
+        return time, hplus, hcross
+
+
+
+class wave_array(object):
+    """
+    Class for multipolar waveform data stacked in a single array:
+    all the (l,m) modes and extraction radii of one variable on a 
+    common time grid
+    -----------
+    Input
+    -----------
+    time  : Common time grid, shape (n_t,)
+    data  : Complex data, shape (n_radii, n_modes, n_t)
+    modes : List of (l,m) multipoles along axis 1
+    radii : List of extraction radii along axis 0
+    var   : Which variable is stored, ['Psi4', 'h']
+    mass  : Binary mass (solar masses)
+    f0    : Initial gravitational wave frequency of the system (mass rescaled, geom.units)
+    -----------
+    Contains
+    -----------
+    * lm_idx : python dictionary (l,m) -> index along axis 1
+    * r_idx  : python dictionary r -> index along axis 0
+    * l, m   : arrays of the l and m indexes along axis 1
+    """
+    def __init__(self, time, data, modes, radii, var='h', mass=None, f0=None):
+        """
+        Init from arrays
+        """
+        self.time  = np.asarray(time, dtype=float)
+        self.data  = np.ascontiguousarray(data, dtype=complex)
+        self.modes = [tuple(lm) for lm in modes]
+        self.radii = list(radii)
+        self.var   = var
+        self.mass  = mass if mass else 1.0
+        self.f0    = f0
+
+        if self.data.shape != (len(self.radii), len(self.modes), len(self.time)):
+            raise ValueError("data shape {} does not match (radii, modes, time)".format(self.data.shape))
+
+        self.lm_idx = {lm: i for i, lm in enumerate(self.modes)}
+        self.r_idx  = {r: i for i, r in enumerate(self.radii)}
+        self.l = np.array([lm[0] for lm in self.modes])
+        self.m = np.array([lm[1] for lm in self.modes])
+
+    def type(self):
+        return type(self)
+
+    def get(self, l=2, m=2, r=None):
+        """
+        Return a view on the (l,m) mode at radius r (defaults to the
+        largest radius)
+        """
+        if r is None:
+            r = self.radii[-1]
+        return self.data[self.r_idx[r], self.lm_idx[(l,m)]]
+
+    def amplitude(self):
+        """
+        Return amplitude, shape (n_radii, n_modes, n_t)
+        """
+        return np.abs(self.data)
+
+    def phase(self):
+        """
+        Return unwrapped phase, shape (n_radii, n_modes, n_t)
+        """
+        return -np.unwrap(np.angle(self.data), axis=-1)
+
+    def phase_diff1(self):
+        """
+        Return frequency wrt to time using finite diff 2nd order
+        centered, as wave.phase_diff1() (padded to the lenght of time)
+        """
+        return diff1(self.time, self.phase(), pad=True, axis=-1)
+
+    def time_ret(self):
+        """
+        Retarded time for each radius, shape (n_radii, n_t)
+        """
+        return np.array([ret_time(self.time, np.abs(r), self.mass) for r in self.radii])
+
+    def energetics(self, m1, m2, madm, jadm, h_dot = None,
+                   path_out = None, h5 = None):
+        """
+        Compute energetics for all radii at once
+        ------
+        Input
+        -----
+        m1, m2     : Masses of the two bodies
+        madm, jadm : ADM mass and angular momentum
+        h_dot      : Time derivative of the strain, same shape of data
+                     (computed with finite differences if None)
+        path_out   : If given, write 'EJ_r*.txt' files there
+        h5         : If given, a CoRe_h5 object; write the 'EJ_r*.txt'
+                     datasets into its 'energy' group
+        ------
+        Output
+        ------
+        E, Edot, J, Jdot with shape (n_radii, n_t). The binding energy
+        and orbital angular momentum are stored in eb, jorb
+        """
+        hw = self.get_strain()
+        e, edot, j, jdot = waveform2energetics_array(hw.data, self.time, self.m,
+                                                     h_dot = h_dot)
+        self.e, self.edot, self.j, self.jdot = e, edot, j, jdot
+        self.eb   = (madm - e - m1 -m2) / (m1*m2/(m1+m2))
+        self.jorb = (jadm - j) / (m1*m2)
+
+        if path_out or h5 is not None:
+            u = self.time_ret()
+            dsets = {}
+            for k, rad in enumerate(self.radii):
+                data = np.c_[self.jorb[k], self.eb[k], u[k]/self.mass,
+                             e[k], j[k], self.time]
+                rad_str = rinf_float_to_str(rad)
+                fname = "EJ_r"+rad_str+".txt"
+                dsets[fname] = data
+                if path_out:
+                    headstr  = write_headstr(rad,self.mass)
+                    headstr += "J_orb:0 E_b:1 u/M:2 E_rad:3 J_rad:4 t:5"
+                    np.savetxt(os.path.join(path_out,fname), data, header=headstr)
+            if h5 is not None:
+                h5.write_arrays({'energy': dsets})
+
+        return e, edot, j, jdot
+
+    def extrap_rinf(self, method='poly', K=2, comp='ampphase', retarded=True,
+                    madm=None, radii=None):
+        """
+        Extrapolate all the modes to infinite extraction radius
+        ------
+        Input
+        -----
+        method   : 'poly', least-squares polynomial in 1/r over the radii
+                   (gwutils.radius_extrap_polynomial), or 'pert', 
+                   perturbative extrapolation of Psi4 from the largest 
+                   radius (gwutils.radius_extrap)
+        K        : Order of the polynomial in 1/r
+        comp     : 'ampphase' to extrapolate amplitude and unwrapped phase,
+                   'reim' for real and imaginary parts ('poly' only)
+        retarded : If True, the time of each radius is shifted to the
+                   retarded time before resampling (False if time already
+                   is the retarded time, as in CoRe data)
+        madm     : ADM mass for 'pert' (defaults to mass)
+        radii    : Radii to use (defaults to all the finite ones)
+        ------
+        Output
+        ------
+        wave_array with the single radius rInf, on the retarded time of
+        the largest radius restricted to the interval common to all radii
+        """
+        if radii is None:
+            radii = [r for r in self.radii if r != rInf]
+        ridx = [self.r_idx[r] for r in radii]
+        rmax = max(radii, key=abs)
+
+        if retarded:
+            u = self.time_ret()[ridx]
+        else:
+            u = np.tile(self.time, (len(radii),1))
+        kmax = radii.index(rmax)
+
+        if method == 'pert':
+            if self.var != 'Psi4':
+                raise ValueError("perturbative extrapolation requires Psi4")
+            m0   = madm if madm else self.mass
+            data = radius_extrap(self.time, self.data[self.r_idx[rmax]], abs(rmax), 
+                                 l=self.l[:,None], m0=m0)
+            return wave_array(u[kmax], data[None], self.modes, [rInf], var=self.var,
+                              mass=self.mass, f0=self.f0)
+
+        if method != 'poly':
+            raise ValueError("unknown method {}".format(method))
+        if len(radii) < 2:
+            raise ValueError("polynomial extrapolation requires at least two radii")
+
+        # common retarded time grid, all modes of a radius in one go
+        u0 = max([ui[0] for ui in u])
+        u1 = min([ui[-1] for ui in u])
+        ue = u[kmax][(u[kmax] >= u0) & (u[kmax] <= u1)]
+
+        if comp == 'reim':
+            ys = [interp_rows(ue, u[k], self.data[i]) for k, i in enumerate(ridx)]
+            data = radius_extrap_polynomial(ys, radii, K)
+        elif comp == 'ampphase':
+            amp = [interp_rows(ue, u[k], np.abs(self.data[i])) for k, i in enumerate(ridx)]
+            phi = [interp_rows(ue, u[k], np.unwrap(np.angle(self.data[i]), axis=-1)) 
+                   for k, i in enumerate(ridx)]
+            # remove the 2 pi ambiguities wrt the largest radius
+            for k in range(len(radii)):
+                n = np.round((phi[k][:,0] - phi[kmax][:,0])/(2*np.pi))
+                phi[k] = phi[k] - 2*np.pi*n[:,None]
+            amp  = radius_extrap_polynomial(amp, radii, K)
+            phi  = radius_extrap_polynomial(phi, radii, K)
+            data = amp*np.exp(1j*phi)
+        else:
+            raise ValueError("unknown comp {}".format(comp))
+
+        return wave_array(ue, data[None], self.modes, [rInf], var=self.var,
+                          mass=self.mass, f0=self.f0)
+
+    def core_dsets(self):
+        """
+        Return the CoRe datasets of all radii and modes as a dictionary 
+        dsets[group][fname] = array, e.g. dsets['rh_22']['Rh_l2_m2_rInf.txt'],
+        with columns u/M, Re/M, Im/M, Momega, A/M, phi, t
+        """
+        M     = self.mass
+        u     = self.time_ret()
+        amp   = self.amplitude()
+        phi   = self.phase()
+        omega = self.phase_diff1()
+        if self.var == 'Psi4':
+            gname, fname = 'rpsi4_{}{}', 'Rpsi4_'
+        else:
+            gname, fname = 'rh_{}{}', 'Rh_'
+        dsets = {}
+        for k, (l, m) in enumerate(self.modes):
+            g = gname.format(l,m)
+            dsets[g] = {}
+            for i, r in enumerate(self.radii):
+                y = self.data[i,k]
+                dsets[g][fname+write_key(l,m,r)+'.txt'] = \
+                    np.c_[u[i]/M, y.real/M, y.imag/M, M*omega[i,k], 
+                          amp[i,k]/M, phi[i,k], self.time]
+        return dsets
+
+    def write_core(self, path_out=None, h5=None):
+        """
+        Write all radii and modes in CoRe format (see core_dsets())
+        ------
+        Input
+        -----
+        path_out : If given, write the txt files there
+        h5       : If given, a CoRe_h5 object; write the datasets into it
+        """
+        dsets = self.core_dsets()
+        if path_out:
+            if self.var == 'Psi4':
+                cols = "u/M:0 RePsi4/M:1 ImPsi4/M:2 Momega:3 A/M:4 phi:5 t:6"
+            else:
+                cols = "u/M:0 Reh/M:1 Imh/M:2 Momega:3 A/M:4 phi:5 t:6"
+            for g in dsets:
+                for f, data in dsets[g].items():
+                    r = wfile_parse_name(f)[3]
+                    np.savetxt(os.path.join(path_out,f), data,
+                               header=write_headstr(r,self.mass)+cols)
+        if h5 is not None:
+            h5.write_arrays(dsets)
+        return dsets
+
+    def hlm_to_strain(self, phi=0, inclination=0, add_negative_modes=False,
+                      r=None):
+        """
+        Build strain from time-domain modes in mass rescaled, geom. units
+        for a set of orientations. Return result in SI units
+        ------
+        Input
+        -----
+        phi, inclination   : Orientation angles, scalars or arrays of
+                             the same shape (n_orient,)
+        add_negative_modes : Add the negative m-modes not stored using 
+                             the positive ones, h_{l-m} = (-)^l h^{*}_{lm}
+        r                  : Extraction radius (defaults to the largest)
+        ------
+        Output
+        ------
+        time, hplus, hcross; hplus and hcross have shape (n_orient, n_t)
+
+        All orientations are obtained as one matrix product between
+        the (n_orient, n_modes) harmonics and the (n_modes, n_t) modes.
+        Stored negative m-modes are always included.
         """
         PC_SI  = 3.085677581491367e+16 # m
         MPC_SI = 1e6 * PC_SI
-        wave22 = self.get(l=2, m=2)
-        time = wave22.time_ret() * MSun_sec()
-        distance = wave22.prop['detector.radius']*MPC_SI
-        amplitude_prefactor = wave22.prop['mass'] * MSun_meter() / distance
-        h = np.zeros_like( 1j* time  )
-        for (l,m) in self.modes:
-            wavelm = self.get(l=l,m=m)
-            amplitude = wavelm.amplitude(var='h')
-            philm = wavelm.phase(var='h')
-            sYlm = spinw_spherical_harm(-2, l, m, phi, inclination)
-            Alm = amplitude_prefactor * amplitude
-            hlm = Alm * np.exp( - 1j * philm )
-            h += hlm * sYlm
-            if (add_negative_modes):            
-                sYlm_neg = spinw_spherical_harm(-2, l, -m, phi, inclination)            
-                hlm_neg = (-1)**l * np.conj(hlm) 
-                h += hlm_neg * sYlm_neg            
+        if r is None:
+            r = self.radii[-1]
+        k = self.r_idx[r]
+        hw = self.get_strain()
+        time = hw.time_ret()[k] * MSun_sec()
+        distance = r*MPC_SI
+        amplitude_prefactor = self.mass * MSun_meter() / distance
+
+        modes = list(self.modes)
+        hlm   = [hw.data[k]]
+        if add_negative_modes:
+            neg = [(i, (l,-m)) for i, (l,m) in enumerate(self.modes)
+                   if m > 0 and (l,-m) not in self.lm_idx]
+            modes += [lm for i, lm in neg]
+            hlm.append(np.array([(-1)**lm[0] * np.conj(hw.data[k,i]) for i, lm in neg]).reshape(len(neg), -1))
+        hlm = amplitude_prefactor * np.concatenate(hlm, axis=0)
+
+        Y = spinw_spherical_harm_matrix(-2, modes, inclination, phi)
+        h = Y @ hlm
         hplus = np.real(h)
         hcross = - np.imag(h)
         return time, hplus, hcross
 
+    def get_strain(self, fcut=-1, win=1., workers=None, pad=False):
+        """
+        Return the strain as a wave_array. Compute it first with FFI
+        if Psi4 is stored, by default with cutoff 2*f0/max(1,|m|) 
+        for each mode. All the modes and radii are integrated in one
+        batch, workers and pad are passed to gwutils.fixed_freq_int()
+        """
+        if self.var != 'Psi4':
+            return self
+        if fcut < 0.:
+            if self.f0 is None:
+                raise ValueError("f0 is needed for the default FFI cutoff")
+            fcut = 2 * self.f0 / np.maximum(1, np.abs(self.m))
+        fcut = np.broadcast_to(fcut, self.m.shape)
+        dt = self.time[1] - self.time[0]
+        h  = win * fixed_freq_int(win * self.data, fcut[None,:], dt = dt,
+                                  workers = workers, pad = pad)
+        return wave_array(self.time, h, self.modes, self.radii, var='h',
+                          mass=self.mass, f0=self.f0)
 
 
 class wave(object):
@@ -399,6 +1343,11 @@ class wave(object):
     filenames : List of waveform files to be loaded
     mass      : Binary mass (solar masses)
     f0        : Initial gravitational wave frequency of the system (mass rescaled, geom.units)
+    cache_dir : Directory of the binary cache of the parsed text files
+                (None disables it), see ioutils.loadtxt_cached()
+    cache_dir_size : Size cap (bytes) of the binary cache
+    cache_views : If True, amplitude(), phase() etc. return read-only
+                  views of the cached arrays instead of copies
     -----------
     Contains
     -----------
@@ -407,14 +1356,28 @@ class wave(object):
     || After reading data ||
     * p4   : Psi4 scalar field (complex-valued)
     * h    : Wave strain (complex-valued)
+
+    Amplitude, phase and frequency are cached per variable and the
+    cache is invalidated when time, h or p4 are reassigned. Copies of
+    the cached arrays are returned, unless cache_views is set; in-place
+    changes of time, h or p4 elements are not tracked (call 
+    derived_cache_clear() after those).
     """
     
     def __init__(self, path='.', code='core', filename=None, 
-                 mass=None, f0=None):
+                 mass=None, f0=None, cache_dir=None, cache_dir_size=None,
+                 cache_views=False):
         """
         Initialise a waveform
         """
+        self._dcache = {}
+        self.cache_views = cache_views
+        self._dcache_hits = 0
+        self._dcache_misses = 0
+
         self.path = path
+        self.cache_dir = cache_dir
+        self.cache_dir_size = cache_dir_size
         
         self.code = code
         if self.code not in ['bam','cactus','core']:
@@ -432,20 +1395,95 @@ class wave(object):
     def type(self):
         return type(self)
 
+    @property
+    def time(self):
+        return self._time
+
+    @time.setter
+    def time(self, val):
+        self._time = val
+        self._dcache.clear()
+
+    @property
+    def h(self):
+        return self._h
+
+    @h.setter
+    def h(self, val):
+        self._h = val
+        self._dcache.clear()
+
+    @property
+    def p4(self):
+        return self._p4
+
+    @p4.setter
+    def p4(self, val):
+        self._p4 = val
+        self._dcache.clear()
+
+    def derived_cached(self, key, fun):
+        """
+        Return the derived quantity stored under key, computing it
+        with fun() on a miss. The array is stored read-only, a copy
+        is returned unless cache_views is set.
+        """
+        if key in self._dcache:
+            self._dcache_hits += 1
+            val = self._dcache[key]
+        else:
+            self._dcache_misses += 1
+            val = fun()
+            val.flags.writeable = False
+            self._dcache[key] = val
+        return val if self.cache_views else val.copy()
+
+    def derived_cache_clear(self):
+        """
+        Drop the cached amplitude, phase and frequency
+        """
+        self._dcache.clear()
+
+    def cache_info(self):
+        """
+        Return statistics of the cache of derived quantities
+        """
+        return {'hits': self._dcache_hits, 'misses': self._dcache_misses,
+                'entries': len(self._dcache), 'keys': list(self._dcache.keys()),
+                'nbytes': sum([v.nbytes for v in self._dcache.values()])}
+
+    def loadtxt(self, fname, usecols=None):
+        """
+        Load columns and header comments of a text file, going through
+        the binary cache if enabled
+        ------
+        Input
+        -----
+        fname   : Name of the file to be loaded
+        usecols : Columns to be read
+        """
+        fname = os.path.join(self.path,fname)
+        if self.cache_dir is None:
+            return loadtxt_fast(fname, usecols=usecols)
+        return loadtxt_cached(fname, self.cache_dir, usecols=usecols,
+                              maxbytes=self.cache_dir_size)
+
     def readtxt(self, fname):
         """
         Read waveform data from ASCII file (columns 0,1,2)
+        The time column is sorted and purged of duplicates only if it
+        is not already strictly increasing.
         ------
         Input
         -----
         fname  : Name of the file to be loaded
         """
-        self.time, re, im = np.loadtxt(os.path.join(self.path,fname),
-                                       unpack=True,
-                                       usecols=[0,1,2],
-                                       comments=['#','"'])
-        self.time, uniq = np.unique(self.time, axis=0, return_index=True)
-        re, im = re[uniq], im[uniq]
+        data, header = self.loadtxt(fname, usecols=[0,1,2])
+        self.time, re, im = data.T.copy()
+        uniq = None
+        if np.any(np.diff(self.time) <= 0.):
+            self.time, uniq = np.unique(self.time, axis=0, return_index=True)
+            re, im = re[uniq], im[uniq]
 
         if self.prop['var'] in ['Psi4','psi4']:
             self.prop['var'] = 'Psi4'
@@ -456,7 +1494,7 @@ class wave(object):
             if self.code == 'cactus':
                 self.p4 *= self.prop['detector.radius']
             if self.code == 'bam':
-                self.prop['detector.radius'] = wfile_get_detrad_bam(os.path.join(self.path,fname))
+                self.prop['detector.radius'] = header_get_detrad_bam(header)
 
             self.h    = self.get_strain()
 
@@ -464,9 +1502,11 @@ class wave(object):
             if self.code != 'core':
                 raise ValueError("Strain can be read only from CoRe data format.")
             self.h    = np.array(re) + 1j *np.array(im)
-            rp4, ip4  = np.loadtxt(os.path.join(self.path,fname.replace('Rh', 'Rpsi4')),
-                                   unpack=True, usecols=[1,2])
-            self.p4   = np.array(re) + 1j *np.array(im)
+            data, _   = self.loadtxt(fname.replace('Rh', 'Rpsi4'), usecols=[1,2])
+            rp4, ip4  = data.T
+            if uniq is not None:
+                rp4, ip4 = rp4[uniq], ip4[uniq]
+            self.p4   = np.array(rp4) + 1j *np.array(ip4)
 
     def write_to_txt(self, var, path):
         """ 
@@ -497,6 +1537,36 @@ class wave(object):
             raise ValueError("var can be only 'Psi4' or 'h'")
         return np.savetxt(os.path.join(path,fname), data, header=headstr)
 
+    def get_strain_scan(self, fcuts=None, win=1., drift=False, workers=None, pad=False):
+        """
+        Strain from Psi4 for many FFI cutoffs, with one forward FFT 
+        (see gwutils.fixed_freq_int_scan)
+        ------
+        Input
+        -----
+        fcuts   : Array of cutoffs, default 2*f0/max(1,|m|) times 
+                  np.linspace(0.5,1.5,11)
+        win     : Window applied before and after the integration
+        drift   : If True, return only the drift diagnostics (of
+                  the windowed strain)
+        workers : Number of threads of scipy.fft
+        pad     : Zero-pad to a fast FFT length
+
+        Psi4 is also available for CoRe strain waves, read from the
+        matching Rpsi4 file
+        """
+        if len(getattr(self, '_p4', [])) == 0:
+            raise ValueError("FFI requires Psi4 data")
+        if fcuts is None:
+            fcuts = 2 * self.prop['init.frequency'] / max(1,abs(self.prop['mmode'])) * \
+                    np.linspace(0.5, 1.5, 11)
+        dt  = self.time[1] - self.time[0]
+        out = fixed_freq_int_scan(self.p4, fcuts, dt = dt, workers = workers,
+                                  pad = pad, drift = drift, win = win)
+        if drift:
+            out['fcut'] = np.atleast_1d(fcuts)
+        return out
+
     def show_strain(self, to_file=None):
         """
         Show strain and instantaneous frequency
@@ -574,6 +1644,15 @@ class wave(object):
         self.h    = []
         self.p4   = []
 
+    def nbytes(self):
+        """
+        Return the memory (bytes) used by the data arrays, including
+        the cached derived quantities
+        """
+        return sum([v.nbytes for v in vars(self).values()
+                    if isinstance(v, np.ndarray)]) + \
+               sum([v.nbytes for v in self._dcache.values()])
+
     def amplitude(self,var=None):
         """
         Return amplitude
@@ -583,9 +1662,9 @@ class wave(object):
         var  : Which variable to return (Psi4 or h)
         """
         if var=='Psi4':
-            return np.abs(self.p4)
+            return self.derived_cached(('amplitude','Psi4'), lambda: np.abs(self.p4))
         else:
-            return np.abs(self.h)
+            return self.derived_cached(('amplitude','h'), lambda: np.abs(self.h))
 
     def phase(self,var=None):
         """
@@ -596,9 +1675,9 @@ class wave(object):
         var  : Which variable to return (Psi4 or h)
         """
         if var=='Psi4':
-            return -np.unwrap(np.angle(self.p4))
+            return self.derived_cached(('phase','Psi4'), lambda: -np.unwrap(np.angle(self.p4)))
         else:
-            return -np.unwrap(np.angle(self.h))
+            return self.derived_cached(('phase','h'), lambda: -np.unwrap(np.angle(self.h)))
 
     def phase_diff1(self, var=None, pad=True):
         """
@@ -610,7 +1689,8 @@ class wave(object):
         var  : Which variable to return (Psi4 or h)
         pad  : Set to True to obtain an array of the same lenght as self.time.
         """
-        return diff1(self.time,self.phase(var),pad=pad)
+        key = ('phase_diff1', 'Psi4' if var=='Psi4' else 'h', pad)
+        return self.derived_cached(key, lambda: diff1(self.time,self.phase(var),pad=pad))
 
     def phase_diffo(self, var=None, o=4):
         """
@@ -622,7 +1702,8 @@ class wave(object):
         var  : Which variable to return (Psi4 or h)
         o    : Specify order for the finite differencing (defaults to 4)        
         """
-        return diffo(self.time,self.phase(var), o)
+        key = ('phase_diffo', 'Psi4' if var=='Psi4' else 'h', o)
+        return self.derived_cached(key, lambda: diffo(self.time,self.phase(var), o)[0])
 
     def time_ret(self):
         """
@@ -644,14 +1725,16 @@ class wave(object):
         else:
             return np.interp1(timei, self.time, self.h,kind=kind)
 
-    def get_strain(self, fcut=-1, win=1.):
+    def get_strain(self, fcut=-1, win=1., workers=None, pad=False):
         """
         Return strain. Compute it first, if Psi4 is stored.
+        workers and pad are passed to gwutils.fixed_freq_int()
         """
         if self.prop['var']=='Psi4':
             if fcut < 0. :
                 fcut = 2 * self.prop['init.frequency'] / max(1,abs(self.prop['mmode']))
             dt = self.time[1] - self.time[0]
-            return win * fixed_freq_int_2( win * self.p4, fcut, dt = dt)
+            return win * fixed_freq_int( win * self.p4, fcut, dt = dt,
+                                         workers = workers, pad = pad)
         else:
             return self.h
\ No newline at end of file